@@ -0,0 +1,188 @@
+# benchmarks of the training data path and the serving path, each function returns an OrderedDict of measurements.
+# Names of measurements determine how they are compared between runs(see compare_results()): '*_per_sec' are better
+# when higher, '*seconds' and '*_ms' are better when lower, the remaining ones are not compared.
+import os
+import time
+import numpy as np
+from collections import OrderedDict
+from libraries.data_iterators.open_text_data_iterator import OpenTextDataIterator
+from libraries.tokenizers.bsg_tokenizer import BSGTokenizer
+from libraries.tools.vocabulary import Vocabulary
+from libraries.batch_iterators.window_batch_iterator import WindowBatchIterator
+from libraries.tools.word_vectors import write_vectors, VECTORS_FORMATS
+from libraries.evaluation.entailment.support import read_vectors_to_dict
+from libraries.neighbour_search.exact_neighbour_search import ExactNeighbourSearch, METRICS
+from models.model_archive import get_model_class, create_lr_opt
+
+
+def create_data_iterator():
+    # the same tokenizer as in interfaces.interface_configurator
+    return OpenTextDataIterator(tokenizer=BSGTokenizer(word_processor_type='open_text', use_external_tokenizer=False))
+
+
+def create_vocabulary(data_path, max_vocab_size=None, nr_workers=1):
+    vocab = Vocabulary(create_data_iterator(), max_size=max_vocab_size, min_count=1)
+    vocab.create(data_path, nr_workers=nr_workers)
+    vocab.assign_distr()
+    return vocab
+
+
+def measure(func, repeats=3):
+    """
+    Calls func repeats times.
+    :return: the median duration in seconds, and the last output of func
+
+    """
+    durations = []
+    output = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = func()
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations)), output
+
+
+def bench_vocabulary_create(data_path, nr_tokens, max_vocab_size=None, nr_workers=1, repeats=3):
+    seconds, vocab = measure(lambda: create_vocabulary(data_path, max_vocab_size, nr_workers=nr_workers), repeats)
+    return OrderedDict((("seconds", seconds), ("tokens_per_sec", nr_tokens / seconds), ("vocab_size", len(vocab))))
+
+
+def bench_tokenization(data_path, repeats=3):
+    """
+    Measures reading and tokenization of the corpus by OpenTextDataIterator.
+
+    """
+    def tokenize():
+        data_iterator = create_data_iterator()
+        data_iterator.set_data_path(data_path)
+        nr_tokens = 0
+        nr_sentences = 0
+        for tokens, in data_iterator:
+            nr_tokens += len(tokens)
+            nr_sentences += 1
+        return nr_tokens, nr_sentences
+
+    seconds, (nr_tokens, nr_sentences) = measure(tokenize, repeats)
+    return OrderedDict((("seconds", seconds), ("tokens_per_sec", nr_tokens / seconds),
+                        ("sentences_per_sec", nr_sentences / seconds)))
+
+
+def bench_window_batches(vocab, data_path, batch_size=500, half_window_size=5, nr_neg_samples=10, nr_workers=1,
+                         repeats=3):
+    """
+    Measures a full pass of WindowBatchIterator over the corpus, including the start of its workers.
+
+    """
+    def iterate():
+        iterator = WindowBatchIterator(vocab, data_path, create_data_iterator(), half_window_size=half_window_size,
+                                       nr_neg_samples=nr_neg_samples, batch_size=batch_size, nr_workers=nr_workers,
+                                       seed=1)
+        nr_batches = 0
+        nr_windows = 0
+        for batch in iterator:
+            nr_batches += 1
+            nr_windows += len(batch)
+        return nr_batches, nr_windows
+
+    seconds, (nr_batches, nr_windows) = measure(iterate, repeats)
+    return OrderedDict((("seconds", seconds), ("batches_per_sec", nr_batches / seconds),
+                        ("windows_per_sec", nr_windows / seconds)))
+
+
+def bench_train_step(vocab, data_path, backend="numpy", batch_size=500, half_window_size=5, nr_neg_samples=10,
+                     embedding_size=100, sparse_updates=False, nr_steps=20):
+    """
+    Measures single training steps of the backend's model on the first nr_steps batches of the corpus, the model's
+    creation(e.g. compilation of theano functions) is measured separately.
+
+    """
+    iterator = WindowBatchIterator(vocab, data_path, create_data_iterator(), half_window_size=half_window_size,
+                                   nr_neg_samples=nr_neg_samples, batch_size=batch_size, seed=1)
+    batches = []
+    for batch in iterator:
+        batches.append(batch)
+        if len(batches) == nr_steps:
+            break
+
+    start = time.perf_counter()
+    lr_opt = create_lr_opt(backend, {"name": "Adam", "learning_rate": 0.001, "beta1": 0.9, "beta2": 0.999,
+                                     "sparse": sparse_updates})
+    model = get_model_class(backend)(vocab_size=len(vocab), input_dim=embedding_size, hidden_dim=embedding_size,
+                                     latent_dim=embedding_size, lr_opt=lr_opt, margin=5.0)
+    setup_seconds = time.perf_counter() - start
+
+    durations = []
+    for batch in batches:
+        start = time.perf_counter()
+        model.train(batch.pos_context_words, batch.neg_context_words, batch.center_words, batch.mask)
+        durations.append(time.perf_counter() - start)
+    step_seconds = float(np.median(durations))
+    return OrderedDict((("setup_seconds", setup_seconds), ("step_seconds", step_seconds),
+                        ("steps_per_sec", 1. / step_seconds), ("windows_per_sec", batch_size / step_seconds)))
+
+
+def bench_write_vectors(folder_path, tokens, mus, repeats=3):
+    """
+    Measures the export of mus in every format of VECTORS_FORMATS.
+    :return: the measurements and the path of the text file
+
+    """
+    results = OrderedDict()
+    for vectors_format, extension in sorted(VECTORS_FORMATS.items()):
+        file_path = os.path.join(folder_path, "mu" + extension)
+        seconds, _ = measure(lambda: write_vectors(tokens, file_path, mus, vectors_format=vectors_format), repeats)
+        results[vectors_format + "_seconds"] = seconds
+        results[vectors_format + "_vectors_per_sec"] = len(tokens) / seconds
+    return results
+
+
+def bench_read_vectors(mus_file_path, sigmas_file_path, nr_vectors, repeats=3):
+    seconds, _ = measure(lambda: read_vectors_to_dict(mus_file_path, sigmas_file_path, log_sigmas=False), repeats)
+    return OrderedDict((("seconds", seconds), ("vectors_per_sec", nr_vectors / seconds)))
+
+
+def bench_nearest_neighbours(tokens, mus, sigmas, nr_queries=200, k=5, seed=1):
+    """
+    Measures the latency of single word queries as the inference API(bsg_api.py) answers them, for every metric.
+
+    """
+    start = time.perf_counter()
+    search = ExactNeighbourSearch(mus, tokens, sigmas=sigmas)
+    results = OrderedDict((("setup_seconds", time.perf_counter() - start), ))
+    queries = np.random.RandomState(seed).choice(len(tokens), size=nr_queries)
+    for metric in METRICS:
+        latencies = []
+        for word_id in queries:
+            start = time.perf_counter()
+            search.batch_nearest_neighbours([tokens[word_id]], k=k, metric=metric)
+            latencies.append(time.perf_counter() - start)
+        latencies = 1000. * np.array(latencies)
+        results[metric + "_p50_ms"] = float(np.percentile(latencies, 50))
+        results[metric + "_p99_ms"] = float(np.percentile(latencies, 99))
+    return results
+
+
+def compare_results(old_results, new_results, tolerance=0.1):
+    """
+    Compares measurements of two runs of the same benchmarks.
+    :param tolerance: the relative change in the worse direction that is considered a regression
+    :return: a list of (benchmark, measurement, old value, new value, relative change, is regression) tuples
+
+    """
+    comparison = []
+    for benchmark, new_measurements in new_results.items():
+        old_measurements = old_results.get(benchmark, {})
+        for name, new_value in new_measurements.items():
+            old_value = old_measurements.get(name)
+            if old_value is None or not old_value:
+                continue
+            if name.endswith("_per_sec"):
+                higher_is_better = True
+            elif name.endswith("seconds") or name.endswith("_ms"):
+                higher_is_better = False
+            else:
+                continue
+            change = (new_value - old_value) / abs(old_value)
+            is_regression = -change > tolerance if higher_is_better else change > tolerance
+            comparison.append((benchmark, name, old_value, new_value, change, is_regression))
+    return comparison
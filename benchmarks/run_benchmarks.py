@@ -0,0 +1,138 @@
+# runs the benchmark suite on fixed synthetic data and saves the results as json, e.g. from the repository's root:
+#   python -m benchmarks.run_benchmarks --output results/new.json --compare results/old.json
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import numpy as np
+from collections import OrderedDict
+from benchmarks.synthetic_data import create_corpus, create_vectors
+from benchmarks import benchmarks
+from libraries.tools.word_vectors import write_vectors
+
+BENCHMARKS = ("vocabulary_create", "tokenization", "window_batches", "train_step", "write_vectors", "read_vectors",
+              "nearest_neighbours")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', type=str, default='benchmark_results.json', help="the json file of results")
+    parser.add_argument('--data_folder', type=str, default='./output/benchmarks',
+                        help="where synthetic corpora and vectors are written, corpora are reused between runs")
+    parser.add_argument('--benchmarks', type=str, nargs='+', default=list(BENCHMARKS), choices=BENCHMARKS)
+    parser.add_argument('--vocab_size', type=int, default=10000, help="the number of distinct words of the corpus")
+    parser.add_argument('--nr_tokens', type=int, default=1000000, help="the number of tokens of the corpus")
+    parser.add_argument('--nr_files', type=int, default=4, help="the number of files of the corpus")
+    parser.add_argument('--vectors_vocab_size', type=int, default=100000,
+                        help="the number of word vectors of the export, load and neighbour search benchmarks")
+    parser.add_argument('--embedding_size', type=int, default=100)
+    parser.add_argument('--batch_size', type=int, default=500)
+    parser.add_argument('--nr_neg_samples', type=int, default=10)
+    parser.add_argument('--nr_workers', type=int, default=1, help="number of processes that produce batches")
+    parser.add_argument('--backend', type=str, default='numpy', choices=('theano', 'numpy'),
+                        help="the backend of the training step benchmark")
+    parser.add_argument('--sparse_updates', action='store_true')
+    parser.add_argument('--nr_steps', type=int, default=20, help="the number of measured training steps")
+    parser.add_argument('--nr_queries', type=int, default=200, help="the number of measured neighbour queries")
+    parser.add_argument('--repeats', type=int, default=3, help="the median of this number of runs is reported")
+    parser.add_argument('--seed', type=int, default=1, help="the seed of synthetic data")
+    parser.add_argument('--compare', type=str, default=None,
+                        help="a json file of previous results, regressions are reported and make the exit code 1")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="the relative slowdown that is considered a regression")
+    return parser.parse_args()
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    corpus = create_corpus(os.path.join(args.data_folder, "corpus_v%d_t%d_f%d_s%d" % (args.vocab_size, args.nr_tokens,
+                                                                                       args.nr_files, args.seed)),
+                           vocab_size=args.vocab_size, nr_tokens=args.nr_tokens, nr_files=args.nr_files,
+                           seed=args.seed)
+    data_path = corpus["data_path"]
+    vocab = None
+    if {"window_batches", "train_step"} & set(args.benchmarks):
+        vocab = benchmarks.create_vocabulary(data_path)
+    vectors_folder = os.path.join(args.data_folder, "vectors")
+    tokens, mus, sigmas = None, None, None
+    if {"write_vectors", "read_vectors", "nearest_neighbours"} & set(args.benchmarks):
+        tokens, mus, sigmas = create_vectors(args.vectors_vocab_size, args.embedding_size, seed=args.seed)
+
+    results = OrderedDict()
+    for name in BENCHMARKS:
+        if name not in args.benchmarks:
+            continue
+        print("running the %s benchmark..." % name)
+        if name == "vocabulary_create":
+            results[name] = benchmarks.bench_vocabulary_create(data_path, corpus["actual_nr_tokens"],
+                                                               repeats=args.repeats)
+        elif name == "tokenization":
+            results[name] = benchmarks.bench_tokenization(data_path, repeats=args.repeats)
+        elif name == "window_batches":
+            results[name] = benchmarks.bench_window_batches(vocab, data_path, batch_size=args.batch_size,
+                                                            nr_neg_samples=args.nr_neg_samples,
+                                                            nr_workers=args.nr_workers, repeats=args.repeats)
+        elif name == "train_step":
+            results[name] = benchmarks.bench_train_step(vocab, data_path, backend=args.backend,
+                                                        batch_size=args.batch_size,
+                                                        nr_neg_samples=args.nr_neg_samples,
+                                                        embedding_size=args.embedding_size,
+                                                        sparse_updates=args.sparse_updates, nr_steps=args.nr_steps)
+        elif name == "write_vectors":
+            results[name] = benchmarks.bench_write_vectors(vectors_folder, tokens, mus, repeats=args.repeats)
+        elif name == "read_vectors":
+            mus_file_path = os.path.join(vectors_folder, "mu.vectors")
+            sigmas_file_path = os.path.join(vectors_folder, "sigma.vectors")
+            write_vectors(tokens, mus_file_path, mus)
+            write_vectors(tokens, sigmas_file_path, sigmas)
+            results[name] = benchmarks.bench_read_vectors(mus_file_path, sigmas_file_path, len(tokens),
+                                                          repeats=args.repeats)
+        elif name == "nearest_neighbours":
+            results[name] = benchmarks.bench_nearest_neighbours(tokens, mus, sigmas, nr_queries=args.nr_queries,
+                                                                seed=args.seed)
+        print(json.dumps(results[name], indent=2))
+
+    config = OrderedDict((name, value) for name, value in sorted(vars(args).items())
+                         if name not in ("output", "data_folder", "compare", "tolerance"))
+    return OrderedDict((("created", time.strftime("%Y-%m-%dT%H:%M:%S")), ("commit", get_commit()),
+                        ("python", platform.python_version()), ("numpy", np.__version__),
+                        ("platform", platform.platform()), ("nr_cpus", os.cpu_count()), ("config", config),
+                        ("corpus", corpus), ("results", results)))
+
+
+def main():
+    args = parse_args()
+    report = run(args)
+    output_folder = os.path.dirname(args.output)
+    if output_folder and not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("results are saved to: %s" % args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        # running a subset of benchmarks doesn't change the measurements of the others
+        if dict(previous.get("config", {}), benchmarks=None) != dict(report["config"], benchmarks=None):
+            print("warning: the compared results were obtained with a different configuration")
+        comparison = benchmarks.compare_results(previous["results"], report["results"], tolerance=args.tolerance)
+        for benchmark, name, old_value, new_value, change, is_regression in comparison:
+            print("%s %s.%s: %.6g -> %.6g (%+.1f%%)" % ("REGRESSION" if is_regression else "          ", benchmark,
+                                                         name, old_value, new_value, 100. * change))
+        if any(is_regression for *_, is_regression in comparison):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# fixed synthetic corpora for benchmarks, the same arguments always produce the same files
+import os
+import json
+import numpy as np
+
+CORPUS_INFO_FILE_NAME = "corpus.json"
+# the data iterators read all files of a folder, so the corpus is in a subfolder next to its description
+CORPUS_DATA_FOLDER_NAME = "data"
+
+
+def create_corpus(folder_path, vocab_size=10000, nr_tokens=1000000, nr_files=4, min_sentence_length=5,
+                  max_sentence_length=30, zipf_exponent=1.0, seed=1):
+    """
+    Writes text files of sentences, one per line, whose tokens('w0', 'w1', ...) follow a Zipfian distribution as
+    words of natural text do. The corpus is reused if the folder already contains one that was created with the same
+    arguments.
+    :param vocab_size: the number of distinct tokens that can occur
+    :param nr_tokens: the approximate number of tokens in the corpus
+    :return: a dict with the arguments, the actual number of tokens and sentences, and the data_path of the text files
+
+    """
+    info = {"vocab_size": vocab_size, "nr_tokens": nr_tokens, "nr_files": nr_files,
+            "min_sentence_length": min_sentence_length, "max_sentence_length": max_sentence_length,
+            "zipf_exponent": zipf_exponent, "seed": seed}
+    info_file_path = os.path.join(folder_path, CORPUS_INFO_FILE_NAME)
+    if os.path.isfile(info_file_path):
+        with open(info_file_path) as f:
+            existing_info = json.load(f)
+        if dict((key, existing_info.get(key)) for key in info) == info:
+            existing_info["data_path"] = os.path.join(folder_path, CORPUS_DATA_FOLDER_NAME)
+            return existing_info
+    data_path = os.path.join(folder_path, CORPUS_DATA_FOLDER_NAME)
+    if not os.path.exists(data_path):
+        os.makedirs(data_path)
+
+    random = np.random.RandomState(seed)
+    probs = 1. / np.arange(1, vocab_size + 1) ** zipf_exponent
+    probs /= probs.sum()
+    tokens = np.array(["w%d" % token_id for token_id in range(vocab_size)], dtype=object)
+
+    total_tokens = 0
+    total_sentences = 0
+    tokens_per_file = int(np.ceil(nr_tokens / nr_files))
+    for file_id in range(nr_files):
+        lengths = random.randint(min_sentence_length, max_sentence_length + 1,
+                                 size=2 * tokens_per_file // (min_sentence_length + max_sentence_length) + 1)
+        lengths = lengths[:np.searchsorted(np.cumsum(lengths), tokens_per_file) + 1]
+        token_ids = random.choice(vocab_size, size=int(lengths.sum()), p=probs)
+        ends = np.cumsum(lengths)
+        with open(os.path.join(data_path, "part_%d.txt" % file_id), "w") as f:
+            for start, end in zip(ends - lengths, ends):
+                f.write(" ".join(tokens[token_ids[start:end]]) + "\n")
+        total_tokens += len(token_ids)
+        total_sentences += len(lengths)
+
+    info["actual_nr_tokens"] = total_tokens
+    info["nr_sentences"] = total_sentences
+    info["data_path"] = data_path
+    # written last, so an interrupted creation is repeated
+    with open(info_file_path, "w") as f:
+        json.dump(info, f, indent=2)
+    return info
+
+
+def create_vectors(vocab_size, dim, seed=1):
+    """
+    :return: tokens, a matrix of mus [vocab_size x dim] and a matrix of sigmas [vocab_size x 1]
+
+    """
+    random = np.random.RandomState(seed)
+    tokens = ["w%d" % token_id for token_id in range(vocab_size)]
+    mus = random.randn(vocab_size, dim).astype("float32")
+    sigmas = np.exp(random.randn(vocab_size, 1)).astype("float32")
+    return tokens, mus, sigmas
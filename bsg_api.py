@@ -9,13 +9,18 @@ from prep.train.bsg.interfaces.interface_configurator import InterfaceConfigurat
 from prep.train.bsg.libraries.tools.vocabulary import Vocabulary
 from prep.train.bsg.libraries.evaluation.entailment.support import read_vectors_to_dict, read_vectors_to_arrays
 from prep.train.bsg.libraries.simulators.support import cosine_sim
+from prep.train.bsg.libraries.neighbour_search.exact_neighbour_search import ExactNeighbourSearch, METRICS
+from prep.train.bsg.libraries.neighbour_search.ivf_pq_index import IVFPQIndex
+from prep.train.bsg.libraries.tools.embedding_store import EmbeddingStore, EMBEDDING_STORE_FILE_NAME
+from prep.train.bsg.libraries.tools.params_archive import is_params_archive, PARAMS_ARCHIVE_FOLDER_NAME
+from prep.train.bsg.models.model_archive import load_model as load_model_archive
+from prep.train.bsg.models.numpy_bsg import NumpyBSG
 
 train_data_path = './path/to/docs' # change the path! must point to directory containing .txt input files
 output_base_path = "./output/my-dataset/" # change the path (optional)
 
-mus_x = []
-mus_and_sigmas = {}
-mu_hash_dict = {}
+neighbour_search = None
+exact_search = None
 spcial_char_map = {ord('ä'):'a', ord('ü'):'u', ord('ö'):'o', ord('ß'):'ss'}
 
 app = Flask(__name__)
@@ -28,7 +33,23 @@ endpoints = [
         'description': 'computes five nearest neighbours of each known word of a text query',
         'url': '<host>/nearest_neighbours',
         'query parameters': {
-            'query': 'The Full Text Query for which five Nearest Neighbours are to be predicted'
+            'query': 'The Full Text Query for which five Nearest Neighbours are to be predicted',
+            'metric': 'l2 (default) ranks by the distance of mus, kl by KL(query word || word), sym_kl by the '
+                      'symmetric KL divergence of the words\' Gaussians'
+        }
+    },
+    {
+        'title': 'entailment measurements for word pairs',
+        'description': 'computes the cosine similarity of mus and KL divergences in both directions for word pairs',
+        'url': '<host>/entailment',
+        'query parameters': {
+            'word1': 'The first word of a single pair',
+            'word2': 'The second word of a single pair'
+        },
+        'json body (alternatively)': {
+            'pairs': 'A list of [word1, word2] pairs',
+            'word': 'A word that is paired with each word of \'words\'',
+            'words': 'A list of words'
         }
     }
 ]
@@ -44,32 +65,23 @@ def get_nearest_neighbours_for_query():
     query = request.args.get('query')
     if query is None:
         abort(400, description='Parameter \'query\' not found. Please provide a text query to infer recommendations on.')
+    metric = request.args.get('metric', 'l2')
+    if metric not in METRICS:
+        abort(400, description=f'Unknown metric \'{metric}\'. Please use one of: {", ".join(METRICS)}.')
     words = [clean_target_word(w) for w in query.split(' ')]
-    recommendations = {}
-    time_elapsed_arr = []
-
-    # for each word of the query
-    for word in words:
-        # given that the word is in the model vocabulary
-        if word in mus_and_sigmas:
-            nearest_neighbours, time_elapsed = get_nearest_neighbours(word)
-            time_elapsed_arr.append(time_elapsed)
-
-        # print(f"recommendations for word {word}: {nearest_neighbours} calculated in {time_elapsed} seconds")
-            recommendations[word] = nearest_neighbours
-        # else:
-            # print(f"word {word} not in dictionary")
-    if recommendations:
+
+    # the known words of the query are searched for together, in one batch
+    known_words = [word for word in dict.fromkeys(words) if word in neighbour_search]
+    if known_words:
+        nearest_neighbours, time_elapsed = get_batch_nearest_neighbours(known_words, metric)
+        recommendations = dict(zip(known_words, nearest_neighbours))
         if len(words) == 1:
-            result = {
-                "recommendations": recommendations[query],
-                "time_elapsed": np.average(time_elapsed_arr)
-            }
-        else:
-            result = {
-                "recommendations": recommendations,
-                "time_elapsed": np.average(time_elapsed_arr)
-            }
+            recommendations = recommendations[words[0]]
+        result = {
+            "recommendations": recommendations,
+            "time_elapsed": time_elapsed / len(known_words),
+            "total_time_elapsed": time_elapsed
+        }
     else:
         result = {
             "recommendations": []
@@ -77,16 +89,75 @@ def get_nearest_neighbours_for_query():
     return jsonify(result)
 
 
+@app.route('/entailment', methods=['POST'])
+def get_entailment_for_pairs():
+    body = request.get_json(silent=True) or {}
+    if 'pairs' in body:
+        pairs = body['pairs']
+        if not isinstance(pairs, list) or not all(isinstance(pair, list) and len(pair) == 2 and
+                                                  all(isinstance(word, str) for word in pair) for pair in pairs):
+            abort(400, description='\'pairs\' has to be a list of [word1, word2] pairs of strings.')
+    elif 'word' in body and 'words' in body:
+        if not isinstance(body['word'], str) or not isinstance(body['words'], list) or \
+                not all(isinstance(word, str) for word in body['words']):
+            abort(400, description='\'word\' has to be a string and \'words\' a list of strings.')
+        pairs = [[body['word'], word] for word in body['words']]
+    elif request.args.get('word1') is not None and request.args.get('word2') is not None:
+        pairs = [[request.args.get('word1'), request.args.get('word2')]]
+    else:
+        abort(400, description='Word pairs not found. Please provide either \'word1\' and \'word2\' parameters, or a '
+                               'json body with \'pairs\', or with \'word\' and \'words\'.')
+    # pairs are reported with the words as they were sent, cleaned words are used for the lookup only
+    known_pairs, first_ids, second_ids = [], [], []
+    unknown_words = set()
+    for word1, word2 in pairs:
+        clean_word1, clean_word2 = clean_target_word(word1), clean_target_word(word2)
+        unknown_words.update(word for word in (clean_word1, clean_word2) if word not in exact_search)
+        if clean_word1 in exact_search and clean_word2 in exact_search:
+            known_pairs.append((word1, word2))
+            first_ids.append(exact_search.word_to_index[clean_word1])
+            second_ids.append(exact_search.word_to_index[clean_word2])
+    unknown_words = sorted(unknown_words)
+    if not known_pairs:
+        abort(404, description=f'None of the word pairs is known. Unknown words: {", ".join(unknown_words)}.')
+
+    start_time = timer()
+    first_ids = np.array(first_ids, dtype='int64')
+    second_ids = np.array(second_ids, dtype='int64')
+    cos, kl_first_second, kl_second_first = exact_search.pair_scores(first_ids, second_ids)
+    time_elapsed = timer() - start_time
+
+    results = [{
+        "word1": word1,
+        "word2": word2,
+        "entailment": {
+            "cosine similarity score": float(c),
+            "word1 -> word2 (KL)": float(kl1),
+            "word2 -> word1 (KL)": float(kl2)
+        }
+    } for (word1, word2), c, kl1, kl2 in zip(known_pairs, cos, kl_first_second, kl_second_first)]
+    return jsonify({
+        "entailment prediction results": results,
+        "unknown words": unknown_words,
+        "time_elapsed": time_elapsed
+    })
+
 
 def get_nearest_neighbours(target_word):
     start_time = timer()
-    mu_vector = mus_and_sigmas.get(target_word)[0]
-    # nearest neighbour implementation borrowed from BSG evaluation
-    dists_exact = np.linalg.norm(mus_x - mu_vector, axis=1) ** 2
-    dists_exact_sorted_indices = dists_exact.argsort()
-    other_exact_sorted = mus_x[dists_exact_sorted_indices][1:]
-    nearest_neighbours_exact_mus = other_exact_sorted[:5]
-    nearest_neighbours = [mu_hash_dict[hash(str(m))] for m in nearest_neighbours_exact_mus]
+    nearest_neighbours = neighbour_search.nearest_neighbours(target_word, k=5)
+    stop_time = timer()
+    time_elapsed = stop_time - start_time
+    return nearest_neighbours, time_elapsed
+
+
+def get_batch_nearest_neighbours(target_words, metric='l2'):
+    start_time = timer()
+    if metric == 'l2':
+        nearest_neighbours = neighbour_search.batch_nearest_neighbours(target_words, k=5)
+    else:
+        # the Gaussian based metrics are always computed exactly
+        nearest_neighbours = exact_search.batch_nearest_neighbours(target_words, k=5, metric=metric)
     stop_time = timer()
     time_elapsed = stop_time - start_time
     return nearest_neighbours, time_elapsed
@@ -99,10 +170,14 @@ def clean_target_word(target_word):
 def parse_args():
     parser = argparse.ArgumentParser(description="get model path")
     parser.add_argument('--model_index', help="directory of the word embedding model to be loaded", default="0")
+    parser.add_argument('--ann_index', help="file of the approximate neighbour search index (IVF-PQ) to be used instead "
+                                            "of the exact search, it is built and saved if it does not exist", default=None)
+    parser.add_argument('--nprobe', type=int, default=8, help="number of inverted lists visited per query by the "
+                                                              "approximate search, higher is slower but more accurate")
     return parser.parse_args()
 
 
-def load_model(model_index):
+def load_model(model_index, ann_index_path=None, nprobe=8):
     output_folder_path = output_base_path + model_index + '/'
     vocab_file_path = output_folder_path + 'vocab.txt'
 
@@ -110,26 +185,52 @@ def load_model(model_index):
     # i_model = InterfaceConfigurator.get_interface(train_data_path,
     #                                               vocab_file_path,
     #                                               output_folder_path,
-    #                                               model_file_path=output_folder_path+"model.pkl")
+    #                                               model_file_path=output_folder_path+"params")
     vocab = Vocabulary()
     vocab.load(vocab_file_path=vocab_file_path)
-    mu_vecs = os.path.join(output_folder_path+"mu.vectors")
-    sigma_vecs = os.path.join(output_folder_path+"sigma.vectors")
-
-    globals()['mus_and_sigmas'] = read_vectors_to_dict(mu_vecs, sigma_vecs, log_sigmas=True)
-
-    globals()['mus_x'] = np.asarray([x[0].tolist() for x in mus_and_sigmas.values()], dtype='float32')
-
-    words = mus_and_sigmas.keys()
-    mus_hashes = [hash(str(mus)) for mus in mus_x]
-    globals()['mu_hash_dict'] = dict(zip(mus_hashes, words))
+    store_file_path = os.path.join(output_folder_path, EMBEDDING_STORE_FILE_NAME)
+    params_archive_path = os.path.join(output_folder_path, PARAMS_ARCHIVE_FOLDER_NAME)
+
+    if os.path.isfile(store_file_path):
+        # the binary store is memory-mapped, so API workers share one page-cached copy of the vectors
+        store = EmbeddingStore(store_file_path)
+        words, mus, sigmas = store.tokens, store.mus, store.sigmas
+    elif is_params_archive(params_archive_path):
+        # the vectors are computed from the model's memory-mapped parameters, rows correspond to vocabulary ids
+        model = load_model_archive(params_archive_path, model_class=NumpyBSG, mmap_mode='r')
+        repr_matrices = model.get_repr_matrices()
+        words = [word.token for word in vocab]
+        mus = repr_matrices["mu"].astype('float32')
+        sigmas = repr_matrices["sigma"].astype('float32')
+    else:
+        # fall back to the text vectors of models that were trained before the binary store was introduced
+        mu_vecs = os.path.join(output_folder_path+"mu.vectors")
+        sigma_vecs = os.path.join(output_folder_path+"sigma.vectors")
+        # sigma.vectors contain sigmas, not their logarithms
+        mus_and_sigmas = read_vectors_to_dict(mu_vecs, sigma_vecs, log_sigmas=False)
+        words = list(mus_and_sigmas.keys())
+        mus = np.stack([mus_and_sigmas[word][0] for word in words]).astype('float32')
+        sigmas = np.stack([mus_and_sigmas[word][1] for word in words]).astype('float32')
+
+    # the search engine keeps one matrix of mus, rows are mapped back to words by index
+    globals()['exact_search'] = ExactNeighbourSearch(mus, words, sigmas=sigmas)
+    if ann_index_path is None:
+        globals()['neighbour_search'] = exact_search
+    else:
+        if os.path.isfile(ann_index_path):
+            globals()['neighbour_search'] = IVFPQIndex.load(ann_index_path, mus, words)
+        else:
+            globals()['neighbour_search'] = IVFPQIndex(mus, words)
+            neighbour_search.save(ann_index_path)
+            print(f"approximate search index saved to {ann_index_path}")
+        neighbour_search.nprobe = nprobe
     print(f"model {model_index} loaded")
 
 
 def main():
     args = parse_args()
     model_index = args.model_index
-    load_model(model_index)
+    load_model(model_index, ann_index_path=args.ann_index, nprobe=args.nprobe)
     app.run(debug=False)
 
 
@@ -0,0 +1,139 @@
+import time
+import numpy as np
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+from interfaces.support import metrics_to_str
+
+
+class HogwildTrainer:
+    """
+    Data-parallel training, several processes train the same model on disjoint shards of data. Embedding matrices
+    are held in shared memory and updated by all processes without locks(Hogwild!, as in word2vec), as a batch
+    touches only a small fraction of their rows. Dense parameters are private to processes, their updates are
+    averaged into shared copies every sync_interval batches. The optimizer's statistics follow their parameters, so
+    they are carried over between passes over data.
+    Requires a model whose parameter values can be moved to shared memory(the numpy backend) with sparse updates,
+    and the 'fork' start method of processes, which isn't available on Windows.
+
+    """
+    def __init__(self, model, nr_trainers, sync_interval=100, report_interval=30.):
+        """
+        :param nr_trainers: the number of training processes
+        :param sync_interval: the number of batches after which a process merges its dense parameters
+        :param report_interval: the number of seconds between reports of the training speed
+
+        """
+        assert nr_trainers > 1
+        assert sync_interval >= 1
+        if "fork" not in multiprocessing.get_all_start_methods():
+            # spawned processes would receive copies of the shared memory
+            raise ValueError("training in multiple processes requires the 'fork' start method, which isn't available "
+                             "on this platform(e.g. Windows)")
+        # processes are forked regardless of the default start method
+        self.context = multiprocessing.get_context("fork")
+        if not model.lr_opt.sparse:
+            # dense updates would change all rows of the shared embedding matrices on every step
+            raise ValueError("training in multiple processes requires sparse updates of embeddings")
+        self.model = model
+        self.nr_trainers = nr_trainers
+        self.sync_interval = sync_interval
+        self.report_interval = report_interval
+
+        for param in model.params_full.values():
+            if not hasattr(param.value, "share_memory"):
+                raise ValueError("parameters of '%s' can't be moved to shared memory, use the numpy backend"
+                                 % model.model_name)
+            param.value.share_memory()
+        model.lr_opt.share_memory([(name, param.value.get_value(borrow=True))
+                                   for name, param in model.params_full.items()])
+        self.dense_names = [name for name in model.params_full if name not in model.embeddings_names]
+
+        self.lock = self.context.Lock()
+        # the numbers of processed words and of training steps per process
+        self.nr_words = np.frombuffer(RawArray("d", nr_trainers), dtype="float64")
+        self.nr_steps = np.frombuffer(RawArray("l", nr_trainers), dtype=np.dtype("l"))
+
+    def train(self, init_iterator, data_path, train_func, log):
+        """
+        Trains for one pass over data, returns when all processes have finished.
+        :param init_iterator: a function that creates a batch iterator over data_path
+        :param train_func: a function that performs a training step on a batch and returns metrics
+        :param log: a Log object, processes write their metrics to it
+
+        """
+        self.nr_words[:] = 0.
+        self.nr_steps[:] = 0
+        # iterators are created before forking, so data is prepared(e.g. encoded) only once
+        processes = []
+        for trainer_id in range(self.nr_trainers):
+            iterator = init_iterator(data_path)
+            iterator.set_shard(trainer_id, self.nr_trainers)
+            processes.append(self.context.Process(target=self._train_shard,
+                                                  args=(trainer_id, iterator, train_func, log)))
+        start = time.time()
+        for process in processes:
+            process.start()
+        next_report = start + self.report_interval
+        while True:
+            running = [process for process in processes if process.is_alive()]
+            if not running:
+                break
+            running[0].join(max(0., next_report - time.time()))
+            if time.time() >= next_report:
+                self.__report(log, time.time() - start)
+                next_report += self.report_interval
+        self.__report(log, time.time() - start)
+        for trainer_id, process in enumerate(processes):
+            if process.exitcode != 0:
+                raise RuntimeError("the training process #%d has failed with the exit code %s"
+                                   % (trainer_id, process.exitcode))
+        # processes have performed steps in parallel, the time step(e.g. of Adam's bias correction) continues from the
+        # longest sequence of them
+        self.model.lr_opt.advance(int(np.max(self.nr_steps)))
+
+    def _train_shard(self, trainer_id, iterator, train_func, log):
+        """
+        The training processes' target.
+
+        """
+        # (shared, private) pairs of arrays of dense parameters and their optimizer's statistics, and the private
+        # arrays' values after the last synchronization
+        arrays = []
+        lr_opt_state = self.model.lr_opt.state
+        for name in self.dense_names:
+            shared_value = self.model.params_full[name].value.detach()
+            arrays.append((shared_value, self.model.params_full[name].value.get_value(borrow=True)))
+            shared_stats = lr_opt_state.get(name, [])
+            lr_opt_state[name] = [stat.copy() for stat in shared_stats]
+            arrays.extend(zip(shared_stats, lr_opt_state[name]))
+        snapshots = [shared_value.copy() for shared_value, _ in arrays]
+
+        counter = 0
+        for counter, batch in enumerate(iterator, 1):
+            metrics = train_func(batch=batch)
+            self.nr_words[trainer_id] += len(batch.center_words)
+            self.nr_steps[trainer_id] = counter
+            if counter % self.sync_interval == 0:
+                self.__synchronize(arrays, snapshots)
+            if counter % 10 == 0:
+                log.write(metrics_to_str(metrics, prefix="trainer #%d chunk's # %d" % (trainer_id, counter)))
+        if counter % self.sync_interval != 0:
+            self.__synchronize(arrays, snapshots)
+
+    def __synchronize(self, arrays, snapshots):
+        """
+        Adds the process's updates of private arrays since the last synchronization, divided by the number of
+        processes, to the shared arrays, and continues from the result.
+
+        """
+        with self.lock:
+            for (shared_value, value), snapshot in zip(arrays, snapshots):
+                shared_value += (value - snapshot) / self.nr_trainers
+                value[...] = shared_value
+                snapshot[...] = shared_value
+
+    def __report(self, log, elapsed_time):
+        speeds = self.nr_words / max(elapsed_time, 1e-6)
+        log.write("words/sec: %s, total: %.1f" % (", ".join("trainer #%d: %.1f" % (trainer_id, speed)
+                                                           for trainer_id, speed in enumerate(speeds)),
+                                                 np.sum(speeds)))
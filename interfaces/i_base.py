@@ -1,10 +1,17 @@
 from libraries.utils.paths_and_files import get_subdir_number
-import sys, os
-from interfaces.support import load, save, metrics_to_str
+import sys, os, time
+import numpy as np
+from collections import OrderedDict
+from interfaces.support import load, metrics_to_str
 from libraries.tools.log import Log
 from libraries.utils.other import merge_ordered_dicts
 from interfaces.support import infer_attributes_to_log, format_experimental_setup
 from libraries.tools.ordered_attrs import OrderedAttrs
+from interfaces.hogwild import HogwildTrainer
+from libraries.tools.checkpoint import save_checkpoint, load_checkpoint, CHECKPOINT_FILE_NAME
+from libraries.tools.params_archive import is_params_archive, PARAMS_ARCHIVE_FOLDER_NAME
+from models.model_archive import load_model
+from libraries.tools.training_metrics import MetricsWriter, ThroughputMonitor, METRICS_FILE_NAME, METRICS_FORMATS
 
 # a dirty hack from:
 # http://stackoverflow.com/questions/24171725/scikit-learn-multicore-attributeerror-stdin-instance-has-no-attribute-close
@@ -22,13 +29,43 @@ class IBase(OrderedAttrs):
     """
     def __init__(self, model_class, vocab, epochs=5, learning_rate=0.001, max_vocab_size=50000, batch_size=100, nr_neg_samples=5, embedding_size=100,
                  train_data_path=None, val_data_path=None, test_data_path=None,
-                 output_dir=None):
+                 output_dir=None, nr_trainers=1, sync_interval=100, checkpoint_interval=None,
+                 checkpoint_minutes=None, metrics_format="jsonl", metrics_buffer_size=100, output_path=None):
+        """
+        :param nr_trainers: the number of training processes, if larger than 1, processes train on disjoint shards of
+                            data with shared embeddings(see interfaces.hogwild.HogwildTrainer).
+        :param sync_interval: the number of batches after which a training process merges its dense parameters.
+        :param checkpoint_interval: if set, a checkpoint is written every checkpoint_interval batches.
+        :param checkpoint_minutes: if set, a checkpoint is written when checkpoint_minutes have passed since the last
+                                   one. Checkpoints are also written after every epoch if any of the two is set.
+        :param metrics_format: the format of the file in the output folder that per-batch timings, throughput,
+                               queue depth and memory usage are written to(see libraries.tools.training_metrics),
+                               one of METRICS_FORMATS or None to disable it.
+        :param metrics_buffer_size: the number of per-batch records after which the metrics file is flushed.
+        :param output_path: an existing output folder to continue writing to(e.g. the folder of a checkpoint that
+                            training is resumed from), its log and metrics files are appended to. By default, a new
+                            numbered folder is created in output_dir.
+
+        """
+        if nr_trainers > 1 and (checkpoint_interval or checkpoint_minutes):
+            raise ValueError("checkpoints are not supported for training in multiple processes(nr_trainers > 1)")
         OrderedAttrs.__init__(self)
 
         # will be assigned later on in the child class
         self.model = None
         self.init_iterator = None
 
+        self.nr_trainers = nr_trainers
+        self.sync_interval = sync_interval
+        self.hogwild_trainer = None
+
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_minutes = checkpoint_minutes
+        self.last_checkpoint_time = None
+        # the epoch, batch and iterator states that training should continue from, see resume()
+        self.resume_point = None
+        self.epoch = None
+
         self.model_class = model_class
         self.vocab = vocab
         self.train_data_path = train_data_path
@@ -36,14 +73,28 @@ class IBase(OrderedAttrs):
         self.test_data_path = test_data_path
         self.epochs = epochs
 
-        output_dir = os.path.join(os.getcwd(), output_dir) if output_dir else os.path.join(os.getcwd(), 'output')
-        print(f'output_dir: {output_dir}')
-        output_number = get_subdir_number(output_dir)
-        learning_rate_for_dir = str(learning_rate)[2:]
-        vocab_size_for_dir = f'{str(max_vocab_size)[:-3]}k'
-        output_index = f'{output_number}_lr{learning_rate_for_dir}_e{str(epochs)}_v{vocab_size_for_dir}_bs{batch_size}_nns{nr_neg_samples}_es{embedding_size}'
-        self.output_path = os.path.join(output_dir, output_index)
-        self.log = Log(self.output_path)  # will write log to a current w. dir. if not provide
+        if output_path:
+            self.output_path = output_path
+        else:
+            output_dir = os.path.join(os.getcwd(), output_dir) if output_dir else os.path.join(os.getcwd(), 'output')
+            print(f'output_dir: {output_dir}')
+            output_number = get_subdir_number(output_dir)
+            learning_rate_for_dir = str(learning_rate)[2:]
+            vocab_size_for_dir = f'{str(max_vocab_size)[:-3]}k'
+            output_index = f'{output_number}_lr{learning_rate_for_dir}_e{str(epochs)}_v{vocab_size_for_dir}_bs{batch_size}_nns{nr_neg_samples}_es{embedding_size}'
+            self.output_path = os.path.join(output_dir, output_index)
+        self.log = Log(self.output_path, resume=bool(output_path))  # will write log to a current w. dir. if not provide
+        self.checkpoint_path = os.path.join(self.output_path, CHECKPOINT_FILE_NAME)
+
+        metrics_writer = None
+        if metrics_format:
+            if metrics_format not in METRICS_FORMATS:
+                raise ValueError("unknown metrics format '%s', expected one of %s"
+                                 % (metrics_format, ", ".join(METRICS_FORMATS)))
+            metrics_writer = MetricsWriter(os.path.join(self.output_path,
+                                                        METRICS_FILE_NAME + METRICS_FORMATS[metrics_format]),
+                                           file_format=metrics_format, buffer_size=metrics_buffer_size)
+        self.throughput_monitor = ThroughputMonitor(metrics_writer)
 
     def init_model(self, **kwargs):
         """
@@ -61,10 +112,14 @@ class IBase(OrderedAttrs):
         """
         assert self.train_data_path
 
-        for epoch in range(1, self.epochs+1):
+        first_epoch = self.resume_point["epoch"] if self.resume_point else 1
+        for epoch in range(first_epoch, self.epochs+1):
 
+            self.epoch = epoch
             self.log.write('epoch %d' % epoch)
             self.train(data_path=self.train_data_path)
+            if self.checkpoint_interval or self.checkpoint_minutes:
+                self.save_checkpoint(epoch=epoch + 1)
 
             # evaluate training and validation accuracy and loss
             if evaluate:
@@ -83,7 +138,7 @@ class IBase(OrderedAttrs):
 
         # save the actual model
         if save_model:
-            self.save_model(os.path.join(self.output_path, 'model.pkl'))
+            self.save_model(os.path.join(self.output_path, PARAMS_ARCHIVE_FOLDER_NAME))
             self.log.write("model is saved to: %s" % self.output_path)
 
         # run post training functions
@@ -95,24 +150,106 @@ class IBase(OrderedAttrs):
         :type data_path: str
 
         """
+        if self.nr_trainers > 1:
+            if self.hogwild_trainer is None:
+                self.hogwild_trainer = HogwildTrainer(self.model, self.nr_trainers, sync_interval=self.sync_interval)
+            self.hogwild_trainer.train(self.init_iterator, data_path, train_func=self._train, log=self.log)
+            return
         iterator = self.init_iterator(data_path)
-        for counter, batch in enumerate(iterator, 1):
+        first_counter = 0
+        if self.resume_point:
+            iterator.set_resume_states(self.resume_point["iterator"])
+            first_counter = self.resume_point["batch"]
+            self.resume_point = None
+        elif self.checkpoint_interval or self.checkpoint_minutes:
+            iterator.set_resume_states()
+        self.last_checkpoint_time = time.time()
+        monitor = self.throughput_monitor
+        monitor.start()
+        for counter, batch in enumerate(iterator, first_counter + 1):
+            monitor.batch_received()
+            queue_depth = iterator.get_queue_depth()
             metrics = self._train(batch=batch)
+            monitor.step_finished()
             if counter % 10 == 0:
                 self.log.write(metrics_to_str(metrics, prefix="chunk's # %d" % counter))
+            if self.__is_checkpoint_due(counter):
+                self.save_checkpoint(epoch=self.epoch, batch=counter, iterator=iterator)
+            nr_words, nr_examples = self._count_batch(batch)
+            monitor.batch_finished(nr_words, nr_examples,
+                                   extra=merge_ordered_dicts(OrderedDict((("epoch", self.epoch), ("batch", counter),
+                                                                          ("queue_depth", queue_depth))), metrics))
+        self.log.write(metrics_to_str(monitor.finish(), prefix="throughput"))
+
+    def __is_checkpoint_due(self, counter):
+        if self.checkpoint_interval and counter % self.checkpoint_interval == 0:
+            return True
+        return bool(self.checkpoint_minutes) and time.time() - self.last_checkpoint_time >= 60 * self.checkpoint_minutes
+
+    def save_checkpoint(self, epoch, batch=0, iterator=None):
+        """
+        Writes parameters, the optimizer's state, the random state and the position of training to the checkpoint
+        file in the output folder, the previous checkpoint is replaced.
+        :param epoch: the epoch that training should continue from
+        :param batch: the number of batches of the epoch that have been trained on
+        :param iterator: the resumable batch iterator of the epoch, if it has not been finished
+
+        """
+        state = {"progress": {"epoch": epoch, "batch": batch},
+                 "params": dict((name, param.value.get_value()) for name, param in self.model.params_full.items()),
+                 "optimizer": self.model.get_optimizer_state(),
+                 "random_state": np.random.get_state(),
+                 "iterator": iterator.get_resume_states() if iterator else None}
+        save_checkpoint(self.checkpoint_path, state)
+        self.last_checkpoint_time = time.time()
+        self.log.write("saved a checkpoint of epoch %d, batch %d to: %s" % (epoch, batch, self.checkpoint_path))
+
+    def resume(self, checkpoint_file_path):
+        """
+        Restores the model's parameters and the optimizer's state from a checkpoint, train_workflow() will continue
+        from the batch after the checkpoint. The model should be initialized with the same hyper-parameters, and
+        the same data and vocabulary should be used. To continue writing to the checkpoint's folder, the interface
+        should be created with output_path set to it.
 
-    def load_model(self, model_file_path):
         """
-        :param model_file_path: pre-saved pkl file with a model.
+        assert self.model  # the model should be initialized
+        if self.nr_trainers > 1:
+            raise ValueError("training in multiple processes(nr_trainers > 1) can't be resumed from a checkpoint")
+        state = load_checkpoint(checkpoint_file_path)
+        for name, value in state["params"].items():
+            if name not in self.model.params_full:
+                raise ValueError("Could not find the parameter by '%s' name" % name)
+            self.model.params_full[name].value.set_value(value)
+        self.model.set_optimizer_state(state["optimizer"])
+        np.random.set_state(tuple(state["random_state"]))
+        self.resume_point = {"epoch": state["progress"]["epoch"], "batch": state["progress"]["batch"],
+                             "iterator": state["iterator"]}
+        self.log.write("resumed from epoch %d, batch %d of the checkpoint: %s" % (self.resume_point["epoch"],
+                                                                                 self.resume_point["batch"],
+                                                                                 checkpoint_file_path))
+
+    def load_model(self, model_file_path, lr_opt=None):
+        """
+        :param model_file_path: a parameters archive folder that was written by save_model(), or a pre-saved pkl file
+                                with a model.
+        :param lr_opt: the learning rate optimizer of the model that is rebuilt from an archive, by default the
+                       archived one is recreated.
 
         """
-        self.model = load(model_file_path)
+        if is_params_archive(model_file_path):
+            self.model = load_model(model_file_path, model_class=self.model_class, lr_opt=lr_opt)
+        else:
+            self.model = load(model_file_path)
         self.record_experimental_setup()
         self.log.write("loaded the model from: %s" % model_file_path)
 
-    def save_model(self, file_path):
+    def save_model(self, folder_path):
+        """
+        Saves the model's parameters and hyper-parameters as an archive folder, see load_model().
+
+        """
         assert self.model  # the model should be initialized
-        save(self.model, file_path)
+        self.model.save_params(os.path.dirname(folder_path), os.path.basename(folder_path))
 
     def load_params(self, params_dump_file_path=None, exclude_params=[]):
         """
@@ -146,6 +283,14 @@ class IBase(OrderedAttrs):
         """
         raise NotImplementedError
 
+    def _count_batch(self, batch):
+        """
+        Returns the number of words and the number of training examples in the batch, they are used in throughput
+        metrics.
+
+        """
+        return len(batch), len(batch)
+
     def _measure_performance(self, **kwargs):
         """
         Computes the performance of the model and returns a dictionary with names and values.
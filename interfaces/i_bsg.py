@@ -1,8 +1,13 @@
-from models.bsg import BSG
 from interfaces.i_base import IBase
 from collections import OrderedDict
 from libraries.batch_iterators.window_batch_iterator import WindowBatchIterator as BatchIterator
-from interfaces.support import compute_loss
+from interfaces.support import compute_loss, get_encoded_data_path
+from libraries.data_iterators.encoded_data_iterator import load_or_create_encoded_corpus
+try:
+    from models.bsg import BSG
+except ImportError:
+    # theano is not required by the numpy backend(models.numpy_bsg.NumpyBSG)
+    BSG = None
 
 
 class IBSG(IBase):
@@ -12,9 +17,10 @@ class IBSG(IBase):
     """
     def __init__(self, data_iterator, vocab, half_window_size=5, nr_neg_samples=5, batch_size=5,
                  epochs=5, max_vocab_size=50000, learning_rate=0.0001, embedding_size=100,
-                 subsampling_threshold=None, **kwargs):
+                 subsampling_threshold=None, vectors_formats=("text", ), nr_workers=1,
+                 seed=None, encoded_data_folder=None, model_class=BSG, **kwargs):
         # init the parent object
-        IBase.__init__(self, vocab=vocab, model_class=BSG,
+        IBase.__init__(self, vocab=vocab, model_class=model_class,
                        epochs=epochs,
                        max_vocab_size=max_vocab_size,
                        learning_rate=learning_rate,
@@ -27,9 +33,25 @@ class IBSG(IBase):
         self.half_window_size = half_window_size
         self.nr_neg_samples = nr_neg_samples
         self.subsampling_threshold = subsampling_threshold
+        self.vectors_formats = vectors_formats
+        self.nr_workers = nr_workers
+        self.seed = seed
 
-        self.init_iterator = lambda data_path: BatchIterator(vocab, data_path, data_iterator, half_window_size=half_window_size, nr_neg_samples=nr_neg_samples,
-                                                             subsampling_threshold=subsampling_threshold, batch_size=batch_size)
+        self.encoded_data_folder = encoded_data_folder
+
+        def init_iterator(data_path):
+            # data is tokenized and encoded only once, later epochs and evaluations read the memory-mapped ids
+            if encoded_data_folder:
+                encoded_data_path = get_encoded_data_path(encoded_data_folder, data_path)
+                return BatchIterator(vocab, encoded_data_path,
+                                     load_or_create_encoded_corpus(data_iterator, vocab, data_path, encoded_data_path),
+                                     half_window_size=half_window_size, nr_neg_samples=nr_neg_samples,
+                                     subsampling_threshold=subsampling_threshold, batch_size=batch_size,
+                                     nr_workers=nr_workers, seed=seed)
+            return BatchIterator(vocab, data_path, data_iterator, half_window_size=half_window_size,
+                                 nr_neg_samples=nr_neg_samples, subsampling_threshold=subsampling_threshold,
+                                 batch_size=batch_size, nr_workers=nr_workers, seed=seed)
+        self.init_iterator = init_iterator
 
     def _measure_performance(self, data_path):
         return {"loss": compute_loss(self.init_iterator(data_path), loss_func=self.loss_func)}
@@ -39,11 +61,16 @@ class IBSG(IBase):
                                                              batch.center_words, batch.mask)
         return OrderedDict((("margin", mean_margin), ("kl", mean_kl), ("log_det", avg_log_det)))
 
+    def _count_batch(self, batch):
+        # words are center words(as in word2vec's words/sec), examples are pairs of center and context words
+        return len(batch.center_words), int(batch.mask.sum())
+
     def loss_func(self, batch):
         return self.model.loss(batch.pos_context_words, batch.neg_context_words, batch.center_words, batch.mask)
 
     def _post_training_logic(self):
         # will execute this code after the training workflow is finished, can contain custom functions, e.g. saving
         # of word embeddings
-        self.model.save_word_vectors(self.vocab, vectors_folder=self.output_path)
+        self.model.save_word_vectors(self.vocab, vectors_folder=self.output_path,
+                                     vectors_formats=self.vectors_formats)
         self.log.write("Word vectors are saved to: %s" % self.output_path)
\ No newline at end of file
@@ -4,7 +4,17 @@ from libraries.data_iterators.open_text_data_iterator import OpenTextDataIterato
 from libraries.tools.vocabulary import Vocabulary
 from libraries.tokenizers.bsg_tokenizer import BSGTokenizer
 from interfaces.i_bsg import IBSG
-from libraries.misc.optimizations import Adam
+from models.numpy_bsg import NumpyBSG
+from libraries.misc import numpy_optimizations
+try:
+    from models.bsg import BSG
+    from libraries.misc.optimizations import Adam
+except ImportError:
+    # theano and lasagne are required only by the theano backend
+    BSG = Adam = None
+
+# training backends that can be selected in get_interface()
+BACKENDS = ("theano", "numpy")
 
 
 class InterfaceConfigurator:
@@ -26,7 +36,18 @@ class InterfaceConfigurator:
                       max_vocab_size=10000,
                       batch_size=500,
                       nr_neg_samples=10,
-                      embedding_size=200):
+                      embedding_size=200,
+                      vectors_formats=("text", ),
+                      nr_workers=1,
+                      seed=None,
+                      encoded_data_folder=None,
+                      sparse_updates=False,
+                      backend="theano",
+                      nr_trainers=1,
+                      checkpoint_interval=None,
+                      checkpoint_minutes=None,
+                      resume_file_path=None,
+                      metrics_format="jsonl"):
 
         # Hyper-parameters
         half_window_size = 5  # (one sided)
@@ -48,18 +69,38 @@ class InterfaceConfigurator:
         data_iterator = OpenTextDataIterator(tokenizer=tokenizer)
 
         vocab = Vocabulary(data_iterator, max_size=max_vocab_size, min_count=1)
-        vocab.load_or_create(vocab_file_path, train_data_path)
+        vocab.load_or_create(vocab_file_path, train_data_path, nr_workers=nr_workers)
         vocab.assign_distr()
 
-        lr_opt = Adam(learning_rate=alpha, beta1=0.9, beta2=0.999)
+        # sparse updates change only embedding rows of words in the batch(lazy Adam)
+        if backend == "numpy":
+            model_class = NumpyBSG
+            lr_opt = numpy_optimizations.Adam(learning_rate=alpha, beta1=0.9, beta2=0.999, sparse=sparse_updates)
+        elif backend == "theano":
+            if BSG is None:
+                raise ValueError("the theano backend requires theano and lasagne to be installed")
+            model_class = BSG
+            lr_opt = Adam(learning_rate=alpha, beta1=0.9, beta2=0.999, sparse=sparse_updates)
+        else:
+            raise ValueError("unknown backend '%s', expected one of %s" % (backend, ", ".join(BACKENDS)))
+        if nr_trainers > 1 and backend != "numpy":
+            raise ValueError("training in multiple processes(nr_trainers > 1) requires the numpy backend")
+        if nr_trainers > 1 and not sparse_updates:
+            raise ValueError("training in multiple processes(nr_trainers > 1) requires sparse updates(sparse_updates)")
 
         i_model = IBSG(vocab=vocab, data_iterator=data_iterator, train_data_path=train_data_path,
                        half_window_size=half_window_size, nr_neg_samples=nr_neg_samples, subsampling_threshold=subsampling_threshold,
                        batch_size=batch_size, output_dir=output_folder_path,
-                       epochs=epochs, max_vocab_size=max_vocab_size, learning_rate=alpha, embedding_size=embedding_size)
+                       epochs=epochs, max_vocab_size=max_vocab_size, learning_rate=alpha, embedding_size=embedding_size,
+                       vectors_formats=vectors_formats, nr_workers=nr_workers, seed=seed,
+                       encoded_data_folder=encoded_data_folder, model_class=model_class,
+                       nr_trainers=nr_trainers, checkpoint_interval=checkpoint_interval,
+                       checkpoint_minutes=checkpoint_minutes, metrics_format=metrics_format,
+                       # resumed training continues to write to the checkpoint's folder
+                       output_path=os.path.dirname(os.path.abspath(resume_file_path)) if resume_file_path else None)
 
         if model_file_path:
-            i_model.load_model(model_file_path)
+            i_model.load_model(model_file_path, lr_opt=lr_opt)
         else:
             i_model.init_model(vocab_size=len(vocab), input_dim=input_dim, hidden_dim=h_dim, latent_dim=z_dim, lr_opt=lr_opt, margin=margin)
 
@@ -67,5 +108,9 @@ class InterfaceConfigurator:
         if params_file_path and not model_file_path:
             i_model.load_params(params_file_path)
 
+        # continue training from a checkpoint
+        if resume_file_path:
+            i_model.resume(resume_file_path)
+
         return i_model
 
@@ -1,3 +1,5 @@
+import os
+import hashlib
 import pickle
 import sys
 from collections import OrderedDict
@@ -60,4 +62,14 @@ def compute_loss(iterator, loss_func):
         datapoints_count += len(batch)
     # rescale back as the loss was averaged over nr. of datapoints in each batch
     total_loss *= (batch_size / datapoints_count)
-    return total_loss
\ No newline at end of file
+    return total_loss
+
+def get_encoded_data_path(encoded_data_folder, data_path):
+    """
+    Maps a data path to its own sub-folder of encoded_data_folder, e.g. training and validation data are encoded
+    separately.
+
+    """
+    data_path = os.path.abspath(data_path)
+    name = os.path.basename(os.path.normpath(data_path))
+    return os.path.join(encoded_data_folder, "%s_%s" % (name, hashlib.sha1(data_path.encode("utf-8")).hexdigest()[:10]))
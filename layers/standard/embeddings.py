@@ -1,3 +1,4 @@
+from theano.tensor.extra_ops import searchsorted
 from layers.layer import Layer
 from libraries.theano_support.extra import expand_dims
 
@@ -9,6 +10,25 @@ class Embeddings(Layer):
         self.output_dim = output_dim
         self.W = self.add_param("W", shape=(collection_size, output_dim), init_type=self.init_type,
                                 regularizable=self.regularizable)
+        # lookups can be restricted to a subset of rows, see restrict()
+        self.row_ids = None
+        self.rows = None
+
+    def restrict(self, row_ids):
+        """
+        Makes lookups go through rows = W[row_ids] instead of W, so that gradients of a graph built afterwards are
+        computed w.r.t. those rows only(e.g. for lazy optimizer updates).
+        :param row_ids: a sorted vector of unique ids that contains all ids which will be looked up
+        :return: the rows variable
+
+        """
+        self.row_ids = row_ids
+        self.rows = self.W[row_ids]
+        return self.rows
+
+    def unrestrict(self):
+        self.row_ids = None
+        self.rows = None
 
     def __call__(self, x, mask=None, perform_dimshuffle=True):
         """
@@ -16,7 +36,12 @@ class Embeddings(Layer):
 
         """
         # x = Print("x")(x)
-        res = self.W[x]
+        if self.row_ids is not None:
+            # map ids to positions in the restricted rows
+            positions = searchsorted(self.row_ids, x.flatten()).reshape(x.shape, ndim=x.ndim)
+            res = self.rows[positions]
+        else:
+            res = self.W[x]
         if mask:
             mask = expand_dims(mask, 2)
             res = res * mask
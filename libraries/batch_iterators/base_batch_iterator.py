@@ -1,34 +1,259 @@
-from multiprocessing import Process, Queue 
+import traceback
+import numpy as np
+from multiprocessing import Process, Queue, Event
+from queue import Full, Empty
+
 
 class BaseBatchIterator():
 
-    def __init__(self):
-        pass
+    def __init__(self, nr_workers=1, seed=None, queue_size=5):
+        """
+        :param nr_workers: the number of producer processes, each of them processes its own shard of data.
+        :param seed: if provided, every worker seeds its random generators with seed + worker_id and batches are
+                     yielded round-robin over workers, which makes the order of batches deterministic.
+        :param queue_size: the maximum number of pre-loaded batches per worker.
+
+        """
+        assert nr_workers >= 1
+        self.nr_workers = nr_workers
+        self.seed = seed
+        self.queue_size = queue_size
+        # the shard of data that is processed by the iterator, it's split further between workers
+        self.shard_id = 0
+        self.nr_shards = 1
+        # states of workers that allow to resume iteration, see set_resume_states()
+        self.resumable = False
+        self.resume_states = {}
+        self.worker_id = None
+        self.__next_worker_id = 0
+        # the workers' queues of the running iteration
+        self.__queues = None
 
     def __iter__(self):
         """
-        Separate process pre-loading of data and iteration over its batches.
+        Separate processes pre-loading of data and iteration over its batches. If the consumer stops early, the
+        workers are stopped and joined.
 
         """
-        process, queue = self.__i_parallel_load_data_batches()
-        process.start()
-        process.deamon = True
-        while True:
-            batch = queue.get()
-            if batch is None:
-                process.join()
-                break  # the file has ended
-            yield batch
+        processes, queues, stop_event = self.__i_parallel_load_data_batches()
+        self.__queues = queues
+        for process in processes:
+            process.daemon = True
+            process.start()
+        try:
+            if self.seed is None:
+                batches = self.__i_iterate_first_come(queues[0], processes)
+            else:
+                # resumed iteration continues from the worker that is next in turn
+                start = self.__next_worker_id if self.resume_states else 0
+                batches = self.__i_iterate_round_robin(queues[start:] + queues[:start], processes)
+            for batch in batches:
+                if self.resumable:
+                    # the batch is consumed when the next one is requested
+                    self.resume_states[batch.state["worker_id"]] = batch.state
+                    self.__next_worker_id = (batch.state["worker_id"] + 1) % self.nr_workers
+                yield batch
+        finally:
+            self.__i_shutdown(processes, stop_event)
+            self.resume_states = {}
+            self.__queues = None
+
+    def get_queue_depth(self):
+        """
+        :return: the number of batches that are waiting in the workers' queues, or None if no iteration is running or
+                 the platform doesn't implement Queue.qsize()(e.g. macOS).
+
+        """
+        if self.__queues is None:
+            return None
+        try:
+            # workers share one queue if the order of batches is not deterministic
+            return sum(queue.qsize() for queue in set(self.__queues))
+        except NotImplementedError:
+            return None
+
+    def set_resume_states(self, resume_states=None):
+        """
+        Makes workers attach their states to batches, so that iteration can be resumed after the last consumed batch.
+        :param resume_states: states that were returned by get_resume_states() during a previous iteration with the
+                              same number of workers and the same shard, the next iteration continues from them.
+
+        """
+        self.resumable = True
+        if resume_states:
+            if resume_states["nr_workers"] != self.nr_workers:
+                raise ValueError("the iteration was started with %d workers, it can't be resumed with %d"
+                                 % (resume_states["nr_workers"], self.nr_workers))
+            self.resume_states = dict((int(worker_id), state) for worker_id, state
+                                      in resume_states["workers"].items())
+            self.__next_worker_id = resume_states["next_worker_id"]
+
+    def get_resume_states(self):
+        """
+        :return: states of workers after their last consumed batches, a worker that has no state starts from the
+                 beginning of its data.
+
+        """
+        assert self.resumable
+        return {"nr_workers": self.nr_workers, "next_worker_id": self.__next_worker_id,
+                "workers": dict((str(worker_id), state) for worker_id, state in self.resume_states.items())}
+
+    def get_worker_resume_state(self):
+        """
+        :return: the state that the current worker should continue from, or None.
+
+        """
+        return self.resume_states.get(self.worker_id)
 
     def load_data_batches_to_queue(self, queue):
         raise NotImplementedError  # this has to be assigned in a subclass
 
-    def __i_parallel_load_data_batches(self, queue_size=5):
+    def set_shard(self, shard_id, nr_shards):
         """
-        Loads batches on a separate process.
+        Restricts the data that is processed by the iterator to its shard(e.g. of a training process), workers
+        process disjoint parts of the shard. The data iterator is restricted only in workers, as it can be shared by
+        several batch iterators.
 
         """
-        queue = Queue(queue_size)
-        process = Process(target=self.load_data_batches_to_queue, args=(queue, ))
-        return process, queue
+        assert 0 <= shard_id < nr_shards
+        self.shard_id = shard_id
+        self.nr_shards = nr_shards
+
+    def set_random_seed(self, seed):
+        """
+        Seeds the random generators that are used by the current worker, children classes extend it with their own
+        generators(e.g. a negative sampler).
+
+        """
+        np.random.seed(seed)
+
+    def _produce(self, queue, worker_id, stop_event):
+        """
+        The workers' target: loads batches of the worker's shard to the queue.
+
+        """
+        self.worker_id = worker_id
+        # workers of all shards are numbered globally
+        global_worker_id = self.shard_id * self.nr_workers + worker_id
+        if self.seed is not None:
+            self.set_random_seed(self.seed + global_worker_id)
+        elif self.nr_workers > 1 or self.nr_shards > 1:
+            # forked workers inherit the same random state, so they would produce identical samples
+            self.set_random_seed(None)
+        if self.nr_shards * self.nr_workers > 1:
+            self.data_iterator.set_shard(global_worker_id, self.nr_shards * self.nr_workers)
+        worker_queue = _WorkerQueue(queue, stop_event)
+        try:
+            try:
+                self.load_data_batches_to_queue(worker_queue)
+            except Exception:
+                # the consumer re-raises the error instead of waiting for the end of the worker's shard
+                worker_queue.put(_WorkerError(global_worker_id, traceback.format_exc()))
+        except _ConsumerStopped:
+            # batches that were not consumed should not block the worker's exit
+            queue.cancel_join_thread()
+
+    def __i_iterate_first_come(self, queue, processes):
+        """
+        Yields batches in the order they are produced, workers share the queue.
+
+        """
+        nr_running = self.nr_workers
+        while nr_running:
+            batch = self.__i_get(queue, processes)
+            if batch is None:
+                nr_running -= 1  # a worker's shard has ended
+                continue
+            yield batch
+
+    def __i_iterate_round_robin(self, queues, processes):
+        """
+        Yields one batch per worker in turns, a worker is skipped when its shard has ended.
+
+        """
+        running = list(queues)
+        while running:
+            for queue in list(running):
+                batch = self.__i_get(queue, processes)
+                if batch is None:
+                    running.remove(queue)
+                    continue
+                yield batch
+
+    @staticmethod
+    def __i_get(queue, processes, poll_interval=1.):
+        """
+        Waits for the next item of the queue.
+        :raises RuntimeError: if a worker has failed, or has died(e.g. was killed) without finishing its shard
+
+        """
+        while True:
+            try:
+                item = queue.get(timeout=poll_interval)
+            except Empty:
+                for process in processes:
+                    if process.exitcode is not None and process.exitcode != 0:
+                        raise RuntimeError("a worker that produces batches has died with the exit code %d"
+                                           % process.exitcode)
+                continue
+            if isinstance(item, _WorkerError):
+                raise RuntimeError("the worker #%d that produces batches has failed:\n%s"
+                                   % (item.worker_id, item.traceback))
+            return item
+
+    def __i_parallel_load_data_batches(self):
+        """
+        Creates worker processes, they share one queue unless the deterministic order is required.
+
+        """
+        stop_event = Event()
+        if self.seed is None:
+            queues = [Queue(self.queue_size * self.nr_workers)] * self.nr_workers
+        else:
+            queues = [Queue(self.queue_size) for _ in range(self.nr_workers)]
+        processes = [Process(target=self._produce, args=(queue, worker_id, stop_event))
+                     for worker_id, queue in enumerate(queues)]
+        return processes, queues, stop_event
+
+    @staticmethod
+    def __i_shutdown(processes, stop_event, timeout=5):
+        stop_event.set()
+        for process in processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+class _ConsumerStopped(Exception):
+    pass
+
+
+class _WorkerError:
+    """
+    Is put to the queue instead of the remaining batches of a worker that has failed.
+
+    """
+    def __init__(self, worker_id, traceback):
+        self.worker_id = worker_id
+        self.traceback = traceback
+
+
+class _WorkerQueue:
+    """
+    Wraps a worker's queue such that put() interrupts the worker when the consumer has stopped.
+
+    """
+    def __init__(self, queue, stop_event, poll_interval=0.1):
+        self.queue = queue
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval
 
+    def put(self, batch):
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(batch, timeout=self.poll_interval)
+                return
+            except Full:
+                continue
+        raise _ConsumerStopped
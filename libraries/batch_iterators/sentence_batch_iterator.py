@@ -1,8 +1,9 @@
-from support import allow_with_prob, sample_words, create_context_windows, pad_sents
+from support import compute_removal_probs, subsample, create_context_windows, pad_sents
 from base_batch_iterator import BaseBatchIterator
 from libraries.data_iterators.open_text_data_iterator import OpenTextDataIterator
 from window_batch_iterator import Batch
 from libraries.tools.vocabulary import PAD_TOKEN, UNK_TOKEN
+from libraries.tools.alias_sampler import AliasSampler
 import numpy as np
 try:
     import re2 as re
@@ -17,12 +18,14 @@ class SentenceBatchIterator(BaseBatchIterator):
     """
 
     def __init__(self, vocab, data_path, data_iterator, subsampling_threshold=None, batch_size=50,
-                 max_sentence_length=None):
+                 max_sentence_length=None, nr_workers=1, seed=None):
         """
         :param data_path: a path to data, can be a folder or a file path.
         :param subsampling_threshold: used in computation of words removal probability. The smaller the threshold
                                       the larger is the removal probability. In the original paper it was 1e-5.
                                       If None is passed, the subsampling will not be applied.
+        :param nr_workers: the number of processes that produce batches, see BaseBatchIterator.
+        :param seed: makes sampling and the order of batches deterministic, see BaseBatchIterator.
 
         """
         assert all([symbol in vocab for symbol in [PAD_TOKEN, UNK_TOKEN]])
@@ -31,13 +34,23 @@ class SentenceBatchIterator(BaseBatchIterator):
         self.vocab = vocab
         self.data_path = data_path
         self.subsampling_threshold = subsampling_threshold
+        if subsampling_threshold:
+            self.removal_probs = compute_removal_probs(vocab.counts, vocab.total_count,
+                                                       subsampling_threshold=subsampling_threshold)
         self.batch_size = batch_size
         self.max_sentence_length = max_sentence_length
 
         self.data_iterator = data_iterator
         self.data_iterator.set_data_path(data_path)
 
-        BaseBatchIterator.__init__(self)
+        # negative samples are drawn from the unigram distribution
+        self.neg_sampler = AliasSampler(vocab.uni_distr, seed=seed)
+
+        BaseBatchIterator.__init__(self, nr_workers=nr_workers, seed=seed)
+
+    def set_random_seed(self, seed):
+        BaseBatchIterator.set_random_seed(self, seed)
+        self.neg_sampler.seed(seed)
 
     def load_data_batches_to_queue(self, queue):
         """
@@ -51,13 +64,13 @@ class SentenceBatchIterator(BaseBatchIterator):
         containers_current_size = 0
         max_length = 0
         for sentence, in self.data_iterator:
+            # convert to word_ids
+            sentence_ids = self.vocab.encode(sentence)
+
             # apply subsampling
             if self.subsampling_threshold:
-                sentence = [token for token in sentence if allow_with_prob(self.vocab[token].count,
-                                                                           self.vocab.total_count,
-                                                                           subsampling_threshold=self.subsampling_threshold)]
-            # convert to word_ids
-            sentence_ids = [obj.id for obj in self.vocab[sentence]]
+                sentence_ids = subsample(sentence_ids, self.removal_probs)
+            sentence_ids = sentence_ids.tolist()
 
             # trim the sentence
             if self.max_sentence_length:
@@ -101,9 +114,7 @@ class SentenceBatchIterator(BaseBatchIterator):
         mask = np.concatenate((left_mask, right_mask), axis=1)
 
         # generate negative samples
-        neg_context = sample_words(context.shape[0], len(self.vocab), self.vocab.uni_distr,
-                                   nr_neg_samples=context.shape[1])
-        neg_context = np.array(neg_context, dtype="int32")
+        neg_context = self.neg_sampler.sample(context.shape)
 
         batch = Batch(pos_context_words=context, neg_context_words=neg_context, center_words=center_words, mask=mask)
         return batch
\ No newline at end of file
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 # contains helper functions that are used in different iterators
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 np.random.seed(1)
 
 def pad_sents(sentences, max_length, pad_symbol, mask_current=False, padding_mode='both'):
@@ -66,15 +67,27 @@ def pad_sent(sentence, max_length, pad_symbol, mask_current=False, padding_mode=
     return res, mask
 
 
-def allow_with_prob(word_count, total_words_count, subsampling_threshold=1e-5):
+def compute_removal_probs(counts, total_words_count, subsampling_threshold=1e-5):
     """
     Sub-sampling of frequent words: can improve both accuracy and speed for large data sets
     Source: "Distributed Representations of Words and Phrases and their Compositionality".
+    :param counts: an array [vocab_size] of word counts indexed by word ids
+    :return: an array [vocab_size] of removal probabilities, they are negative for rare words that are always kept
 
     """
-    freq = float(word_count) / float(total_words_count)
-    removal_prob = 1.0 - np.sqrt(subsampling_threshold / freq)
-    return np.random.random_sample() > removal_prob
+    freqs = np.asarray(counts, dtype="float64") / float(total_words_count)
+    with np.errstate(divide='ignore'):
+        return 1.0 - np.sqrt(subsampling_threshold / freqs)
+
+
+def subsample(word_ids, removal_probs):
+    """
+    Removes frequent words from an array of word ids with one random draw per word.
+    :param removal_probs: an array computed by compute_removal_probs()
+
+    """
+    word_ids = np.asarray(word_ids)
+    return word_ids[np.random.random_sample(len(word_ids)) > removal_probs[word_ids]]
 
 
 def create_context_windows(sentence, half_window_size=0):
@@ -94,6 +107,33 @@ def create_context_windows(sentence, half_window_size=0):
             yield (center_word, sentence[0:idx], sentence[idx + 1:])
 
 
+def create_context_window_arrays(sentences_ids, half_window_size, pad_symbol):
+    """
+    A vectorised version of create_context_windows(with padded corners) over many sentences at once. Sentences are
+    laid out in one array where each of them is surrounded by half_window_size pad symbols, so a window never reaches
+    into a neighbouring sentence, and all windows are taken as strided views of that array.
+    :param sentences_ids: a list of sentences(lists or arrays of word ids) that are not padded
+    :return: center words [nr_windows], context words [nr_windows x 2*half_window_size] and the binary mask of the
+             same size where 0 indicates a padding
+
+    """
+    assert half_window_size > 0
+    lengths = np.array([len(sentence_ids) for sentence_ids in sentences_ids], dtype="int64")
+    padding = np.full_like(lengths, half_window_size)
+    segment_lengths = np.column_stack((padding, lengths, padding)).reshape((-1, ))
+    is_center = np.repeat(np.tile([False, True, False], len(lengths)), segment_lengths)
+
+    ids = np.full(len(is_center), pad_symbol, dtype="int32")
+    if lengths.sum():
+        ids[is_center] = np.concatenate(sentences_ids)
+    windows = sliding_window_view(ids, 2 * half_window_size + 1)[np.flatnonzero(is_center) - half_window_size]
+
+    center_words = windows[:, half_window_size]
+    context_words = np.concatenate((windows[:, :half_window_size], windows[:, half_window_size + 1:]), axis=1)
+    mask = (context_words != pad_symbol).astype("float32")
+    return center_words, context_words, mask
+
+
 def create_continues_context_windows(sentence, special_center_words, half_window_size):
     """
     Creates windows where center words are separately marked(by using differnt vocab_ids) from context words.
@@ -105,7 +145,3 @@ def create_continues_context_windows(sentence, special_center_words, half_window
         context = sentence[idx - half_window_size:idx] + sentence[idx + 1:idx + half_window_size + 1]
         context_and_center = sentence[idx - half_window_size:idx] + [special_center_words[idx]] + sentence[idx + 1:idx + half_window_size + 1]
         yield (sentence[idx], context, context_and_center)
-
-
-def sample_words(batch_size,  vocab_size, distr, nr_neg_samples=1):
-    return np.random.choice(size=(batch_size, nr_neg_samples), replace=True, a=vocab_size, p=distr)
\ No newline at end of file
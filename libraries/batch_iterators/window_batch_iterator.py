@@ -1,6 +1,8 @@
-from libraries.batch_iterators.support import pad_sents, allow_with_prob, sample_words, create_context_windows
+from libraries.batch_iterators.support import compute_removal_probs, subsample, create_context_window_arrays
 from libraries.batch_iterators.base_batch_iterator import BaseBatchIterator
 from libraries.tools.vocabulary import PAD_TOKEN, UNK_TOKEN
+from libraries.tools.alias_sampler import AliasSampler
+from libraries.data_iterators.encoded_data_iterator import EncodedDataIterator
 import numpy as np
 try:
     import re2 as re
@@ -9,11 +11,13 @@ except ImportError:
 
 
 class Batch:
-    def __init__(self, pos_context_words, neg_context_words, center_words, mask):
+    def __init__(self, pos_context_words, neg_context_words, center_words, mask, state=None):
         self.pos_context_words = pos_context_words
         self.neg_context_words = neg_context_words
         self.center_words = center_words
         self.mask = mask
+        # the producing worker's state after the batch, see BaseBatchIterator.set_resume_states()
+        self.state = state
 
     def __len__(self):
         return self.pos_context_words.shape[0]
@@ -22,12 +26,15 @@ class Batch:
 class WindowBatchIterator(BaseBatchIterator):
 
     def __init__(self, vocab, data_path, data_iterator, half_window_size=5, nr_neg_samples=5,
-                 subsampling_threshold=None, batch_size=50):
+                 subsampling_threshold=None, batch_size=50, nr_workers=1, seed=None):
         """
-        :param data_path: a path to data, can be a folder or a file path.
+        :param data_path: a path to data, can be a folder or a file path, or a folder of encoded data if
+                          data_iterator is an EncodedDataIterator.
         :param subsampling_threshold: used in computation of words removal probability. The smaller the threshold
                                       the larger is the removal probability. In the original paper it was 1e-5.
                                       If None is passed, the subsampling will not be applied.
+        :param nr_workers: the number of processes that produce batches, see BaseBatchIterator.
+        :param seed: makes sampling and the order of batches deterministic, see BaseBatchIterator.
 
         """
         assert all([symbol in vocab for symbol in [PAD_TOKEN, UNK_TOKEN]])
@@ -36,84 +43,112 @@ class WindowBatchIterator(BaseBatchIterator):
         self.half_window_size = half_window_size
         self.nr_neg_samples = nr_neg_samples
         self.subsampling_threshold = subsampling_threshold
+        if subsampling_threshold:
+            self.removal_probs = compute_removal_probs(vocab.counts, vocab.total_count,
+                                                       subsampling_threshold=subsampling_threshold)
         self.batch_size = batch_size
 
         self.data_iterator = data_iterator
         self.data_iterator.set_data_path(data_path)
+        # an encoded data iterator yields sentences of word ids instead of tokens
+        self.encoded = isinstance(data_iterator, EncodedDataIterator)
 
-        BaseBatchIterator.__init__(self)
+        # negative samples are drawn from the unigram distribution
+        self.neg_sampler = AliasSampler(vocab.uni_distr, seed=seed)
+
+        BaseBatchIterator.__init__(self, nr_workers=nr_workers, seed=seed)
+
+    def set_random_seed(self, seed):
+        BaseBatchIterator.set_random_seed(self, seed)
+        self.neg_sampler.seed(seed)
 
     def load_data_batches_to_queue(self, queue):
         """
-        Loads batches sequentially to a queue.
+        Loads batches sequentially to a queue. Sentences are buffered until they contain at least batch_size words,
+        then windows of the whole buffer are created at once, and windows that don't fill a batch are carried over.
 
         """
+        context_size = 2 * self.half_window_size
+
         # create data placeholders
-        pos_context_words = []
-        center_words = []
-        batch_current_size = 0
-        max_length = 0
+        sentences_ids = []
+        buffer_size = 0
+        center_words = np.zeros((0, ), dtype="int32")
+        pos_context_words = np.zeros((0, context_size), dtype="int32")
+        mask = np.zeros((0, context_size), dtype="float32")
+
+        # continue from the state after the last consumed batch
+        resume_state = self.get_worker_resume_state()
+        if resume_state:
+            self.data_iterator.set_position(resume_state["data_position"])
+            np.random.set_state(tuple(resume_state["random_state"]))
+            self.neg_sampler.random_state.set_state(tuple(resume_state["neg_sampler_state"]))
+            center_words, pos_context_words, mask = resume_state["windows"]
 
         for sentence, in self.data_iterator:
 
-                # apply subsampling
-                if self.subsampling_threshold:
-                    sentence = [token for token in sentence if allow_with_prob(self.vocab[token].count,
-                                                                               self.vocab.total_count,
-                                                                               subsampling_threshold=self.subsampling_threshold)]
-                # convert to word_ids
-                sentence_ids = [obj.id for obj in self.vocab[sentence]]
-
-                # pad corners
-                sentence_ids = [self.vocab[PAD_TOKEN].id] * self.half_window_size + sentence_ids + \
-                               [self.vocab[PAD_TOKEN].id] * self.half_window_size
-
-                # create windows
-                for center_token, context_tokens in create_context_windows(sentence_ids, self.half_window_size):
-                    # add to the data holders
-                    center_words.append(center_token)
-                    pos_context_words.append(context_tokens)
-                    batch_current_size += 1
-                    max_length = max(max_length, len(context_tokens))
-
-                    # return the chunk when the container gets full
-                    if batch_current_size >= self.batch_size:
-                        # generate negative samples
-                        neg_context_words = sample_words(batch_current_size, len(self.vocab), self.vocab.uni_distr,
-                                                         nr_neg_samples=self.nr_neg_samples)
-                        batch = self.__create_batch(pos_context_words=pos_context_words,
-                                                    neg_context_words=neg_context_words,
-                                                    center_words=center_words, max_length=max_length)
-                        queue.put(batch)
-
-                        # reset
-                        pos_context_words = []
-                        center_words = []
-                        batch_current_size = 0
-                        max_length = 0
+            # convert to word_ids unless the data is already encoded
+            if not self.encoded:
+                sentence = self.vocab.encode(sentence)
+
+            # apply subsampling, sentences are subsampled while the buffer fills, i.e. before negative samples of
+            # earlier windows are drawn, so random draws are ordered differently than when windows were built per
+            # sentence(batches are the same only without subsampling)
+            if self.subsampling_threshold:
+                sentence = subsample(sentence, self.removal_probs)
+            sentences_ids.append(sentence)
+            buffer_size += len(sentences_ids[-1])
+            if buffer_size < self.batch_size:
+                continue
+
+            # create windows of the buffer and append them to the ones that were carried over
+            center_words, pos_context_words, mask = self.__append_windows(sentences_ids, center_words,
+                                                                          pos_context_words, mask)
+            sentences_ids = []
+            buffer_size = 0
+
+            # return full batches
+            center_words, pos_context_words, mask = self.__put_batches(queue, pos_context_words, center_words, mask)
 
         # return what has been collected if iteration is finished
-        if batch_current_size > 0:
-            # generate negative samples
-            neg_context_words = sample_words(batch_current_size, len(self.vocab), self.vocab.uni_distr,
-                                             nr_neg_samples=self.nr_neg_samples)
-            batch = self.__create_batch(pos_context_words=pos_context_words,
-                                        neg_context_words=neg_context_words,
-                                        center_words=center_words, max_length=max_length)
-            queue.put(batch)
+        if sentences_ids:
+            center_words, pos_context_words, mask = self.__append_windows(sentences_ids, center_words,
+                                                                          pos_context_words, mask)
+        self.__put_batches(queue, pos_context_words, center_words, mask, put_remainder=True)
         queue.put(None)  # to indicate that loading is finished
 
-    def __create_batch(self, pos_context_words, neg_context_words, center_words, max_length):
+    def __append_windows(self, sentences_ids, center_words, pos_context_words, mask):
+        new_center_words, new_pos_context_words, new_mask = create_context_window_arrays(
+            sentences_ids, self.half_window_size, pad_symbol=self.vocab[PAD_TOKEN].id)
+        return np.concatenate((center_words, new_center_words)), \
+            np.concatenate((pos_context_words, new_pos_context_words)), np.concatenate((mask, new_mask))
 
-        neg_context_words = np.array(neg_context_words, dtype="int32")
-        pos_context_words, mask = pad_sents(pos_context_words, max_length=max_length,
-                                            pad_symbol=self.vocab[PAD_TOKEN].id, mask_current=True)
-        center_words = np.array(center_words, dtype="int32")
+    def __put_batches(self, queue, pos_context_words, center_words, mask, put_remainder=False):
+        """
+        Splits windows into batches of batch_size and puts them to the queue.
+        :param put_remainder: whether windows that don't fill a batch should be put as a smaller batch
+        :return: center_words, pos_context_words, mask of windows that were not put
+
+        """
+        start = 0
+        while len(center_words) - start >= self.batch_size or (put_remainder and start < len(center_words)):
+            end = start + self.batch_size
+            batch = self.__create_batch(pos_context_words[start:end], center_words[start:end], mask[start:end])
+            if self.resumable:
+                # all windows of read sentences that are not in the batch or earlier ones are kept in the state
+                batch.state = {"worker_id": self.worker_id, "data_position": self.data_iterator.position,
+                               "random_state": np.random.get_state(),
+                               "neg_sampler_state": self.neg_sampler.random_state.get_state(),
+                               "windows": [center_words[end:], pos_context_words[end:], mask[end:]]}
+            queue.put(batch)
+            start = end
+        return center_words[start:], pos_context_words[start:], mask[start:]
 
-        # convert all to numpy arrays
-        # neg_context_words = np.array(neg_context_words, dtype="int32")
-        pos_context_words = np.array(pos_context_words, dtype="int32")
+    def __create_batch(self, pos_context_words, center_words, mask):
+        # generate negative samples
+        neg_context_words = self.neg_sampler.sample((len(center_words), self.nr_neg_samples))
 
-        batch = Batch(pos_context_words=pos_context_words, neg_context_words=neg_context_words,
-                      center_words=center_words, mask=mask)
-        return batch
\ No newline at end of file
+        batch = Batch(pos_context_words=np.ascontiguousarray(pos_context_words),
+                      neg_context_words=neg_context_words,
+                      center_words=np.ascontiguousarray(center_words), mask=np.ascontiguousarray(mask))
+        return batch
@@ -0,0 +1,200 @@
+import os
+import json
+import hashlib
+import numpy as np
+from libraries.utils.paths_and_files import get_file_paths
+from libraries.utils.other import get_qualified_name
+
+IDS_FILE_NAME = "ids.bin"
+OFFSETS_FILE_NAME = "offsets.bin"
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+class EncodedDataIterator():
+
+    def __init__(self, chunk_size=100000):
+        """
+        Data iterator over a corpus that was tokenized and converted to word ids once by encode_corpus(). The corpus
+        is stored as a flat int32 array of ids and an int64 array of sentence offsets, both are memory-mapped, so
+        iteration does no text processing. Yields sentences as (array of ids, ).
+        :param chunk_size: the approximate number of ids that are read from the memory-mapped array at once.
+
+        """
+        self.chunk_size = chunk_size
+        self.data_path = None
+        self.shard_id = 0
+        self.nr_shards = 1
+        # the position after the last yielded sentence and the one where iteration starts, see set_position()
+        self.position = None
+        self.start_position = None
+
+    def set_data_path(self, data_path):
+        """
+        :param data_path: a folder that was written by encode_corpus()
+
+        """
+        self.data_path = data_path
+
+    def set_shard(self, shard_id, nr_shards):
+        """
+        Restricts iteration to one of nr_shards contiguous shards of sentences with (almost) equal numbers of ids.
+
+        """
+        assert 0 <= shard_id < nr_shards
+        self.shard_id = shard_id
+        self.nr_shards = nr_shards
+
+    def set_position(self, position):
+        """
+        Makes the next iteration continue from a position that was recorded in the position attribute during a
+        previous iteration over the same shard.
+        :param position: [index of the next sentence]
+
+        """
+        self.start_position = position
+
+    def __iter__(self):
+        if not self.data_path:
+            raise ValueError("please specify the data_path first by calling set_data_path()")
+        ids, offsets = load_encoded_corpus(self.data_path)
+        first, last = 0, len(offsets) - 1
+        if self.nr_shards > 1:
+            # sentences are assigned to the shard where they begin
+            first = np.searchsorted(offsets[:-1], offsets[-1] * self.shard_id // self.nr_shards)
+            if self.shard_id < self.nr_shards - 1:
+                last = np.searchsorted(offsets[:-1], offsets[-1] * (self.shard_id + 1) // self.nr_shards)
+        self.position = self.start_position
+        if self.start_position:
+            first = max(first, self.start_position[0])
+            self.start_position = None
+        while first < last:
+            # read a chunk of whole sentences into memory at once
+            end = np.searchsorted(offsets, offsets[first] + self.chunk_size, side="right") - 1
+            end = max(first + 1, min(last, end))
+            chunk_offsets = offsets[first:end + 1] - offsets[first]
+            chunk = np.array(ids[offsets[first]:offsets[end]])
+            for i, (start, stop) in enumerate(zip(chunk_offsets[:-1], chunk_offsets[1:]), 1):
+                self.position = [int(first) + i]
+                yield chunk[start:stop],
+            first = end
+
+    def __len__(self):
+        """
+        :return: the number of sentences
+
+        """
+        _, offsets = load_encoded_corpus(self.data_path)
+        return len(offsets) - 1
+
+
+def encode_corpus(data_iterator, vocab, data_path, output_folder, chunk_size=1000000):
+    """
+    Tokenizes textual data via data_iterator, converts tokens to word ids and writes them to output_folder. Ids are
+    written in chunks, and the manifest that makes the folder valid is written last.
+    :param data_iterator: a data iterator over textual data that yields (tokens, )
+    :param data_path: a path to data, can be a folder or a file path.
+    :return: the output_folder
+
+    """
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    manifest_file_path = os.path.join(output_folder, MANIFEST_FILE_NAME)
+    if os.path.isfile(manifest_file_path):
+        os.remove(manifest_file_path)
+    ids_file_path = os.path.join(output_folder, IDS_FILE_NAME)
+    offsets_file_path = os.path.join(output_folder, OFFSETS_FILE_NAME)
+    data_iterator.set_data_path(data_path)
+
+    nr_ids = 0
+    nr_sentences = 0
+    ids_buffer = []
+    offsets_buffer = [0]
+    with open(ids_file_path + ".tmp", "wb") as ids_file, open(offsets_file_path + ".tmp", "wb") as offsets_file:
+        for tokens, in data_iterator:
+            ids_buffer.extend(vocab.encode(tokens))
+            offsets_buffer.append(nr_ids + len(ids_buffer))
+            nr_sentences += 1
+            if len(ids_buffer) >= chunk_size:
+                nr_ids += len(ids_buffer)
+                np.array(ids_buffer, dtype="int32").tofile(ids_file)
+                np.array(offsets_buffer, dtype="int64").tofile(offsets_file)
+                ids_buffer, offsets_buffer = [], []
+        nr_ids += len(ids_buffer)
+        np.array(ids_buffer, dtype="int32").tofile(ids_file)
+        np.array(offsets_buffer, dtype="int64").tofile(offsets_file)
+    os.replace(ids_file_path + ".tmp", ids_file_path)
+    os.replace(offsets_file_path + ".tmp", offsets_file_path)
+
+    manifest = {"fingerprint": compute_fingerprint(vocab, data_path, data_iterator), "nr_ids": nr_ids,
+                "nr_sentences": nr_sentences}
+    with open(manifest_file_path, "w") as f:
+        json.dump(manifest, f)
+    return output_folder
+
+
+def load_or_create_encoded_corpus(data_iterator, vocab, data_path, output_folder):
+    """
+    A convenience function that re-encodes data only if output_folder does not contain a valid encoding of the same
+    data with the same vocabulary and tokenization settings(see compute_fingerprint()).
+    :return: an EncodedDataIterator over the encoded data
+
+    """
+    manifest_file_path = os.path.join(output_folder, MANIFEST_FILE_NAME)
+    fingerprint = compute_fingerprint(vocab, data_path, data_iterator)
+    valid = False
+    if os.path.isfile(manifest_file_path):
+        with open(manifest_file_path) as f:
+            valid = json.load(f)["fingerprint"] == fingerprint
+    if not valid:
+        print("Encoding data from %s to %s..." % (data_path, output_folder))
+        encode_corpus(data_iterator, vocab, data_path, output_folder)
+    encoded_data_iterator = EncodedDataIterator()
+    encoded_data_iterator.set_data_path(output_folder)
+    return encoded_data_iterator
+
+
+def load_encoded_corpus(folder):
+    """
+    :return: memory-mapped ids [nr_ids] and offsets [nr_sentences + 1], sentence i is ids[offsets[i]:offsets[i+1]]
+
+    """
+    with open(os.path.join(folder, MANIFEST_FILE_NAME)) as f:
+        manifest = json.load(f)
+    offsets = np.memmap(os.path.join(folder, OFFSETS_FILE_NAME), dtype="int64", mode="r",
+                        shape=(manifest["nr_sentences"] + 1, ))
+    if manifest["nr_ids"] == 0:
+        return np.zeros((0, ), dtype="int32"), offsets
+    ids = np.memmap(os.path.join(folder, IDS_FILE_NAME), dtype="int32", mode="r", shape=(manifest["nr_ids"], ))
+    return ids, offsets
+
+
+def compute_fingerprint(vocab, data_path, data_iterator):
+    """
+    Computes a hash of everything that encoded ids depend on: the vocabulary's tokens in the order of their ids, the
+    paths, sizes and modification times of data files, and the tokenization settings of the data iterator(see
+    get_tokenization_config()).
+
+    """
+    sha = hashlib.sha1()
+    sha.update(json.dumps(get_tokenization_config(data_iterator), sort_keys=True).encode("utf-8") + b"\n")
+    for word in vocab:
+        sha.update(word.token.encode("utf-8") + b"\n")
+    for file_path in get_file_paths(data_path):
+        stat = os.stat(file_path)
+        sha.update(("%s %d %d\n" % (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)).encode("utf-8"))
+    return sha.hexdigest()
+
+
+def get_tokenization_config(data_iterator):
+    """
+    :return: a json-serializable dict of the data iterator's class and its tokenizer's settings. Tokenizers describe
+             their settings by get_config(), other ones(e.g. functions) by their names only.
+
+    """
+    tokenizer = getattr(data_iterator, "tokenizer", None)
+    if hasattr(tokenizer, "get_config"):
+        config = tokenizer.get_config()
+    else:
+        config = {"tokenizer": get_qualified_name(tokenizer) if tokenizer is not None else None}
+    config["data_iterator"] = type(data_iterator).__name__
+    return config
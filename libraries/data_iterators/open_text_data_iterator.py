@@ -1,7 +1,6 @@
 from nltk import word_tokenize as default_tokenizer
-from libraries.data_iterators.support import deal_with_accents
+from libraries.data_iterators.support import deal_with_accents, get_shard_byte_ranges, read_lines_in_byte_range
 from libraries.utils.paths_and_files import get_file_paths
-import codecs #Python 3
 
 class OpenTextDataIterator():
 
@@ -13,16 +12,49 @@ class OpenTextDataIterator():
         """
         self.tokenizer = tokenizer if tokenizer else default_tokenizer
         self.data_path = None
+        self.shard_id = 0
+        self.nr_shards = 1
+        # the position after the last yielded sentence and the one where iteration starts, see set_position()
+        self.position = None
+        self.start_position = None
 
     def set_data_path(self, data_path):
         self.data_path = data_path
 
+    def set_shard(self, shard_id, nr_shards):
+        """
+        Restricts iteration to one of nr_shards byte-range shards of the data, e.g. for producer workers.
+
+        """
+        assert 0 <= shard_id < nr_shards
+        self.shard_id = shard_id
+        self.nr_shards = nr_shards
+
+    def set_position(self, position):
+        """
+        Makes the next iteration continue from a position that was recorded in the position attribute during a
+        previous iteration over the same shard.
+        :param position: [file_path, byte offset of a line, number of its sub-lines to skip]
+
+        """
+        self.start_position = position
+
     def __iter__(self):
         if not self.data_path:
             raise ValueError("please specify the data_path first by calling set_data_path()")
-        for filename in get_file_paths(self.data_path):
-            with codecs.open(filename,'r',encoding='utf-8') as f: #Python 3
-                for line in f:
-                    # tokens = self.tokenizer(deal_with_accents(line.strip().lower().decode('utf-8', 'ignore')))
-                    tokens = self.tokenizer(deal_with_accents(line.strip().lower())) # python 3
-                    yield tokens,
+        # without sharding, the only shard consists of whole files
+        byte_ranges = get_shard_byte_ranges(get_file_paths(self.data_path), self.shard_id, self.nr_shards)
+        start_position, self.start_position = self.start_position, None
+        self.position = start_position
+        if start_position:
+            file_paths = [filename for filename, _, _ in byte_ranges]
+            if start_position[0] not in file_paths:
+                raise ValueError("'%s' is not a part of the data's shard" % start_position[0])
+            byte_ranges = byte_ranges[file_paths.index(start_position[0]):]
+            byte_ranges[0] = (byte_ranges[0][0], start_position[1], byte_ranges[0][2])
+        for i, (filename, start, end) in enumerate(byte_ranges):
+            nr_skipped_sub_lines = start_position[2] if start_position and i == 0 else 0
+            for line, (offset, index) in read_lines_in_byte_range(filename, start, end,
+                                                                  nr_skipped_sub_lines=nr_skipped_sub_lines):
+                self.position = [filename, offset, index]
+                yield self.tokenizer(deal_with_accents(line.strip().lower())),
@@ -1,7 +1,52 @@
 # -*- coding: utf-8 -*-
+import os
 import unicodedata
 
 # removes/replaces strange symbols like é
 def deal_with_accents(str):
     return unicodedata.normalize('NFD', str)#.encode('ascii', 'ignore')
 
+
+
+def get_shard_byte_ranges(file_paths, shard_id, nr_shards):
+    """
+    Splits the concatenation of files into nr_shards contiguous parts of (almost) equal size in bytes.
+    :return: a list of (file_path, start, end) byte ranges of the shard shard_id, in the order of file_paths
+    """
+    sizes = [os.path.getsize(file_path) for file_path in file_paths]
+    total_size = sum(sizes)
+    shard_start = total_size * shard_id // nr_shards
+    shard_end = total_size * (shard_id + 1) // nr_shards
+    byte_ranges = []
+    file_start = 0
+    for file_path, size in zip(file_paths, sizes):
+        start, end = max(shard_start, file_start), min(shard_end, file_start + size)
+        if start < end:
+            byte_ranges.append((file_path, start - file_start, end - file_start))
+        file_start += size
+    return byte_ranges
+
+
+def read_lines_in_byte_range(file_path, start, end, encoding='utf-8', nr_skipped_sub_lines=0):
+    """
+    Yields decoded lines that begin within [start, end) bytes of the file. A line that crosses the range's end is read
+    completely, so adjacent ranges produce every line exactly once.
+    Every line is yielded with the position after it as (offset, index), where offset is where the raw line begins
+    in the file and index is the number of its sub-lines that have been yielded. Reading can be continued from a
+    position by passing offset as start and index as nr_skipped_sub_lines.
+    """
+    with open(file_path, 'rb') as f:
+        if start > 0:
+            # skip the line that began in the previous range
+            f.seek(start - 1)
+            f.readline()
+        while f.tell() < end:
+            offset = f.tell()
+            line = f.readline()
+            if not line:
+                break
+            # split on the same line boundaries as codecs' readers(e.g. '\x0c' or '\u2028')
+            for index, sub_line in enumerate(line.decode(encoding).splitlines(True), 1):
+                if index > nr_skipped_sub_lines:
+                    yield sub_line, (offset, index)
+            nr_skipped_sub_lines = 0
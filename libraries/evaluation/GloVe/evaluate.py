@@ -2,8 +2,34 @@ import argparse
 import numpy as np
 import os
 
-
-def glove_evaluate(vocab_file, vectors_file, bins=None, max_count=None):
+FILENAMES = [
+    'capital-common-countries.txt', 'capital-world.txt', 'currency.txt',
+    'city-in-state.txt', 'family.txt', 'gram1-adjective-to-adverb.txt',
+    'gram2-opposite.txt', 'gram3-comparative.txt', 'gram4-superlative.txt',
+    'gram5-present-participle.txt', 'gram6-nationality-adjective.txt',
+    'gram7-past-tense.txt', 'gram8-plural.txt', 'gram9-plural-verbs.txt',
+    ]
+# the first files contain semantic questions, the remaining ones syntactic
+NR_SEMANTIC_FILES = 5
+
+# objectives of analogy questions a:b :: c:?, see answer_analogies()
+OBJECTIVES = ("3CosAdd", "3CosMul")
+# prevents division by zero in 3CosMul(as in Levy and Goldberg, 2014)
+COS_MUL_EPS = 0.001
+
+# the default limit of memory that blocks of similarity scores take, it's lowered if less memory is available
+MAX_BLOCK_MEMORY = 256 * 1024 ** 2
+# the minimum number of vocabulary rows in a block, more questions are split into several blocks
+MIN_ROW_BLOCK_SIZE = 1024
+
+
+def glove_evaluate(vocab_file, vectors_file, bins=None, max_count=None, objectives=("3CosAdd",), max_memory=None):
+    """
+    :param objectives: a subset of OBJECTIVES, vectors are read once and evaluated with each objective
+    :param max_memory: the maximum number of bytes of similarity scores' blocks, see get_block_sizes()
+
+    """
+    assert all(objective in OBJECTIVES for objective in objectives)
     counts = {}
     words = []
     print("---------------------------------------------------------")
@@ -20,123 +46,98 @@ def glove_evaluate(vocab_file, vectors_file, bins=None, max_count=None):
             counts[word] = count
             words.append(word)
     vocab = {w: idx for idx, w in enumerate(words)}
-    with open(vectors_file, 'r') as f:
-        vectors = {}
-        for line in f:
-            vals = line.rstrip().split(' ')
-            if vals[0] in vocab:
-                vectors[vals[0]] = [float(x) for x in vals[1:]]
-    if bins is not None:
-        hist, bin_edges = np.histogram(counts.values(), bins=bins)
-
-    vocab_size = len(vocab)
-    ivocab = {idx: w for idx, w in enumerate(words)}
-
-    vector_dim = len(vectors[ivocab[0]])
-    W = np.zeros((vocab_size, vector_dim))
-    for word, v in vectors.items():
-        W[vocab[word], :] = v
-
-    # normalize each word vector to unit variance
-    W_norm = np.zeros(W.shape)
-    d = (np.sum(W ** 2, 1) ** (0.5))
-    W_norm = (W.T / d).T
-
-    # print "total vocab size is %d" % len(vocab)
-
+    W_norm = read_normalized_vectors(vectors_file, vocab)
 
     if bins is None:
-        evaluate_vectors(W_norm, vocab)
+        for objective in objectives:
+            evaluate_vectors(W_norm, vocab, objective=objective, max_memory=max_memory)
     else:
+        word_counts = np.array([counts[word] for word in words])
+        hist, bin_edges = np.histogram(word_counts, bins=bins)
         for i in range(len(bin_edges)-1):
 
             if hist[i] == 0:
                 continue
-            temp_vocab = {}
-            temp_vectors = np.zeros((hist[i], vector_dim))
             edge1 = bin_edges[i]
             edge2 = bin_edges[i+1]
-            j = 0  # current idx
             # collecting words that are between two edges
-            for word, idx in vocab.items():
-                if counts[word] >= edge1 and counts[word] <= edge2:
-                    temp_vocab[word] = j
-                    temp_vectors[j, :]= W_norm[idx]
-                    j += 1
+            in_bin = np.nonzero((word_counts >= edge1) & (word_counts <= edge2))[0]
+            temp_vocab = {words[idx]: j for j, idx in enumerate(in_bin)}
+            temp_vectors = W_norm[in_bin]
             # run evaluation
             print("---------------------------------------------------------")
             print("bin frequency limits are [%f, %f]" % (edge1, edge2))
             print("temp vocab's size is %d " % len(temp_vectors))
             print("temp vectors size is %d" % len(temp_vocab))
-            evaluate_vectors(temp_vectors, temp_vocab, short=True)
+            for objective in objectives:
+                evaluate_vectors(temp_vectors, temp_vocab, short=True, objective=objective, max_memory=max_memory)
 
 
-def evaluate_vectors(W, vocab, short=False):
-    """Evaluate the trained word vectors on a variety of tasks"""
+def read_normalized_vectors(vectors_file, vocab):
+    """
+    Reads vectors of the vocabulary's words into a float32 matrix whose rows have unit length, rows of words without
+    vectors are zeros.
 
-    filenames = [
-        'capital-common-countries.txt', 'capital-world.txt', 'currency.txt',
-        'city-in-state.txt', 'family.txt', 'gram1-adjective-to-adverb.txt',
-        'gram2-opposite.txt', 'gram3-comparative.txt', 'gram4-superlative.txt',
-        'gram5-present-participle.txt', 'gram6-nationality-adjective.txt',
-        'gram7-past-tense.txt', 'gram8-plural.txt', 'gram9-plural-verbs.txt',
-        ]
-        #prefix = './eval/question-data/'
-    prefix = os.path.dirname(os.path.realpath(__file__))+'/question-data'
+    """
+    rows = []
+    values = []
+    with open(vectors_file, 'r') as f:
+        for line in f:
+            word, _, vals = line.rstrip().partition(' ')
+            if word in vocab:
+                rows.append(vocab[word])
+                values.append(vals)
+    vector_dim = len(values[0].split(' ')) if values else 0
+    W = np.zeros((len(vocab), vector_dim), dtype="float32")
+    if values:
+        W[np.array(rows)] = np.array(" ".join(values).split(' '), dtype="float32").reshape((len(values), vector_dim))
+
+    # normalize each word vector to unit variance
+    d = np.sqrt(np.sum(W ** 2, 1, keepdims=True))
+    d[d == 0] = 1.
+    W /= d
+    return W
 
-    # to avoid memory overflow, could be increased/decreased
-    # depending on system and vocab size
-    split_size = 100
 
-    correct_sem = 0; # count correct semantic questions
-    correct_syn = 0; # count correct syntactic questions
-    correct_tot = 0 # count correct questions
-    count_sem = 0; # count all semantic questions
-    count_syn = 0; # count all syntactic questions
-    count_tot = 0 # count all questions
-    full_count = 0 # count all questions, including those with unknown words
+def evaluate_vectors(W, vocab, short=False, objective="3CosAdd", max_memory=None):
+    """Evaluate the trained word vectors on a variety of tasks, questions of all files are answered in one pass"""
 
-    for i in range(len(filenames)):
-        with open('%s/%s' % (prefix, filenames[i]), 'r') as f:
+        #prefix = './eval/question-data/'
+    prefix = os.path.dirname(os.path.realpath(__file__))+'/question-data'
+
+    file_ids = []
+    indices = []
+    full_counts = []
+    for i in range(len(FILENAMES)):
+        with open('%s/%s' % (prefix, FILENAMES[i]), 'r') as f:
             full_data = [line.rstrip().split(' ') for line in f]
-            full_count += len(full_data)
-            data = [x for x in full_data if all(word in vocab for word in x)]
-
-        indices = np.array([[vocab[word] for word in row] for row in data])
-        if len(indices)==0: continue
-        ind1, ind2, ind3, ind4 = indices.T
-
-        predictions = np.zeros((len(indices),))
-        num_iter = int(np.ceil(len(indices) / float(split_size)))
-        for j in range(num_iter):
-            subset = np.arange(j*split_size, min((j + 1)*split_size, len(ind1)))
-            pred_vec = (W[ind2[subset], :] - W[ind1[subset], :]
-                +  W[ind3[subset], :])
-            #cosine similarity if input W has been normalized
-            dist = np.dot(W, pred_vec.T)
-
-            for k in range(len(subset)):
-                dist[ind1[subset[k]], k] = -np.Inf
-                dist[ind2[subset[k]], k] = -np.Inf
-                dist[ind3[subset[k]], k] = -np.Inf
-
-            # predicted word index
-            predictions[subset] = np.argmax(dist, 0).flatten()
-
-        val = (ind4 == predictions) # correct predictions
-        count_tot = count_tot + len(ind1)
-        correct_tot = correct_tot + sum(val)
-        if i < 5:
-            count_sem = count_sem + len(ind1)
-            correct_sem = correct_sem + sum(val)
-        else:
-            count_syn = count_syn + len(ind1)
-            correct_syn = correct_syn + sum(val)
-        if not short:
-            print("%s:" % filenames[i])
+        full_counts.append(len(full_data))
+        data = [x for x in full_data if all(word in vocab for word in x)]
+        indices.extend([vocab[word] for word in row] for row in data)
+        file_ids.extend([i] * len(data))
+    file_ids = np.array(file_ids, dtype="int64")
+    indices = np.array(indices, dtype="int64").reshape((-1, 4))
+    ind1, ind2, ind3, ind4 = indices.T
+
+    W = np.asarray(W, dtype="float32")
+    predictions = answer_analogies(W, ind1, ind2, ind3, objective=objective, max_memory=max_memory)
+    val = (ind4 == predictions)  # correct predictions
+    counts = np.bincount(file_ids, minlength=len(FILENAMES))
+    corrects = np.bincount(file_ids, weights=val, minlength=len(FILENAMES)).astype("int64")
+
+    print("objective: %s" % objective)
+    if not short:
+        for i in range(len(FILENAMES)):
+            if counts[i] == 0:
+                continue
+            print("%s:" % FILENAMES[i])
             print('ACCURACY TOP1: %.2f%% (%d/%d)' %
-                (np.mean(val) * 100, np.sum(val), len(val)))
+                (100. * corrects[i] / counts[i], corrects[i], counts[i]))
 
+    full_count = sum(full_counts)  # count all questions, including those with unknown words
+    count_tot, correct_tot = np.sum(counts), np.sum(corrects)
+    count_sem, correct_sem = np.sum(counts[:NR_SEMANTIC_FILES]), np.sum(corrects[:NR_SEMANTIC_FILES])
+    count_syn, correct_syn = np.sum(counts[NR_SEMANTIC_FILES:]), np.sum(corrects[NR_SEMANTIC_FILES:])
     print('Questions seen/total: %.2f%% (%d/%d)' %
         (100 * count_tot / float(full_count), count_tot, full_count))
     if count_sem != 0:
@@ -148,3 +149,94 @@ def evaluate_vectors(W, vocab, short=False):
     if count_tot != 0:
         print('Total accuracy: %.2f%%  (%i/%i)' % (100 * correct_tot / float(count_tot), correct_tot, count_tot))
 
+
+def answer_analogies(W, ind1, ind2, ind3, objective="3CosAdd", max_memory=None):
+    """
+    Answers analogy questions a:b :: c:? by the word that maximizes the objective, the question words excluded.
+    3CosAdd: cos(w, b - a + c), 3CosMul: cos'(w, b) * cos'(w, c) / (cos'(w, a) + eps), where cos' = (cos + 1) / 2.
+    Scores are computed for blocks of vocabulary rows and questions, the best word is tracked over row blocks.
+    :param W: float32 matrix [vocab_size x dim] of normalized vectors
+    :param ind1: a vector [nr_questions] of indices of a, ind2 of b and ind3 of c
+    :return: a vector [nr_questions] of indices of the answers
+
+    """
+    assert objective in OBJECTIVES
+    nr_questions = len(ind1)
+    predictions = np.zeros(nr_questions, dtype="int64")
+    if nr_questions == 0:
+        return predictions
+    # 3CosMul keeps three matrices of scores
+    nr_score_matrices = 1 if objective == "3CosAdd" else 3
+    row_block_size, question_block_size = get_block_sizes(len(W), nr_questions, nr_score_matrices,
+                                                          max_memory=max_memory)
+    for q_start in range(0, nr_questions, question_block_size):
+        q_end = min(q_start + question_block_size, nr_questions)
+        inputs = [ind[q_start:q_end] for ind in (ind1, ind2, ind3)]
+        if objective == "3CosAdd":
+            queries = [(W[inputs[1]] - W[inputs[0]] + W[inputs[2]]).T]
+        else:
+            queries = [W[ind].T for ind in inputs]
+        best_scores = np.full(q_end - q_start, -np.inf, dtype="float32")
+        best_rows = np.zeros(q_end - q_start, dtype="int64")
+        for r_start in range(0, len(W), row_block_size):
+            r_end = min(r_start + row_block_size, len(W))
+            scores = _score_block(W[r_start:r_end], queries, objective)
+            # the question words can't be answers
+            for ind in inputs:
+                in_block = np.nonzero((ind >= r_start) & (ind < r_end))[0]
+                scores[ind[in_block] - r_start, in_block] = -np.inf
+            block_rows = np.argmax(scores, axis=0)
+            block_scores = scores[block_rows, np.arange(len(block_rows))]
+            # the first maximum is kept on ties, as in a single argmax
+            better = block_scores > best_scores
+            best_scores[better] = block_scores[better]
+            best_rows[better] = block_rows[better] + r_start
+        predictions[q_start:q_end] = best_rows
+    return predictions
+
+
+def _score_block(W_block, queries, objective):
+    """
+    :return: matrix [block_size x nr_questions] of the objective's scores
+
+    """
+    if objective == "3CosAdd":
+        # cosine similarity up to the query's norm if input W has been normalized
+        return np.dot(W_block, queries[0])
+    cos_a, cos_b, cos_c = [(np.dot(W_block, query) + 1.) / 2. for query in queries]
+    cos_b *= cos_c
+    cos_a += COS_MUL_EPS
+    cos_b /= cos_a
+    return cos_b
+
+
+def get_block_sizes(vocab_size, nr_questions, nr_score_matrices=1, max_memory=None):
+    """
+    Chooses block sizes such that blocks of float32 scores fit into max_memory. All questions are answered in one
+    block if it leaves at least MIN_ROW_BLOCK_SIZE vocabulary rows per block.
+    :param max_memory: the maximum number of bytes, by default MAX_BLOCK_MEMORY or a quarter of the available memory
+                       if it's less
+    :return: the number of vocabulary rows and the number of questions per block
+
+    """
+    if max_memory is None:
+        max_memory = MAX_BLOCK_MEMORY
+        available_memory = get_available_memory()
+        if available_memory is not None:
+            max_memory = min(max_memory, available_memory // 4)
+    bytes_per_score = 4 * nr_score_matrices
+    question_block_size = min(nr_questions,
+                              max(1, max_memory // (bytes_per_score * min(vocab_size, MIN_ROW_BLOCK_SIZE))))
+    row_block_size = min(vocab_size, max(1, max_memory // (bytes_per_score * question_block_size)))
+    return int(row_block_size), int(question_block_size)
+
+
+def get_available_memory():
+    """
+    :return: the number of bytes of available physical memory, or None where it can't be determined
+
+    """
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
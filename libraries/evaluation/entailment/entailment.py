@@ -1,18 +1,21 @@
 import os
 import glob
 import numpy as np
-from libraries.evaluation.entailment.support import get_kl_scores, get_cos_scores, get_l2_scores, read_vectors_to_dict, KL, cosine_sim, variance
+from libraries.evaluation.entailment.support import get_kl_scores, get_cos_scores, get_l2_scores, read_vectors_to_dict, EntailmentScorer
 # import matplotlib.pyplot as plt
 
 
 # returns both precision and accuracy
 # mus and sigmas are dictionaries
+# scorer: an EntailmentScorer of the vectors, if it's passed, vectors are not read and scores of pairs that were computed
+# in previous tests are reused
 def test_entailment(mu_vectors_path, sigma_vectors_path, test_path='/data/bench/baroni2012_one/', plot=False,
-                    score_func="kl", log_sigmas=True, kl_type="gauss", normalize=True):
+                    score_func="kl", log_sigmas=True, kl_type="gauss", normalize=True, scorer=None):
     assert kl_type in ["gauss", "vMF"]
     assert score_func in ["kl", "cos", 'l2']
     # read test files
-    mus_and_sigmas = read_vectors_to_dict(mu_vectors_path, sigma_vectors_path, log_sigmas=log_sigmas)
+    if scorer is None:
+        scorer = create_scorer(mu_vectors_path, sigma_vectors_path, log_sigmas=log_sigmas)
     prefix = os.path.dirname(os.path.realpath(__file__))
     test_path = prefix + test_path
     if os.path.isdir(test_path):
@@ -21,12 +24,12 @@ def test_entailment(mu_vectors_path, sigma_vectors_path, test_path='/data/bench/
         filenames = [test_path]  # that means there is only one file
     for filename in filenames:
             if score_func == "kl":
-                scores_and_ent, seen, total, words = get_kl_scores(mus_and_sigmas, filename, kl_type=kl_type,
+                scores_and_ent, seen, total, words = get_kl_scores(scorer, filename, kl_type=kl_type,
                                                                    normalize=normalize)
             if score_func == "cos":
-                scores_and_ent, seen, total, words = get_cos_scores(mus_and_sigmas, filename)
+                scores_and_ent, seen, total, words = get_cos_scores(scorer, filename)
             if score_func == "l2":
-                scores_and_ent, seen, total, words = get_l2_scores(mus_and_sigmas, filename, normalize=normalize)
+                scores_and_ent, seen, total, words = get_l2_scores(scorer, filename, normalize=normalize)
 
             ent_true = scores_and_ent[scores_and_ent[:, 1] == 1, 0]
             ent_false = scores_and_ent[scores_and_ent[:, 1] == 0, 0]
@@ -58,22 +61,26 @@ def test_entailment(mu_vectors_path, sigma_vectors_path, test_path='/data/bench/
                 plt.show()
 
 # fits the optimal threshold based on F1 score
-def __fit_th(scores_and_ent, max_iter=100000, score_func="kl"):
-    step = (max(scores_and_ent[:, 0]) - min(scores_and_ent[:, 0]))/float(max_iter)
-    th = min(scores_and_ent[:, 0])
-    ths = []
-    f1s = []
-    for i in range(max_iter):
-        # s = scores_and_ent[:, 0] < th if score_func == "KL" else scores_and_ent[:, 0] > th
-        # corr = np.sum(s == scores_and_ent[:, 1])
-        pred = scores_and_ent[:, 0] > th if score_func == "cos" else scores_and_ent[:, 0] < th
-        _, _ , f1 = __compute_PR_R_F1(scores_and_ent, pred)
-        ths.append(th)
-        f1s.append(f1)
-        th += step
-    max_f1_idx = f1s.index(max(f1s))
-    opt_th = ths[max_f1_idx]
-    # TODO avoid extra call
+# scores are sorted once, and the numbers of true positives at every cut point between distinct scores are obtained by
+# a cumulative sum, so F1 of all thresholds that change predictions is computed exactly in one pass
+def __fit_th(scores_and_ent, score_func="kl"):
+    # pairs with scores below the threshold are predicted as entailing, cosine similarities are negated to match
+    scores = -scores_and_ent[:, 0] if score_func == "cos" else scores_and_ent[:, 0]
+    order = np.argsort(scores, kind="stable")
+    sorted_scores = scores[order]
+    TPs = np.cumsum(scores_and_ent[order, 1] == 1)
+    # cut point j predicts the first j pairs as entailing, valid cuts separate distinct scores
+    nr_pred = np.arange(1, len(sorted_scores) + 1)
+    valid = np.append(sorted_scores[1:] > sorted_scores[:-1], True)
+    # F1 = 2TP/(2TP + FP + FN) = 2TP/(nr_pred + nr_pos)
+    f1s = np.where(valid, 2. * TPs / (nr_pred + TPs[-1]), -1.)
+    j = int(np.argmax(f1s))
+    if j + 1 < len(sorted_scores):
+        opt_th = (sorted_scores[j] + sorted_scores[j + 1]) / 2.
+    else:
+        opt_th = np.nextafter(sorted_scores[j], np.inf)
+    if score_func == "cos":
+        opt_th = -opt_th
     pred = scores_and_ent[:, 0] > opt_th if score_func == "cos" else scores_and_ent[:, 0] < opt_th
     PR, R, F1 = __compute_PR_R_F1(scores_and_ent, pred)
     return opt_th, pred, PR, R, F1
@@ -92,52 +99,54 @@ def __compute_PR_R_F1(scores_and_ent, pred):
 
 
 
+def create_scorer(mu_vectors_path, sigma_vectors_path, log_sigmas=True):
+    """
+    Reads vectors into an EntailmentScorer, it can be passed to several tests, so vectors are read only once.
+
+    """
+    return EntailmentScorer.from_dict(read_vectors_to_dict(mu_vectors_path, sigma_vectors_path, log_sigmas=log_sigmas))
+
+
 # if vocabulary is passed, it will check what would be direction assignments based purely on frequency
 def test_directional_entailment(mu_vectors_path, sigma_vectors_path, header=False,
-                                test_path='data/bench/baroni2012_dir/data.tsv', debug=False, vocab=None, log_sigmas=True):
-    mus_and_sigmas = read_vectors_to_dict(mu_vectors_path, sigma_vectors_path, log_sigmas=log_sigmas)
+                                test_path='data/bench/baroni2012_dir/data.tsv', debug=False, vocab=None, log_sigmas=True,
+                                scorer=None):
+    if scorer is None:
+        scorer = create_scorer(mu_vectors_path, sigma_vectors_path, log_sigmas=log_sigmas)
     prefix = os.path.dirname(os.path.realpath(__file__))
     test_path = prefix + test_path
-    total = 0
-    correct = 0
-    seen = 0
-    total_cos = 0
-    correct_log_var = 0
 
-    if vocab is not None:
-        correct_fr = 0  # we wil compute how many correct answers are obtained via pure frequency
+    first_words, second_words, entail = scorer.read_pairs(test_path, sep=' ', header=header)
+    scores = scorer.score_pairs(test_path, sep=' ', header=header)
+    seen_mask = scores["seen"]
+    total = len(seen_mask)
+    seen = int(np.sum(seen_mask))
+    first_words, second_words = first_words[seen_mask], second_words[seen_mask]
+    entail = np.where(entail[seen_mask], 1, -1)
+
+    # TODO: what about score_cor == score_wrong?
+    score = scores["reverse_kl"] - scores["kl"]
+    sign = np.sign(score)
+    correct = np.sum(sign == entail)
+    total_cos = np.sum(scores["cos"])
+    first_ids, second_ids = scorer.lookup(first_words), scorer.lookup(second_words)
+    log_vars = np.sum(np.log(scorer.sigmas), axis=1)
+    correct_log_var = np.sum(np.sign(log_vars[second_ids] - log_vars[first_ids]) == entail)
 
-    with open(test_path) as f:
-        if header:
-            #f.next() python 2
-            f.readline()
-        for line in f:
-            # print(line.split(' '))
-            f_word, s_word, entail = line.split(' ')
-            entail = entail.strip()
-            entail = 1 if entail == "True" else -1
-            if f_word in mus_and_sigmas and s_word in mus_and_sigmas:
-                seen += 1
-                f_mu, f_sigma = mus_and_sigmas[f_word]
-                s_mu, s_sigma = mus_and_sigmas[s_word]
-                score_cor = KL(f_mu, f_sigma, s_mu, s_sigma)
-                score_wrong = KL(s_mu, s_sigma, f_mu, f_sigma)
-                score = score_wrong - score_cor
-                sign = np.sign(score)
-                cos = cosine_sim(f_mu, s_mu)
-                total_cos+=cos
-                mess = "%s => %s sign: %d cos_sim: %f, KLs dif. %f" % (f_word, s_word, sign, cos, score)
-                if vocab is not None:
-                    f_freq = vocab[f_word].count
-                    s_freq = vocab[s_word].count
-                    correct_fr += (np.sign(s_freq - f_freq) == entail)
-                    mess = "%s(%d) => %s(%d) sign: %d cos_sim: %f, KLs dif. %f" % (f_word, f_freq, s_word,s_freq, sign, cos, score)
-                if debug:
-                    print(mess)
-                # TODO: what about score_cor == score_wrong?
-                correct += (sign == entail)
-                correct_log_var += (np.sign(variance(s_sigma, "True") - variance(f_sigma, "True")) == entail)
-            total += 1
+    if vocab is not None:
+        # we wil compute how many correct answers are obtained via pure frequency
+        first_freqs = np.array([vocab[word].count for word in first_words], dtype="int64")
+        second_freqs = np.array([vocab[word].count for word in second_words], dtype="int64")
+        correct_fr = np.sum(np.sign(second_freqs - first_freqs) == entail)
+    if debug:
+        for i in range(seen):
+            if vocab is not None:
+                print("%s(%d) => %s(%d) sign: %d cos_sim: %f, KLs dif. %f" % (first_words[i], first_freqs[i],
+                                                                              second_words[i], second_freqs[i],
+                                                                              sign[i], scores["cos"][i], score[i]))
+            else:
+                print("%s => %s sign: %d cos_sim: %f, KLs dif. %f" % (first_words[i], second_words[i], sign[i],
+                                                                      scores["cos"][i], score[i]))
     print(" ---------------------------------------------------- ")
     print(" ------------- DIRECTIONAL ENTAILMENT TEST -------------")
     print("------------- %s -------------" % test_path)
@@ -147,4 +156,4 @@ def test_directional_entailment(mu_vectors_path, sigma_vectors_path, header=Fals
     print("accuracy based on log_var: %f %%" % (float(correct_log_var)/float(seen) * 100))
     print("seen: %f %%" % (float(seen)/float(total) * 100))
     print("average cos_sim %f" % (total_cos/float(seen)))
-    print("total sub-tasks: %d"% total)
\ No newline at end of file
+    print("total sub-tasks: %d"% total)
@@ -1,143 +1,194 @@
 import re
 import numpy as np
 from pickle import UnpicklingError
-from scipy.stats import chi2
 # import matplotlib.pyplot as plt
 # from matplotlib.patches import Ellipse
 # from vMF_support.vMF_KL import kl_vMF # I've disabled it to avoid calling theano for no reason
 
 # sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
-from libraries.simulators.support import KL, cosine_sim, l2
+from libraries.simulators.support import KL_gauss_diagonal, KL_gauss_spherical_from_sqrd_dists
 
 import os
 import pickle
+from collections import OrderedDict
+
+
+class EntailmentScorer:
+    """
+    Scores word pairs of entailment datasets on matrices of mus and sigmas. A dataset's file is read once into arrays of
+    row indices, and KL divergences in both directions, cosine similarities and squared L2 distances of all its pairs are
+    computed in one batched pass, which is cached, so all score functions are served from it.
+
+    """
+    def __init__(self, mus, sigmas, word_to_index):
+        """
+        :param mus: matrix [nr_words x dim]
+        :param sigmas: matrix [nr_words x 1] of spherical or [nr_words x dim] of diagonal Gaussians' sigmas
+        :param word_to_index: a dict that maps words to rows of mus and sigmas
+
+        """
+        self.mus = np.asarray(mus)
+        self.sigmas = np.asarray(sigmas).reshape((len(self.mus), -1))
+        self.word_to_index = word_to_index
+        # parsed files and scores of their pairs, indexed by files' names and reading arguments
+        self.datasets = {}
+        self.scores = {}
+
+    @staticmethod
+    def from_dict(mus_and_sigmas):
+        """
+        :param mus_and_sigmas: a dict of words and [mu, sigma] pairs, e.g. from read_vectors_to_dict()
+
+        """
+        words = list(mus_and_sigmas.keys())
+        mus = np.stack([mus_and_sigmas[word][0] for word in words]) if words else np.zeros((0, 1))
+        sigmas = np.stack([mus_and_sigmas[word][1] for word in words]) if words else np.zeros((0, 1))
+        return EntailmentScorer(mus, sigmas, dict((word, idx) for idx, word in enumerate(words)))
+
+    def read_pairs(self, filename, sep=r'\t+', header=False):
+        """
+        :return: arrays of first words, second words and labels(True if the first word entails the second one) of
+                 all pairs in the file
+
+        """
+        key = (filename, sep, header)
+        if key not in self.datasets:
+            with open(filename) as f:
+                lines = f.read().splitlines()
+            if header:
+                lines = lines[1:]
+            fields = [re.split(sep, line.strip()) for line in lines if line.strip()]
+            first_words = np.array([field[0] for field in fields], dtype=object)
+            second_words = np.array([field[1] for field in fields], dtype=object)
+            entail = np.array([field[2] == "True" for field in fields], dtype=bool)
+            self.datasets[key] = (first_words, second_words, entail)
+        return self.datasets[key]
+
+    def lookup(self, words):
+        """
+        :return: a vector of rows of the words, -1 for unknown words
+
+        """
+        return np.array([self.word_to_index.get(word, -1) for word in words], dtype="int64")
+
+    def score_pairs(self, filename, sep=r'\t+', header=False):
+        """
+        :return: a dict with the vector 'seen' that marks the file's pairs of known words, and 'kl'(KL(first||second)),
+                 'reverse_kl'(KL(second||first)), 'cos' and 'l2'(squared) vectors of scores of the seen pairs
+
+        """
+        key = (filename, sep, header)
+        if key not in self.scores:
+            first_words, second_words, _ = self.read_pairs(filename, sep=sep, header=header)
+            first_ids, second_ids = self.lookup(first_words), self.lookup(second_words)
+            seen = (first_ids >= 0) & (second_ids >= 0)
+            first_ids, second_ids = first_ids[seen], second_ids[seen]
+            scores = pair_scores(self.mus[first_ids], self.sigmas[first_ids], self.mus[second_ids],
+                                 self.sigmas[second_ids])
+            scores["seen"] = seen
+            self.scores[key] = scores
+        return self.scores[key]
+
+
+def get_scorer(mus_and_sigmas):
+    """
+    :param mus_and_sigmas: either an EntailmentScorer or a dict of words and [mu, sigma] pairs
+
+    """
+    if isinstance(mus_and_sigmas, EntailmentScorer):
+        return mus_and_sigmas
+    return EntailmentScorer.from_dict(mus_and_sigmas)
+
+
+def pair_scores(mus_q, sigmas_q, mus_p, sigmas_p):
+    """
+    Computes scores of pairs of Gaussians in batch, row i of the q matrices is paired with row i of the p matrices.
+    :return: an OrderedDict of vectors: 'kl' KL(q||p), 'reverse_kl' KL(p||q), 'cos' cosine similarities of mus and
+             'l2' squared Euclidean distances of mus
+
+    """
+    sqrd_dists = np.sum((mus_q - mus_p) ** 2, axis=1)
+    if sigmas_q.shape[1] == 1 and sigmas_p.shape[1] == 1:
+        k = mus_q.shape[1]
+        kl = KL_gauss_spherical_from_sqrd_dists(sqrd_dists, sigmas_q[:, 0], sigmas_p[:, 0], k)
+        reverse_kl = KL_gauss_spherical_from_sqrd_dists(sqrd_dists, sigmas_p[:, 0], sigmas_q[:, 0], k)
+    else:
+        kl = KL_gauss_diagonal(mus_q, sigmas_q, mus_p, sigmas_p)
+        reverse_kl = KL_gauss_diagonal(mus_p, sigmas_p, mus_q, sigmas_q)
+    norms = np.sqrt(np.sum(mus_q ** 2, axis=1) * np.sum(mus_p ** 2, axis=1))
+    cos = np.einsum('ij,ij->i', mus_q, mus_p) / norms
+    return OrderedDict((("kl", kl), ("reverse_kl", reverse_kl), ("cos", cos), ("l2", sqrd_dists)))
+
+
+def _collect_scores(scorer, filename, score_name, ignore_words=None, normalize=False):
+    """
+    :return: 1) array with 2 columns : score and ent( 1 or 0), 2) seen number 3) total number of pairs 4) array of
+             word pairs
+
+    """
+    first_words, second_words, entail = scorer.read_pairs(filename)
+    scores = scorer.score_pairs(filename)
+    seen = scores["seen"]
+    score = scores[score_name]
+    total = len(seen)
+    first_words, second_words, entail = first_words[seen], second_words[seen], entail[seen]
+    if ignore_words is not None:
+        # skip the words which are not of the interest, they are not counted in the total
+        keep = np.array([word in ignore_words for word in first_words], dtype=bool)
+        first_words, second_words, entail, score = first_words[keep], second_words[keep], entail[keep], score[keep]
+        total -= int(np.sum(~keep))
+    res = np.stack([score, entail], axis=1).astype("float64") if len(score) else np.zeros((0, 2))
+    # normalize scores
+    if normalize:
+        res[:, 0] = res[:, 0]/np.sum(res[:, 0])
+    return res, len(res), total, np.stack([first_words, second_words], axis=1)
 
 
 # computes KL value for each distr of the word pair in the file
 # returns 1) array with 2 columns : score and ent( 1 or 0)?, 2) seen number 3) total number of pairs
 # scores are normalized
+# mus_and_sigmas can be a dict or an EntailmentScorer, the latter reuses scores of the file that were computed before
 def get_kl_scores(mus_and_sigmas, filename, ignore_words=None, kl_type="gauss", normalize=True):
     assert kl_type in ['gauss', 'vMF']
-    total = 0
-    seen = 0
-    res = []
-    words = []
-    with open(filename) as f:
-        for sentence in f:
-            f_word, s_word, entail = re.split(r'\t+', sentence)
-            entail = entail.strip()
-            entail = 1 if entail == "True" else 0
-            if f_word in mus_and_sigmas and s_word in mus_and_sigmas:
-                # skip the words which are not of the interest
-                if ignore_words is not None and f_word not in ignore_words:
-                    continue
-                seen += 1
-                # compute scores for each observed pair
-                f_mu, f_sigma = mus_and_sigmas[f_word]
-                s_mu, s_sigma = mus_and_sigmas[s_word]
-                score = KL(f_mu, f_sigma, s_mu, s_sigma, kl_type=kl_type)
-                # score = KL(s_mu, s_sigma, f_mu, f_sigma, kl_type=kl_type) # this one is wrong
-                res.append([score, entail])
-                words.append([f_word, s_word])
-            total += 1
-        res = np.array(res)
-        # normalize scores
-        if normalize:
-            norm = np.sum(res[:, 0])
-            res[:, 0] = res[:, 0]/norm
-    return res, seen, total, np.array(words)
+    if kl_type != "gauss":
+        raise ValueError("only KL divergences of Gaussians are supported")
+    return _collect_scores(get_scorer(mus_and_sigmas), filename, "kl", ignore_words=ignore_words,
+                           normalize=normalize)
 
 # computes KL value for each distr of the word pair in the file
 # returns 1) array with 2 columns : score and ent( 1 or 0)?, 2) seen number 3) total number of pairs
 # scores are normalized
 def get_kl_scores_input_output(mus_and_sigmas_input, mus_and_sigmas_output, filename, ignore_words=None, kl_type="gauss", normalize=True):
     assert kl_type in ['gauss', 'vMF']
-    total = 0
-    seen = 0
-    res = []
-    words = []
-    with open(filename) as f:
-        for sentence in f:
-            f_word, s_word, entail = re.split(r'\t+', sentence)
-            entail = entail.strip()
-            entail = 1 if entail == "True" else 0
-            if f_word in mus_and_sigmas_input and s_word in mus_and_sigmas_output:
-                # skip the words which are not of the interest
-                if ignore_words is not None and f_word not in ignore_words:
-                    continue
-                seen += 1
-                # compute scores for each observed pair
-                f_mu, f_sigma = mus_and_sigmas_input[f_word]
-                s_mu, s_sigma = mus_and_sigmas_output[s_word]
-                score = KL(f_mu, f_sigma, s_mu, s_sigma, kl_type=kl_type)
-                # score = KL(s_mu, s_sigma, f_mu, f_sigma, kl_type=kl_type) # this one is wrong
-                res.append([score, entail])
-                words.append([f_word, s_word])
-            total += 1
-        res = np.array(res)
-        # normalize scores
-        norm = np.sum(res[:, 0])
-        if normalize:
-            res[:, 0] = res[:, 0]/norm
-    return res, seen, total, np.array(words)
+    if kl_type != "gauss":
+        raise ValueError("only KL divergences of Gaussians are supported")
+    input_scorer, output_scorer = get_scorer(mus_and_sigmas_input), get_scorer(mus_and_sigmas_output)
+    first_words, second_words, entail = input_scorer.read_pairs(filename)
+    first_ids, second_ids = input_scorer.lookup(first_words), output_scorer.lookup(second_words)
+    seen = (first_ids >= 0) & (second_ids >= 0)
+    total = len(first_words)
+    if ignore_words is not None:
+        # skip the words which are not of the interest, they are not counted in the total
+        ignored = seen & np.array([word not in ignore_words for word in first_words], dtype=bool)
+        seen &= ~ignored
+        total -= int(np.sum(ignored))
+    first_ids, second_ids = first_ids[seen], second_ids[seen]
+    kl = pair_scores(input_scorer.mus[first_ids], input_scorer.sigmas[first_ids], output_scorer.mus[second_ids],
+                     output_scorer.sigmas[second_ids])["kl"]
+    res = np.stack([kl, entail[seen]], axis=1).astype("float64")
+    # normalize scores
+    if normalize:
+        res[:, 0] = res[:, 0]/np.sum(res[:, 0])
+    return res, len(res), total, np.stack([first_words[seen], second_words[seen]], axis=1)
 
 def get_l2_scores(mus_and_sigmas, filename, ignore_words=None, kl_type="gauss", normalize=True):
     assert kl_type in ['gauss', 'vMF']
-    total = 0
-    seen = 0
-    res = []
-    words = []
-    with open(filename) as f:
-        for sentence in f:
-            f_word, s_word, entail = re.split(r'\t+', sentence)
-            entail = entail.strip()
-            entail = 1 if entail == "True" else 0
-            if f_word in mus_and_sigmas and s_word in mus_and_sigmas:
-                # skip the words which are not of the interest
-                if ignore_words is not None and f_word not in ignore_words:
-                    continue
-                seen += 1
-                # compute scores for each observed pair
-                f_mu, f_sigma = mus_and_sigmas[f_word]
-                s_mu, s_sigma = mus_and_sigmas[s_word]
-                score = l2(f_mu - s_mu)**2
-                # score = KL(s_mu, s_sigma, f_mu, f_sigma, kl_type=kl_type) # this one is wrong
-                res.append([score, entail])
-                words.append([f_word, s_word])
-            total += 1
-        res = np.array(res)
-        # normalize scores
-        if normalize:
-            norm = np.sum(res[:, 0])
-            res[:, 0] = res[:, 0]/norm
-    return res, seen, total, np.array(words)
+    return _collect_scores(get_scorer(mus_and_sigmas), filename, "l2", ignore_words=ignore_words,
+                           normalize=normalize)
 
 
 def get_cos_scores(mus_and_sigmas, filename, ignore_words=None):
-    total = 0
-    seen = 0
-    res = []
-    words = []
-    with open(filename) as f:
-        for sentence in f:
-            f_word, s_word, entail = re.split(r'\t+', sentence)
-            entail = entail.strip()
-            entail = 1 if entail == "True" else 0
-            if f_word in mus_and_sigmas and s_word in mus_and_sigmas:
-                # skip the words which are not of the interest
-                if ignore_words is not None and f_word not in ignore_words:
-                    continue
-                seen += 1
-                # compute scores for each observed pair
-                f_mu, _ = mus_and_sigmas[f_word]
-                s_mu, _ = mus_and_sigmas[s_word]
-                score = cosine_sim(f_mu, s_mu)
-                res.append([score, entail])
-                words.append([f_word, s_word])
-
-            total += 1
-        res = np.array(res)
-    return res, seen, total, np.array(words)
+    return _collect_scores(get_scorer(mus_and_sigmas), filename, "cos", ignore_words=ignore_words)
 
 
 def read_vectors_to_dict(mus_file, sigmas_file, log_sigmas=False, vocab=None, header=False):
@@ -1,6 +1,7 @@
 import os, sys
 sys.path.append(os.path.join(os.getcwd(), "../../"))
 from libraries.tools.vocabulary import Vocabulary
+from libraries.tools.params_archive import PARAMS_ARCHIVE_FOLDER_NAME
 from libraries.evaluation.lexsub.main.simulators_interfaces.bsg_simulator_interface import BsgSimulatorInterface
 from libraries.evaluation.lexsub.main.skipgram_embeddings import Skipgram_Embeddings
 from libraries.evaluation.lexsub.main.support import read_vectors
@@ -19,7 +20,10 @@ def run_lexsub(input_folder, output_path, half_window_size=5, input_type="normal
     gold_file = os.path.dirname(os.path.realpath(__file__)) + "/datasets/lst_all.gold"
 
     vocab_file_path = os.path.join(input_folder, 'vocab.txt')
-    model_file_path = os.path.join(input_folder, 'model.pkl')
+    model_file_path = os.path.join(input_folder, PARAMS_ARCHIVE_FOLDER_NAME)
+    if not os.path.exists(model_file_path):
+        # models that were saved before parameter archives were introduced
+        model_file_path = os.path.join(input_folder, 'model.pkl')
     vocab = Vocabulary()
     vocab.load(vocab_file_path=vocab_file_path)
     if embeddings_type == "bsg":
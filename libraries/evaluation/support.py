@@ -1,5 +1,5 @@
 import os
-from libraries.evaluation.entailment.entailment import test_entailment, test_directional_entailment
+from libraries.evaluation.entailment.entailment import test_entailment, test_directional_entailment, create_scorer
 from libraries.evaluation.word_sim.all_wordsim import all_word_sim
 from libraries.evaluation.word_sim.wordsim import word_sim
 from libraries.evaluation.GloVe.evaluate import glove_evaluate
@@ -9,7 +9,7 @@ from libraries.evaluation.GloVe.evaluate import glove_evaluate
 # vectors_path : filename or a folder with vectors
 # vocab: vocab object, should be passed as there is currently a circular dependency TODO: fix!
 def evaluate(mu_vectors_files, sigma_vectors_files=None, vocab_file=None, vocab=None,
-             max_count=None, full_sim=False, log_sigmas=False):
+             max_count=None, full_sim=False, log_sigmas=False, analogy_objectives=("3CosAdd",)):
 
     # all similarity tests are performed on mu vectors
     for mu_vectors_file in mu_vectors_files:
@@ -25,9 +25,9 @@ def evaluate(mu_vectors_files, sigma_vectors_files=None, vocab_file=None, vocab=
             word_sim(mu_vectors_file, all_sim_file)
         # https://github.com/stanfordnlp/GloVe
 
-        # 2. analogical reasoning
+        # 2. analogical reasoning, objectives are a subset of GloVe.evaluate.OBJECTIVES
         if vocab_file is not None:
-            glove_evaluate(vocab_file, mu_vectors_file, max_count=max_count)
+            glove_evaluate(vocab_file, mu_vectors_file, max_count=max_count, objectives=analogy_objectives)
     if not sigma_vectors_files:
         return
 
@@ -35,16 +35,19 @@ def evaluate(mu_vectors_files, sigma_vectors_files=None, vocab_file=None, vocab=
         # print "mu_vectors_file: %s" % mu_vectors_file
         # print "sigma_vectors_file: %s"% sigma_vectors_file
 
+        # vectors are read once, scores of each dataset's pairs are computed once for all tests
+        scorer = create_scorer(mu_vectors_file, sigma_vectors_file, log_sigmas=log_sigmas)
+
         # 3. KL entailment
         for sf in ["kl", "cos", "l2"]:
             test_entailment(mu_vectors_path=mu_vectors_file, sigma_vectors_path=sigma_vectors_file, log_sigmas=log_sigmas,
-                            score_func=sf, normalize=False)
+                            score_func=sf, normalize=False, scorer=scorer)
 
         # 4. directional entailment on Baroni
         test_directional_entailment(mu_vectors_path=mu_vectors_file, sigma_vectors_path=sigma_vectors_file,
                                     test_path='/data/bench/baroni2012_dir/data.tsv', header=True, vocab=vocab,
-                                    log_sigmas=log_sigmas)
+                                    log_sigmas=log_sigmas, scorer=scorer)
         # 5. directional entailment on Bless
         test_directional_entailment(mu_vectors_path=mu_vectors_file, sigma_vectors_path=sigma_vectors_file,
                                     test_path='/data/bench/bless2011_dir/data.tsv', header=True, vocab=vocab,
-                                    log_sigmas=log_sigmas)
\ No newline at end of file
+                                    log_sigmas=log_sigmas, scorer=scorer)
\ No newline at end of file
@@ -1,6 +1,5 @@
 import math
 import numpy
-from operator import itemgetter
 from numpy.linalg import norm
 
 EPSILON = 1e-6
@@ -14,21 +13,22 @@ def cosine_sim(vec1, vec2):
   vec2 += EPSILON * numpy.ones(len(vec1))
   return vec1.dot(vec2)/(norm(vec1)*norm(vec2))
 
+def batch_cosine_sim(vectors, ids1, ids2):
+  ''' cosine similarities of rows ids1 and ids2 of vectors, shifted by EPSILON as in cosine_sim '''
+  shifted = vectors + EPSILON
+  shifted /= norm(shifted, axis=1, keepdims=True)
+  return numpy.einsum('ij,ij->i', shifted[ids1], shifted[ids2])
+
+def fractional_ranks(values):
+  ''' ranks in the descending order starting from 1, tied values get the mean of their ranks '''
+  _, inverse, counts = numpy.unique(-numpy.asarray(values, dtype=float), return_inverse=True, return_counts=True)
+  last_ranks = numpy.cumsum(counts)
+  first_ranks = last_ranks - counts + 1
+  return ((first_ranks + last_ranks) / 2.)[inverse.reshape(-1)]
+
 def assign_ranks(item_dict):
-  ranked_dict = {}
-  sorted_list = [(key, val) for (key, val) in sorted(item_dict.items(),
-                                                     key=itemgetter(1),
-                                                     reverse=True)]
-  for i, (key, val) in enumerate(sorted_list):
-    same_val_indices = []
-    for j, (key2, val2) in enumerate(sorted_list):
-      if val2 == val:
-        same_val_indices.append(j+1)
-    if len(same_val_indices) == 1:
-      ranked_dict[key] = i+1
-    else:
-      ranked_dict[key] = 1.*sum(same_val_indices)/len(same_val_indices)
-  return ranked_dict
+  keys = list(item_dict.keys())
+  return dict(zip(keys, fractional_ranks([item_dict[key] for key in keys]).tolist()))
 
 def correlation(dict1, dict2):
   avg1 = 1.*sum([val for key, val in dict1.iteritems()])/len(dict1)
@@ -40,17 +40,22 @@ def correlation(dict1, dict2):
     den2 += (val2 - avg2) ** 2
   return numr / math.sqrt(den1 * den2)
 
+def ranks_correlation(ranks1, ranks2):
+  ''' Pearson's correlation of two arrays of ranks '''
+  assert len(ranks1) == len(ranks2)
+  if len(ranks1) == 0:
+    return 0.
+  x = numpy.asarray(ranks1, dtype=float) - numpy.mean(ranks1)
+  y = numpy.asarray(ranks2, dtype=float) - numpy.mean(ranks2)
+  return float(x.dot(y) / math.sqrt(x.dot(x) * y.dot(y)))
+
 def spearmans_rho(ranked_dict1, ranked_dict2):
   assert len(ranked_dict1) == len(ranked_dict2)
-  if len(ranked_dict1) == 0 or len(ranked_dict2) == 0:
+  keys = list(ranked_dict1.keys())
+  return ranks_correlation([ranked_dict1[key] for key in keys], [ranked_dict2[key] for key in keys])
+
+def spearmans_rho_of_scores(scores1, scores2):
+  ''' Spearman's rank correlation of two arrays of scores '''
+  if len(scores1) == 0:
     return 0.
-  x_avg = 1.*sum([val for val in ranked_dict1.values()])/len(ranked_dict1)
-  y_avg = 1.*sum([val for val in ranked_dict2.values()])/len(ranked_dict2)
-  num, d_x, d_y = (0., 0., 0.)
-  for key in ranked_dict1.keys():
-    xi = ranked_dict1[key]
-    yi = ranked_dict2[key]
-    num += (xi-x_avg)*(yi-y_avg)
-    d_x += (xi-x_avg)**2
-    d_y += (yi-y_avg)**2
-  return num/(math.sqrt(d_x*d_y))
+  return ranks_correlation(fractional_ranks(scores1), fractional_ranks(scores2))
@@ -1,25 +1,48 @@
 import sys
 import gzip
 import numpy
-import math
 
-from collections import Counter
-from operator import itemgetter
-
-''' Read all the word vectors and normalize them '''
-def read_word_vectors(filename):    
-  word_vecs = {}
-  if filename.endswith('.gz'): file_object = gzip.open(filename, 'r')
+''' Read all the word vectors into one matrix of normalized rows '''
+def read_word_vectors_to_matrix(filename):
+  ''' returns a dict of words and rows, and the matrix [nr_words x dim] '''
+  if filename.endswith('.gz'): file_object = gzip.open(filename, 'rt')
   else: file_object = open(filename, 'r')
 
-  for line_num, line in enumerate(file_object):
-    line = line.strip().lower()
-    word = line.split()[0]
-    word_vecs[word] = numpy.zeros(len(line.split())-1, dtype=float)
-    for index, vec_val in enumerate(line.split()[1:]):
-      word_vecs[word][index] = float(vec_val)      
-    ''' normalize weight vector '''
-    word_vecs[word] /= math.sqrt((word_vecs[word]**2).sum() + 1e-6)        
+  word_to_index = {}
+  words = []
+  values = []
+  with file_object:
+    for line in file_object:
+      ''' every line is split only once, all values are converted at the end '''
+      fields = line.lower().split()
+      if not fields:
+        continue
+      words.append(fields[0])
+      values.extend(fields[1:])
+  if not words:
+    return word_to_index, numpy.zeros((0, 0))
+  if len(values) % len(words) != 0:
+    raise ValueError("vectors in %s have different numbers of dimensions" % filename)
+  vectors = numpy.array(values, dtype=float).reshape((len(words), -1))
+  ''' normalize weight vectors '''
+  vectors /= numpy.sqrt((vectors ** 2).sum(axis=1, keepdims=True) + 1e-6)
+  for index, word in enumerate(words):
+    ''' a later vector of the same word replaces the earlier one '''
+    word_to_index[word] = index
 
   sys.stderr.write("Vectors read from: "+filename+" \n")
-  return word_vecs
+  return word_to_index, vectors
+
+''' Read all the word vectors and normalize them '''
+def read_word_vectors(filename):
+  word_to_index, vectors = read_word_vectors_to_matrix(filename)
+  return dict((word, vectors[index]) for word, index in word_to_index.items())
+
+''' Read word pairs and their similarities of a word similarity dataset '''
+def read_word_sim_dataset(filename):
+  ''' returns arrays of first words, second words and similarities, one entry per line '''
+  with open(filename, 'r') as file_object:
+    fields = [line.strip().lower().split() for line in file_object]
+  words1 = numpy.array([word1 for word1, _, _ in fields], dtype=object)
+  words2 = numpy.array([word2 for _, word2, _ in fields], dtype=object)
+  return words1, words2, numpy.array([val for _, _, val in fields], dtype=float)
@@ -1,27 +1,48 @@
 import sys
 import os
+import numpy
 
-from libraries.evaluation.word_sim.read_write import read_word_vectors
+from libraries.evaluation.word_sim.read_write import read_word_vectors_to_matrix, read_word_sim_dataset
 from libraries.evaluation.word_sim.ranking import *
 
 
+def score_word_sim_datasets(word_to_index, vectors, filenames):
+  ''' returns a list of (total_size, not_found, rho) of the datasets, cosine similarities of pairs of all datasets are
+      computed in one batch on the matrix of normalized vectors '''
+  datasets = []
+  all_ids1, all_ids2 = [], []
+  for filename in filenames:
+    words1, words2, manual_scores = read_word_sim_dataset(filename)
+    ids1 = numpy.array([word_to_index.get(word, -1) for word in words1], dtype=int)
+    ids2 = numpy.array([word_to_index.get(word, -1) for word in words2], dtype=int)
+    found = (ids1 >= 0) & (ids2 >= 0)
+    not_found = len(found) - int(found.sum())
+    ids1, ids2, manual_scores = ids1[found], ids2[found], manual_scores[found]
+    # a repeated pair is scored once, with its last similarity
+    _, last = numpy.unique((ids1 * len(vectors) + ids2)[::-1], return_index=True)
+    last = len(ids1) - 1 - last
+    all_ids1.append(ids1[last])
+    all_ids2.append(ids2[last])
+    datasets.append((manual_scores[last], len(found), not_found))
+
+  ids1, ids2 = numpy.concatenate(all_ids1), numpy.concatenate(all_ids2)
+  auto_scores = batch_cosine_sim(vectors, ids1, ids2) if len(ids1) else numpy.zeros(0)
+  results = []
+  offset = 0
+  for manual_scores, total_size, not_found in datasets:
+    rho = spearmans_rho_of_scores(manual_scores, auto_scores[offset:offset + len(manual_scores)])
+    offset += len(manual_scores)
+    results.append((total_size, not_found, rho))
+  return results
+
+
 def word_sim(word_vec_file, word_sim_file):
 
-      word_vecs = read_word_vectors(word_vec_file)
+      word_to_index, vectors = read_word_vectors_to_matrix(word_vec_file)
       print('=================================================================================')
       print("%15s" % "Num Pairs", "%15s" % "Not found", "%15s" % "Rho")
       print('=================================================================================')
 
-      manual_dict, auto_dict = ({}, {})
-      not_found, total_size = (0, 0)
-      for line in open(word_sim_file,'r'):
-        line = line.strip().lower()
-        word1, word2, val = line.split()
-        if word1 in word_vecs and word2 in word_vecs:
-          manual_dict[(word1, word2)] = float(val)
-          auto_dict[(word1, word2)] = cosine_sim(word_vecs[word1], word_vecs[word2])
-        else:
-          not_found += 1
-        total_size += 1
+      [(total_size, not_found, rho)] = score_word_sim_datasets(word_to_index, vectors, [word_sim_file])
       print("%15s" % str(total_size), "%15s" % str(not_found),)
-      print("%15.4f" % spearmans_rho(assign_ranks(manual_dict), assign_ranks(auto_dict)))
+      print("%15.4f" % rho)
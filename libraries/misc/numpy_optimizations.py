@@ -0,0 +1,161 @@
+# This file contains learning rate optimizations of the numpy backend, they mirror the ones in optimizations.py
+import numpy as np
+from libraries.tools.shared_arrays import to_shared_memory
+
+
+class NumpyLROpt:
+    # the number of statistics per parameter, e.g. Adam's first and second moments
+    nr_stats = 0
+
+    def __init__(self, learning_rate, sparse=False):
+        """
+        :param sparse: if True, embedding matrices that are passed as sparse_params are updated lazily, i.e. only
+                       rows that were looked up in the batch are updated(together with their optimizer's
+                       statistics). Otherwise, their gradients are scattered into dense matrices and updated as the
+                       remaining parameters.
+
+        """
+        self.alpha = learning_rate
+        self.sparse = sparse
+        # optimizer's statistics, indexed by parameters' names
+        self.state = {}
+
+    def __call__(self, params, sparse_params=()):
+        """
+        Updates parameters in-place.
+        :param params: a list of (name, value, grad) triples, where value is an array that is updated densely
+        :param sparse_params: a list of (name, W, row_ids, grad) quadruples, where W is an embedding matrix, row_ids
+                              is a vector of unique row indices that are used in the batch and grad is the gradient
+                              w.r.t. W[row_ids]
+
+        """
+        self._begin_step()
+        for name, value, grad in params:
+            self._dense_update(name, value, grad)
+        for name, W, row_ids, grad in sparse_params:
+            if self.sparse:
+                self._sparse_update(name, W, row_ids, grad)
+            else:
+                dense_grad = np.zeros_like(W)
+                dense_grad[row_ids] = grad
+                self._dense_update(name, W, dense_grad)
+
+    def _get_state(self, name, value, nr):
+        """
+        :return: a list of nr arrays of zeros with the same shape as value, they are created on the first call
+
+        """
+        if name not in self.state:
+            self.state[name] = [np.zeros_like(value) for _ in range(nr)]
+        return self.state[name]
+
+    def get_state(self):
+        """
+        :return: the optimizer's statistics, e.g. to checkpoint them
+
+        """
+        return {"state": self.state}
+
+    def set_state(self, state):
+        self.state = dict((name, [np.array(value) for value in values]) for name, values in state["state"].items())
+
+    def share_memory(self, params):
+        """
+        Moves statistics of parameters to shared memory(they are created if missing), so processes that are forked
+        afterwards update the same statistics.
+        :param params: a list of (name, value) pairs
+
+        """
+        for name, value in params:
+            self.state[name] = [to_shared_memory(stat) for stat in self._get_state(name, value, self.nr_stats)]
+
+    def advance(self, nr_steps):
+        """
+        Accounts for steps that were performed by copies of the optimizer, e.g. in other processes.
+
+        """
+        pass
+
+    def _begin_step(self):
+        pass
+
+    def _dense_update(self, name, value, grad):
+        raise NotImplementedError  # this has to be assigned in a subclass
+
+    def _sparse_update(self, name, W, row_ids, grad):
+        raise NotImplementedError  # this has to be assigned in a subclass
+
+
+class Adam(NumpyLROpt):
+    nr_stats = 2
+
+    def __init__(self, learning_rate, beta1, beta2, eps=1e-8, sparse=False):
+        NumpyLROpt.__init__(self, learning_rate=learning_rate, sparse=sparse)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+        self.t = 0
+        self.a_t = None
+
+    def get_state(self):
+        state = NumpyLROpt.get_state(self)
+        state["t"] = self.t
+        return state
+
+    def set_state(self, state):
+        NumpyLROpt.set_state(self, state)
+        self.t = int(state["t"])
+
+    def advance(self, nr_steps):
+        self.t += nr_steps
+
+    def _begin_step(self):
+        # the same bias correction as in lasagne's adam, sparse rows use the global time step(lazy Adam)
+        self.t += 1
+        self.a_t = float(self.alpha * np.sqrt(1 - self.beta2 ** self.t) / (1 - self.beta1 ** self.t))
+
+    def _dense_update(self, name, value, grad):
+        m_prev, v_prev = self._get_state(name, value, 2)
+        m_prev *= self.beta1
+        m_prev += (1 - self.beta1) * grad
+        v_prev *= self.beta2
+        v_prev += (1 - self.beta2) * grad ** 2
+        value -= self.a_t * m_prev / (np.sqrt(v_prev) + self.eps)
+
+    def _sparse_update(self, name, W, row_ids, grad):
+        m_prev, v_prev = self._get_state(name, W, 2)
+        m_t = self.beta1 * m_prev[row_ids] + (1 - self.beta1) * grad
+        v_t = self.beta2 * v_prev[row_ids] + (1 - self.beta2) * grad ** 2
+        m_prev[row_ids] = m_t
+        v_prev[row_ids] = v_t
+        W[row_ids] -= self.a_t * m_t / (np.sqrt(v_t) + self.eps)
+
+
+class SGD(NumpyLROpt):
+    def __init__(self, learning_rate, sparse=False):
+        NumpyLROpt.__init__(self, learning_rate, sparse=sparse)
+
+    def _dense_update(self, name, value, grad):
+        value -= self.alpha * grad
+
+    def _sparse_update(self, name, W, row_ids, grad):
+        W[row_ids] -= self.alpha * grad
+
+
+class AdaGrad(NumpyLROpt):
+    nr_stats = 1
+
+    def __init__(self, learning_rate, eps, sparse=False):
+        NumpyLROpt.__init__(self, learning_rate, sparse=sparse)
+        self.eps = eps
+
+    def _dense_update(self, name, value, grad):
+        accu, = self._get_state(name, value, 1)
+        accu += grad ** 2
+        value -= self.alpha * grad / np.sqrt(accu + self.eps)
+
+    def _sparse_update(self, name, W, row_ids, grad):
+        accu, = self._get_state(name, W, 1)
+        accu_new = accu[row_ids] + grad ** 2
+        accu[row_ids] = accu_new
+        W[row_ids] -= self.alpha * grad / np.sqrt(accu_new + self.eps)
@@ -1,35 +1,115 @@
 # This file contains learning rate optimizations
+import numpy as np
+import theano
+import theano.tensor as T
 import lasagne
+from collections import OrderedDict
 
 
 class LROpt:
-    def __init__(self, learning_rate):
+    def __init__(self, learning_rate, sparse=False):
+        """
+        :param sparse: if True, embedding matrices that are passed as sparse_params are updated lazily, i.e. only
+                       rows that were looked up in the batch are updated(together with their optimizer's
+                       statistics), so the per-step cost scales with the batch size instead of the vocabulary size.
+
+        """
         self.alpha = learning_rate
+        self.sparse = sparse
+
+    def __call__(self, cost, params, sparse_params=()):
+        """
+        :param params: a list of shared variables that are updated densely
+        :param sparse_params: a list of (W, row_ids, rows) triples, where W is a shared embedding matrix, row_ids is
+                              a sorted vector of unique row indices that are used in the batch and rows = W[row_ids] is
+                              the variable through which the cost depends on W
+        :return: an OrderedDict of updates
+
+        """
+        grads = T.grad(cost, list(params) + [rows for _, _, rows in sparse_params])
+        updates = self._dense_updates(grads[:len(params)], params)
+        for (W, row_ids, _), grad in zip(sparse_params, grads[len(params):]):
+            updates.update(self._sparse_updates(grad, W, row_ids))
+        return updates
+
+    def _dense_updates(self, grads, params):
+        raise NotImplementedError  # this has to be assigned in a subclass
+
+    def _sparse_updates(self, grad, W, row_ids):
+        """
+        :param grad: the gradient w.r.t. W[row_ids], a matrix [nr_rows x dim]
+        :return: an OrderedDict of updates that change only the rows row_ids of W and statistics
+
+        """
+        raise NotImplementedError  # this has to be assigned in a subclass
 
 
 class Adam(LROpt):
-    def __init__(self, learning_rate, beta1, beta2):
-        LROpt.__init__(self, learning_rate=learning_rate)
+    def __init__(self, learning_rate, beta1, beta2, eps=1e-8, sparse=False):
+        LROpt.__init__(self, learning_rate=learning_rate, sparse=sparse)
         self.beta1 = beta1
         self.beta2 = beta2
+        self.eps = eps
+        self.t = None
 
-    def __call__(self, cost, params):
-        return lasagne.updates.adam(cost, params, learning_rate=self.alpha, beta1=self.beta1, beta2=self.beta2)
+    def __call__(self, cost, params, sparse_params=()):
+        # lasagne's adam keeps its own time step for dense params, this one advances in lockstep for sparse params
+        self.t = theano.shared(lasagne.utils.floatX(0.))
+        updates = LROpt.__call__(self, cost, params, sparse_params)
+        if sparse_params:
+            updates[self.t] = self.t + 1
+        return updates
+
+    def _dense_updates(self, grads, params):
+        return lasagne.updates.adam(grads, params, learning_rate=self.alpha, beta1=self.beta1, beta2=self.beta2,
+                                    epsilon=self.eps)
+
+    def _sparse_updates(self, grad, W, row_ids):
+        """
+        Lazy Adam: moments of rows that are not in the batch are not decayed, the bias correction uses the global
+        time step.
+
+        """
+        m_prev, v_prev = zeros_like_shared(W), zeros_like_shared(W)
+        t = self.t + 1
+        a_t = self.alpha * T.sqrt(1 - self.beta2 ** t) / (1 - self.beta1 ** t)
+        m_t = self.beta1 * m_prev[row_ids] + (1 - self.beta1) * grad
+        v_t = self.beta2 * v_prev[row_ids] + (1 - self.beta2) * grad ** 2
+        return OrderedDict(((m_prev, T.set_subtensor(m_prev[row_ids], m_t)),
+                            (v_prev, T.set_subtensor(v_prev[row_ids], v_t)),
+                            (W, T.inc_subtensor(W[row_ids], - a_t * m_t / (T.sqrt(v_t) + self.eps)))))
 
 
 class SGD(LROpt):
-    def __init__(self, learning_rate):
-        LROpt.__init__(self, learning_rate)
+    def __init__(self, learning_rate, sparse=False):
+        LROpt.__init__(self, learning_rate, sparse=sparse)
+
+    def _dense_updates(self, grads, params):
+        return lasagne.updates.sgd(grads, params, learning_rate=self.alpha)
 
-    def __call__(self, cost, params):
-        return lasagne.updates.sgd(cost, params, learning_rate=self.alpha)
+    def _sparse_updates(self, grad, W, row_ids):
+        return OrderedDict(((W, T.inc_subtensor(W[row_ids], - self.alpha * grad)), ))
 
 
 class AdaGrad(LROpt):
-    def __init__(self, learning_rate, eps):
-        LROpt.__init__(self, learning_rate)
+    def __init__(self, learning_rate, eps, sparse=False):
+        LROpt.__init__(self, learning_rate, sparse=sparse)
         self.eps = eps
 
-    def __call__(self, cost, params):
-        return lasagne.updates.adagrad(cost, params, learning_rate=self.alpha, epsilon=self.eps)
+    def _dense_updates(self, grads, params):
+        return lasagne.updates.adagrad(grads, params, learning_rate=self.alpha, epsilon=self.eps)
+
+    def _sparse_updates(self, grad, W, row_ids):
+        accu = zeros_like_shared(W)
+        accu_new = accu[row_ids] + grad ** 2
+        return OrderedDict(((accu, T.set_subtensor(accu[row_ids], accu_new)),
+                            (W, T.inc_subtensor(W[row_ids], - self.alpha * grad / T.sqrt(accu_new + self.eps)))))
+
+
+def zeros_like_shared(param):
+    """
+    :return: a shared variable of zeros with the same shape and type as the shared variable param
 
+    """
+    value = param.get_value(borrow=True)
+    return theano.shared(np.zeros(value.shape, dtype=value.dtype), broadcastable=param.broadcastable)
@@ -0,0 +1,61 @@
+import numpy as np
+
+
+class BaseNeighbourSearch:
+    """
+    Base class of the neighbour search engines. It maps words to rows of the vectors matrix and back, children classes
+    implement search() and batch_search() that operate on indices.
+
+    """
+    def __init__(self, vectors, index_to_word):
+        """
+        :param vectors: matrix [vocab_size x dim] of word vectors, row i corresponds to index_to_word[i]
+        :param index_to_word: an array of words
+
+        """
+        assert len(vectors) == len(index_to_word)
+        self.vectors = np.ascontiguousarray(vectors, dtype="float32")
+        self.index_to_word = np.asarray(index_to_word, dtype=object)
+        self.word_to_index = {word: idx for idx, word in enumerate(index_to_word)}
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def __contains__(self, word):
+        return word in self.word_to_index
+
+    def search(self, query_vector, k=5, exclude=None):
+        """
+        :param exclude: an index that should not be returned (e.g. the query word itself)
+        :return: indices of the k nearest vectors sorted by distance
+
+        """
+        raise NotImplementedError
+
+    def batch_search(self, query_vectors, k=5, exclude=None):
+        """
+        :param query_vectors: matrix [nr_queries x dim]
+        :param exclude: a vector [nr_queries] of indices that should not be returned for the corresponding queries
+        :return: matrix [nr_queries x k] of indices sorted by distance, approximate search pads rows of queries with
+                 fewer results with -1
+
+        """
+        raise NotImplementedError
+
+    def nearest_neighbours(self, word, k=5):
+        """
+        :return: a list of k words that are the closest to the word (the word itself excluded)
+
+        """
+        idx = self.word_to_index[word]
+        return self.index_to_word[self.search(self.vectors[idx], k=k, exclude=idx)].tolist()
+
+    def batch_nearest_neighbours(self, words, k=5):
+        """
+        :param words: a list of words that are all present in the collection
+        :return: a list of lists with k closest words for each word(or fewer if approximate search found fewer)
+
+        """
+        idx = np.array([self.word_to_index[word] for word in words], dtype="int64")
+        neighbours = self.batch_search(self.vectors[idx], k=k, exclude=idx)
+        return [self.index_to_word[row[row >= 0]].tolist() for row in neighbours]
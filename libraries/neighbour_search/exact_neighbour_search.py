@@ -0,0 +1,129 @@
+import numpy as np
+from libraries.neighbour_search.base_neighbour_search import BaseNeighbourSearch
+from libraries.neighbour_search.support import top_k_smallest, top_k_smallest_rows
+from libraries.simulators.support import KL_gauss_spherical_from_sqrd_dists
+
+METRICS = ['l2', 'kl', 'sym_kl']
+
+
+class ExactNeighbourSearch(BaseNeighbourSearch):
+    """
+    Exact (brute force) nearest neighbour search over word vectors based on the squared Euclidean distance.
+    Squared norms are precomputed once, so a query costs a single matrix-vector product and a partial selection.
+    If sigmas of spherical Gaussians are provided, words can also be ranked by KL divergence ('kl' and 'sym_kl').
+
+    """
+    def __init__(self, vectors, index_to_word, sigmas=None):
+        """
+        :param sigmas: vector [vocab_size] or matrix [vocab_size x 1] of spherical Gaussians' sigmas (optional)
+
+        """
+        BaseNeighbourSearch.__init__(self, vectors, index_to_word)
+        self.sqrd_norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.sigmas = None
+        self.log_sigmas = None
+        if sigmas is not None:
+            sigmas = np.asarray(sigmas, dtype="float32")
+            if sigmas.ndim == 2 and sigmas.shape[1] != 1:
+                raise ValueError("KL search supports only spherical Gaussians, got sigmas of %d dimensions"
+                                 % sigmas.shape[1])
+            self.sigmas = sigmas.reshape((-1, ))
+            self.log_sigmas = np.log(self.sigmas + 1e-10)
+
+    def scores(self, query_vector):
+        """
+        Computes squared Euclidean distances between the query vector and all vectors up to the query's constant
+        squared norm, which does not change the ranking.
+        :return: vector [vocab_size]
+
+        """
+        return self.sqrd_norms - 2. * self.vectors.dot(query_vector)
+
+    def batch_scores(self, query_vectors):
+        """
+        Same as scores() but for many queries at once, computed by a single matrix-matrix product.
+        :param query_vectors: matrix [nr_queries x dim]
+        :return: matrix [nr_queries x vocab_size]
+
+        """
+        scores = query_vectors.dot(self.vectors.T)
+        scores *= -2.
+        scores += self.sqrd_norms
+        return scores
+
+    def search(self, query_vector, k=5, exclude=None):
+        scores = self.scores(np.asarray(query_vector, dtype="float32"))
+        if exclude is not None:
+            scores[exclude] = np.inf
+            k = min(k, len(self) - 1)
+        return top_k_smallest(scores, k)
+
+    def batch_search(self, query_vectors, k=5, exclude=None):
+        scores = self.batch_scores(np.asarray(query_vectors, dtype="float32"))
+        if exclude is not None:
+            scores[np.arange(scores.shape[0]), exclude] = np.inf
+            k = min(k, len(self) - 1)
+        return top_k_smallest_rows(scores, k)
+
+    def batch_kl_scores(self, query_ids, symmetric=False):
+        """
+        Computes KL(q||p) between query words q and all words p, or KL(q||p) + KL(p||q) if symmetric, in one
+        vectorised pass.
+        :param query_ids: a vector [nr_queries] of word indices
+        :return: matrix [nr_queries x vocab_size]
+
+        """
+        if self.sigmas is None:
+            raise ValueError("sigmas are required for KL based search")
+        k = self.vectors.shape[1]
+        sqrd_dists = self.batch_scores(self.vectors[query_ids])
+        sqrd_dists += self.sqrd_norms[query_ids, np.newaxis]
+        sigma_q = self.sigmas[query_ids, np.newaxis]
+        log_sigma_q = self.log_sigmas[query_ids, np.newaxis]
+        scores = KL_gauss_spherical_from_sqrd_dists(sqrd_dists, sigma_q, self.sigmas, k,
+                                                    log_sigma_q=log_sigma_q, log_sigma_p=self.log_sigmas)
+        if symmetric:
+            scores += KL_gauss_spherical_from_sqrd_dists(sqrd_dists, self.sigmas, sigma_q, k,
+                                                         log_sigma_q=self.log_sigmas, log_sigma_p=log_sigma_q)
+        return scores
+
+    def batch_nearest_neighbours(self, words, k=5, metric='l2'):
+        """
+        :param metric: one of METRICS, 'kl' ranks words p by KL(word||p)
+        :return: a list of lists with k closest words for each word
+
+        """
+        assert metric in METRICS
+        if metric == 'l2':
+            return BaseNeighbourSearch.batch_nearest_neighbours(self, words, k=k)
+        idx = np.array([self.word_to_index[word] for word in words], dtype="int64")
+        scores = self.batch_kl_scores(idx, symmetric=(metric == 'sym_kl'))
+        scores[np.arange(len(idx)), idx] = np.inf
+        neighbours = top_k_smallest_rows(scores, min(k, len(self) - 1))
+        return self.index_to_word[neighbours].tolist()
+
+    def pair_scores(self, first_ids, second_ids):
+        """
+        Computes cosine similarity of mus and KL divergences in both directions for word pairs, row-wise over all pairs
+        at once.
+        :param first_ids: a vector [nr_pairs] of word indices
+        :param second_ids: a vector [nr_pairs] of word indices
+        :return: cosine similarities, KL(first||second), KL(second||first); all vectors [nr_pairs]
+
+        """
+        if self.sigmas is None:
+            raise ValueError("sigmas are required for KL based scores")
+        k = self.vectors.shape[1]
+        dots = np.einsum('ij,ij->i', self.vectors[first_ids], self.vectors[second_ids])
+        first_sqrd_norms, second_sqrd_norms = self.sqrd_norms[first_ids], self.sqrd_norms[second_ids]
+        cos = dots / np.sqrt(first_sqrd_norms * second_sqrd_norms)
+        sqrd_dists = first_sqrd_norms + second_sqrd_norms - 2. * dots
+        first_sigmas, second_sigmas = self.sigmas[first_ids], self.sigmas[second_ids]
+        first_log_sigmas, second_log_sigmas = self.log_sigmas[first_ids], self.log_sigmas[second_ids]
+        kl_first_second = KL_gauss_spherical_from_sqrd_dists(sqrd_dists, first_sigmas, second_sigmas, k,
+                                                             log_sigma_q=first_log_sigmas,
+                                                             log_sigma_p=second_log_sigmas)
+        kl_second_first = KL_gauss_spherical_from_sqrd_dists(sqrd_dists, second_sigmas, first_sigmas, k,
+                                                             log_sigma_q=second_log_sigmas,
+                                                             log_sigma_p=first_log_sigmas)
+        return cos, kl_first_second, kl_second_first
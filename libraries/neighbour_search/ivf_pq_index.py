@@ -0,0 +1,167 @@
+import numpy as np
+from libraries.neighbour_search.base_neighbour_search import BaseNeighbourSearch
+from libraries.neighbour_search.support import kmeans, assign_to_centroids, top_k_smallest
+from libraries.utils.paths_and_files import create_folders_if_not_exist
+
+
+class IVFPQIndex(BaseNeighbourSearch):
+    """
+    Approximate nearest neighbour search with an inverted file index and product quantization (IVF-PQ).
+    Vectors are assigned to coarse k-means centroids (lists), and their residuals w.r.t. those centroids are encoded
+    with one byte per sub-space. A query visits only the nprobe closest lists, computes distances from lookup tables
+    and optionally re-ranks the best candidates by their exact distances.
+
+    """
+    def __init__(self, vectors, index_to_word, nr_lists=1024, nr_subspaces=10, nprobe=8, rerank_size=100,
+                 nr_train_samples=100000, nr_iter=20, seed=1, build=True):
+        """
+        :param nr_lists: the number of coarse centroids(inverted lists)
+        :param nr_subspaces: the number of sub-spaces of product quantization, has to divide the vectors' dimension
+        :param nprobe: the number of inverted lists that are visited per query, trades latency for recall
+        :param rerank_size: the number of best candidates that are re-ranked by exact distances, None disables it
+        :param nr_train_samples: the number of vectors that are used for k-means training
+        :param build: whether to build the index, set to False when the index structure is loaded from a file
+
+        """
+        BaseNeighbourSearch.__init__(self, vectors, index_to_word)
+        dim = self.vectors.shape[1]
+        if dim % nr_subspaces != 0:
+            raise ValueError("the vectors' dimension %d is not divisible by nr_subspaces %d" % (dim, nr_subspaces))
+        self.nr_lists = min(nr_lists, len(self))
+        self.nr_subspaces = nr_subspaces
+        self.nr_codes = 256
+        self.nprobe = nprobe
+        self.rerank_size = rerank_size
+        self.nr_train_samples = nr_train_samples
+        self.nr_iter = nr_iter
+        self.seed = seed
+
+        # the index structure, inverted lists are stored contiguously in ids and codes and delimited by list_offsets
+        self.coarse_centroids = None
+        self.pq_centroids = None
+        self.pq_sqrd_norms = None
+        self.list_offsets = None
+        self.ids = None
+        self.codes = None
+        if build:
+            self.build()
+
+    def build(self):
+        """
+        Trains coarse and product quantizers on a sample of vectors and encodes all vectors.
+
+        """
+        random_state = np.random.RandomState(self.seed)
+        n, dim = self.vectors.shape
+        sub_dim = dim // self.nr_subspaces
+        if n > self.nr_train_samples:
+            train = self.vectors[np.sort(random_state.choice(n, self.nr_train_samples, replace=False))]
+        else:
+            train = self.vectors
+
+        self.coarse_centroids, train_assignments = kmeans(train, self.nr_lists, nr_iter=self.nr_iter,
+                                                          random_state=random_state)
+        self.nr_lists = self.coarse_centroids.shape[0]
+        train_residuals = train - self.coarse_centroids[train_assignments]
+
+        self.pq_centroids = np.zeros((self.nr_subspaces, self.nr_codes, sub_dim), dtype="float32")
+        for m in range(self.nr_subspaces):
+            centroids, _ = kmeans(train_residuals[:, m * sub_dim:(m + 1) * sub_dim], self.nr_codes,
+                                  nr_iter=self.nr_iter, random_state=random_state)
+            self.pq_centroids[m, :centroids.shape[0]] = centroids
+
+        self.pq_sqrd_norms = np.sum(self.pq_centroids ** 2, axis=2)
+
+        # encode all vectors and sort them by inverted lists
+        assignments = assign_to_centroids(self.vectors, self.coarse_centroids)
+        codes = self.__encode(self.vectors - self.coarse_centroids[assignments])
+        self.ids = np.argsort(assignments, kind="stable")
+        self.codes = codes[self.ids]
+        self.list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=self.nr_lists))))
+
+    def __encode(self, residuals):
+        """
+        :return: matrix [n x nr_subspaces] of uint8 codes
+
+        """
+        sub_dim = self.pq_centroids.shape[2]
+        codes = np.empty((residuals.shape[0], self.nr_subspaces), dtype="uint8")
+        for m in range(self.nr_subspaces):
+            codes[:, m] = assign_to_centroids(residuals[:, m * sub_dim:(m + 1) * sub_dim], self.pq_centroids[m])
+        return codes
+
+    def search(self, query_vector, k=5, exclude=None):
+        query_vector = np.asarray(query_vector, dtype="float32")
+
+        # 1. select the closest inverted lists
+        coarse_dists = np.sum((self.coarse_centroids - query_vector) ** 2, axis=1)
+        lists = top_k_smallest(coarse_dists, self.nprobe)
+        starts, ends = self.list_offsets[lists], self.list_offsets[lists + 1]
+        ids = np.concatenate([self.ids[s:e] for s, e in zip(starts, ends)])
+        codes = np.concatenate([self.codes[s:e] for s, e in zip(starts, ends)])
+        list_positions = np.repeat(np.arange(len(lists)), ends - starts)
+
+        # 2. compute distance lookup tables [nprobe x nr_subspaces x nr_codes] for the query's residuals, the
+        # residuals' squared norms sum up to the distance to the coarse centroid and are added per list
+        residuals = (query_vector - self.coarse_centroids[lists]).reshape((len(lists), self.nr_subspaces, -1))
+        tables = self.pq_sqrd_norms - 2. * np.einsum('mcd,lmd->lmc', self.pq_centroids, residuals)
+        dists = np.sum(tables[list_positions[:, np.newaxis], np.arange(self.nr_subspaces), codes], axis=1)
+        dists += coarse_dists[lists][list_positions]
+
+        if exclude is not None:
+            dists[ids == exclude] = np.inf
+            k = min(k, len(self) - 1)
+
+        # 3. re-rank the best candidates by their exact distances
+        if self.rerank_size:
+            candidates = ids[top_k_smallest(dists, max(k, self.rerank_size))]
+            candidates = candidates[candidates != exclude] if exclude is not None else candidates
+            exact_dists = np.sum((self.vectors[candidates] - query_vector) ** 2, axis=1)
+            return candidates[top_k_smallest(exact_dists, k)]
+        best = top_k_smallest(dists, k)
+        # the excluded index remains among the best if the probed lists have at most k candidates
+        return ids[best[np.isfinite(dists[best])]]
+
+    def batch_search(self, query_vectors, k=5, exclude=None):
+        """
+        The probed lists of a query can have fewer than k candidates, rows of such queries are padded with -1.
+
+        """
+        exclude = [None] * len(query_vectors) if exclude is None else exclude
+        neighbours = np.full((len(query_vectors), k), -1, dtype="int64")
+        for i, (query_vector, excl) in enumerate(zip(query_vectors, exclude)):
+            result = self.search(query_vector, k=k, exclude=excl)
+            neighbours[i, :len(result)] = result
+        return neighbours
+
+    def save(self, file_path):
+        """
+        Saves the index structure(not the vectors) to a .npz file.
+
+        """
+        create_folders_if_not_exist(file_path)
+        np.savez(file_path, coarse_centroids=self.coarse_centroids, pq_centroids=self.pq_centroids,
+                 list_offsets=self.list_offsets, ids=self.ids, codes=self.codes,
+                 nr_items=np.int64(len(self)), nprobe=np.int64(self.nprobe),
+                 rerank_size=np.int64(self.rerank_size if self.rerank_size else 0))
+
+    @staticmethod
+    def load(file_path, vectors, index_to_word):
+        """
+        Loads the index structure that was saved via save(). vectors have to be the same that the index was built on.
+
+        """
+        with np.load(file_path) as archive:
+            if int(archive['nr_items']) != len(vectors):
+                raise ValueError("the index in '%s' was built for %d vectors, got %d"
+                                 % (file_path, int(archive['nr_items']), len(vectors)))
+            index = IVFPQIndex(vectors, index_to_word, nr_lists=archive['coarse_centroids'].shape[0],
+                               nr_subspaces=archive['pq_centroids'].shape[0], nprobe=int(archive['nprobe']),
+                               rerank_size=int(archive['rerank_size']) or None, build=False)
+            index.coarse_centroids = archive['coarse_centroids']
+            index.pq_centroids = archive['pq_centroids']
+            index.pq_sqrd_norms = np.sum(index.pq_centroids ** 2, axis=2)
+            index.list_offsets = archive['list_offsets']
+            index.ids = archive['ids']
+            index.codes = archive['codes']
+        return index
@@ -0,0 +1,66 @@
+# a console application that measures recall@k and latency of the approximate neighbour search against the exact one
+import argparse
+import numpy as np
+from timeit import default_timer as timer
+from libraries.evaluation.entailment.support import read_vectors_to_arrays
+from libraries.neighbour_search.exact_neighbour_search import ExactNeighbourSearch
+from libraries.neighbour_search.ivf_pq_index import IVFPQIndex
+
+
+def recall_at_k(ann_search, exact_search, query_ids, k=10):
+    """
+    Compares neighbours of the query words(excluded from their own results) found by both search engines.
+    :param query_ids: a vector of row indices that are used as queries
+    :return: average recall@k, average latency of the approximate and exact search per query in seconds
+
+    """
+    query_vectors = exact_search.vectors[query_ids]
+
+    start_time = timer()
+    exact_neighbours = exact_search.batch_search(query_vectors, k=k, exclude=query_ids)
+    exact_time = timer() - start_time
+
+    start_time = timer()
+    ann_neighbours = [ann_search.search(query_vector, k=k, exclude=query_id)
+                      for query_vector, query_id in zip(query_vectors, query_ids)]
+    ann_time = timer() - start_time
+
+    recall = np.mean([len(np.intersect1d(ann, exact)) / float(k) for ann, exact in zip(ann_neighbours, exact_neighbours)])
+    return recall, ann_time / len(query_ids), exact_time / len(query_ids)
+
+
+def run_recall_benchmark(mu_vectors_path, sigma_vectors_path, index_file_path=None, nprobes=(1, 2, 4, 8, 16, 32),
+                         k=10, nr_queries=1000, seed=1, **index_kwargs):
+    mus, _, vocab = read_vectors_to_arrays(mu_vectors_path, sigma_vectors_path)
+    index_to_word = sorted(vocab, key=vocab.get)
+    exact_search = ExactNeighbourSearch(mus, index_to_word)
+
+    start_time = timer()
+    if index_file_path:
+        ann_search = IVFPQIndex.load(index_file_path, mus, index_to_word)
+    else:
+        ann_search = IVFPQIndex(mus, index_to_word, **index_kwargs)
+    print("index is ready in %f seconds" % (timer() - start_time))
+
+    query_ids = np.random.RandomState(seed).choice(len(exact_search), min(nr_queries, len(exact_search)), replace=False)
+    print("%10s %15s %20s %20s" % ("nprobe", "recall@%d" % k, "ann latency (ms)", "exact latency (ms)"))
+    for nprobe in nprobes:
+        ann_search.nprobe = nprobe
+        recall, ann_latency, exact_latency = recall_at_k(ann_search, exact_search, query_ids, k=k)
+        print("%10d %15.4f %20.3f %20.3f" % (nprobe, recall, ann_latency * 1000, exact_latency * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='recall@k benchmark of the IVF-PQ index against the exact search.')
+    parser.add_argument('-mup', '--mu_vectors_path', type=str)
+    parser.add_argument('-sigmap', '--sigma_vectors_path', type=str)
+    parser.add_argument('--index_file_path', type=str, default=None, help="pre-built index, built from scratch if not provided")
+    parser.add_argument('--nr_lists', type=int, default=1024)
+    parser.add_argument('--nr_subspaces', type=int, default=10)
+    parser.add_argument('--rerank_size', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nr_queries', type=int, default=1000)
+    args = parser.parse_args()
+    run_recall_benchmark(args.mu_vectors_path, args.sigma_vectors_path, index_file_path=args.index_file_path,
+                         k=args.k, nr_queries=args.nr_queries, nr_lists=args.nr_lists,
+                         nr_subspaces=args.nr_subspaces, rerank_size=args.rerank_size or None)
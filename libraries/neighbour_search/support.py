@@ -0,0 +1,88 @@
+# contains helper functions that are shared by the neighbour search engines
+import numpy as np
+
+
+def top_k_smallest(scores, k):
+    """
+    Selects the k smallest scores of a vector without sorting the whole vector.
+    :param scores: vector [collection_size]
+    :return: indices of the k smallest scores sorted in the ascending order of their scores
+
+    """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty((0, ), dtype="int64")
+    if k < scores.shape[0]:
+        candidates = np.argpartition(scores, k - 1)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(scores[candidates], kind="stable")]
+
+
+def top_k_smallest_rows(scores, k):
+    """
+    Row-wise version of top_k_smallest.
+    :param scores: matrix [nr_queries x collection_size]
+    :return: matrix [nr_queries x k] of indices sorted in the ascending order of their scores
+
+    """
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype="int64")
+    if k < scores.shape[1]:
+        candidates = np.argpartition(scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    order = np.argsort(np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def assign_to_centroids(x, centroids, chunk_size=65536):
+    """
+    Assigns each row of x to the closest (squared Euclidean distance) centroid. Processes x in chunks to bound memory.
+    :param x: matrix [n x dim]
+    :param centroids: matrix [nr_centroids x dim]
+    :return: vector [n] of centroid indices
+
+    """
+    centroids_sqrd_norms = np.einsum('ij,ij->i', centroids, centroids)
+    assignments = np.empty((x.shape[0], ), dtype="int64")
+    for start in range(0, x.shape[0], chunk_size):
+        chunk = x[start:start + chunk_size]
+        dists = chunk.dot(centroids.T)
+        dists *= -2.
+        dists += centroids_sqrd_norms
+        assignments[start:start + chunk_size] = np.argmin(dists, axis=1)
+    return assignments
+
+
+def kmeans(x, nr_centroids, nr_iter=20, random_state=None):
+    """
+    Lloyd's k-means initialized with randomly chosen rows of x. Empty clusters are re-seeded with random rows.
+    :param x: matrix [n x dim]
+    :param random_state: np.random.RandomState object, used for initialization
+    :return: centroids [nr_centroids x dim], assignments [n]
+
+    """
+    random_state = random_state if random_state is not None else np.random.RandomState(1)
+    x = np.ascontiguousarray(x, dtype="float32")
+    n, dim = x.shape
+    nr_centroids = min(nr_centroids, n)
+    centroids = x[random_state.choice(n, nr_centroids, replace=False)].copy()
+    assignments = None
+    for _ in range(nr_iter):
+        new_assignments = assign_to_centroids(x, centroids)
+        if assignments is not None and np.array_equal(new_assignments, assignments):
+            break
+        assignments = new_assignments
+        # cluster sums via sorting by assignments and summing contiguous segments
+        counts = np.bincount(assignments, minlength=nr_centroids)
+        non_empty = counts > 0
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[non_empty]
+        sums = np.add.reduceat(x[order], starts, axis=0, dtype="float64")
+        centroids[non_empty] = (sums / counts[non_empty, np.newaxis]).astype("float32")
+        nr_empty = np.sum(~non_empty)
+        if nr_empty:
+            centroids[~non_empty] = x[random_state.choice(n, nr_empty, replace=False)]
+    return centroids, assign_to_centroids(x, centroids)
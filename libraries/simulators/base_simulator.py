@@ -1,12 +1,20 @@
 from libraries.simulators.support import load
+from libraries.tools.params_archive import is_params_archive
+from models.model_archive import load_model
+from models.numpy_bsg import NumpyBSG
 
 
 class BaseSimulator:
     def __init__(self, vocab, model_file_path):
         """
-        The passed in the .pkl format model has to have "encode" and "compute_prior_params" methods.
+        The passed in model has to have "encode" and "compute_prior_params" methods. It's either a parameters archive
+        folder, which is loaded into the numpy backend with memory-mapped parameters(nothing is compiled), or a model
+        in the .pkl format.
 
         """
         self.vocab = vocab
-        self.model = load(model_file_path)
+        if is_params_archive(model_file_path):
+            self.model = load_model(model_file_path, model_class=NumpyBSG, mmap_mode='r')
+        else:
+            self.model = load(model_file_path)
         assert hasattr(self.model, 'encode')
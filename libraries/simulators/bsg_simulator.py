@@ -23,7 +23,7 @@ class BsgSimulator(BaseSimulator):
         """
         # convert to vocab_ids
         center_word_id = np.int32(self.vocab[center_word].id)
-        context_word_ids = np.array([obj.id for obj in self.vocab[context_words]], dtype="int32")
+        context_word_ids = self.vocab.encode(context_words)
         # generate the mask of ones
         mask = np.ones([1, len(context_words)], dtype="float32")
         mu, sigma = self.model.encode([context_word_ids], [center_word_id],  mask)
@@ -113,21 +113,43 @@ def l2(x, axis=0):
 def cosine_sim(x, y):
     return float(np.sum(x*y))/float(np.sqrt(np.sum(x**2)*np.sum(y**2)))
 
+# closed form KL(q||p) between spherical Gaussians computed from squared distances between their means
+# all arguments broadcast, so one query can be scored against a whole vocabulary in one pass
+# log sigmas can be passed if they are precomputed
+def KL_gauss_spherical_from_sqrd_dists(sqrd_dists, sigma_q, sigma_p, k, log_sigma_q=None, log_sigma_p=None, eps=1e-8):
+    sigma_p_inv = 1./(sigma_p + eps)
+    log_sigma_q = np.log(sigma_q + 1e-10) if log_sigma_q is None else log_sigma_q
+    log_sigma_p = np.log(sigma_p + 1e-10) if log_sigma_p is None else log_sigma_p
+    trace = k * sigma_q * sigma_p_inv
+    quadr = sigma_p_inv * sqrd_dists
+    log_det = k*(log_sigma_p - log_sigma_q)
+    return 0.5 * (trace + quadr - k + log_det)
+
+
 # search_position: over what position to search KL(position 1 || ... ) or KL( ... || position 2)
 def argmin_score(mu_q, sigma_q, mus_and_sigmas, num=1, type="kl", search_position=1):
         assert type in ["kl", "l2"]
-        scores = {}
-        for word, (mu_p, sigma_p) in mus_and_sigmas.items():
-            if type == "kl":
-                if search_position==1:
-                    scores[word] = KL(mu_p, sigma_p, mu_q, sigma_q)
+        words = list(mus_and_sigmas.keys())
+        mus_p = np.stack([mus_and_sigmas[word][0] for word in words])
+        sqrd_dists = np.sum((mus_p - mu_q)**2, axis=1)
+        if type == "kl":
+            sigmas_p = np.stack([mus_and_sigmas[word][1] for word in words])
+            if sigmas_p.shape[1] == 1 and sigma_q.shape[0] == 1:
+                sigmas_p = sigmas_p[:, 0]
+                k = mus_p.shape[1]
+                if search_position == 1:
+                    scores = KL_gauss_spherical_from_sqrd_dists(sqrd_dists, sigmas_p, sigma_q[0], k)
                 else:
-                    scores[word] = KL(mu_q, sigma_q, mu_p, sigma_p)
-
+                    scores = KL_gauss_spherical_from_sqrd_dists(sqrd_dists, sigma_q[0], sigmas_p, k)
             else:
-                scores[word] = l2(mu_q - mu_p, axis=0)
-        sorted_scores = sorted(scores.items(), key=operator.itemgetter(1))
-        return sorted_scores[0:num]
+                if search_position == 1:
+                    scores = KL_gauss_diagonal(mus_p, sigmas_p, mu_q.reshape((1, -1)), sigma_q.reshape((1, -1)))
+                else:
+                    scores = KL_gauss_diagonal(mu_q.reshape((1, -1)), sigma_q.reshape((1, -1)), mus_p, sigmas_p)
+        else:
+            scores = np.sqrt(sqrd_dists)
+        best = np.argsort(scores, kind="stable")[0:num]
+        return [(words[idx], scores[idx]) for idx in best]
 
 # search_position: over what position to search KL(position 1 || ... ) or KL( ... || position 2)
 def closest_score(score, mu_q, sigma_q, mus_and_sigmas, num=1, type="kl", search_position=1):
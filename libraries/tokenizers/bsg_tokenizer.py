@@ -1,4 +1,5 @@
 from libraries.tools.word_processor import WordProcessor
+from libraries.utils.other import get_qualified_name
 from nltk import word_tokenize as default_tokenizer
 try:
     import re2 as re
@@ -23,6 +24,14 @@ class BSGTokenizer:
             self.tokenizer = split  # assuming that data was already tokenized
         self.word_processor = WordProcessor(word_processor_type=word_processor_type)
 
+    def get_config(self):
+        """
+        :return: a json-serializable dict of the settings that tokens depend on
+
+        """
+        return {"class": type(self).__name__, "tokenizer": get_qualified_name(self.tokenizer),
+                "word_processor_type": self.word_processor.word_processor_type}
+
     def __call__(self, sentence):
         """
         :param sentence: a string of words
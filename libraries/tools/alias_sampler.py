@@ -0,0 +1,67 @@
+import numpy as np
+
+
+class AliasSampler:
+    """
+    Draws samples from a fixed discrete distribution(e.g. the unigram distribution of negative samples) with Walker's
+    alias method. The table is built once in O(V), afterwards every sample costs O(1): a uniformly drawn bucket and
+    one comparison that decides between the bucket's own outcome and its alias.
+
+    """
+    def __init__(self, distr, seed=None):
+        """
+        :param distr: a vector [V] of probabilities
+        :param seed: a seed of the sampler's own random generator, if None it's drawn from numpy's global generator,
+                     so the sampler follows np.random.seed().
+
+        """
+        distr = np.asarray(distr, dtype="float64")
+        self.size = len(distr)
+        self.prob, self.alias = build_alias_table(distr / np.sum(distr))
+        self.random_state = None
+        self.seed(seed)
+
+    def seed(self, seed=None):
+        """
+        Re-seeds the sampler, e.g. differently in each batch producing worker.
+
+        """
+        if seed is None:
+            seed = np.random.randint(2**31 - 1)
+        self.random_state = np.random.RandomState(seed)
+
+    def sample(self, size):
+        """
+        :param size: an int or a shape tuple
+        :return: an int32 array of samples of the requested shape
+
+        """
+        buckets = self.random_state.randint(self.size, size=size)
+        accept = self.random_state.random_sample(size=size) < self.prob[buckets]
+        return np.where(accept, buckets, self.alias[buckets]).astype("int32")
+
+
+def build_alias_table(distr):
+    """
+    Vose's variant of the alias table construction.
+    :param distr: a vector [V] of probabilities that sum up to 1
+    :return: acceptance probabilities [V] and aliases [V]
+
+    """
+    n = len(distr)
+    prob = distr * n
+    alias = np.arange(n, dtype="int64")
+    small = np.flatnonzero(prob < 1.).tolist()
+    large = np.flatnonzero(prob >= 1.).tolist()
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] -= 1. - prob[s]
+        if prob[l] < 1.:
+            small.append(l)
+        else:
+            large.append(l)
+    # the remaining buckets are full up to numerical errors
+    for i in small + large:
+        prob[i] = 1.
+    return prob, alias
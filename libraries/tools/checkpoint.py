@@ -0,0 +1,68 @@
+# checkpoints of training, i.e. nested containers of arrays and json-serializable values in one .npz file
+import os
+import json
+import numpy as np
+from libraries.utils.paths_and_files import create_folders_if_not_exist
+
+CHECKPOINT_FILE_NAME = "checkpoint.npz"
+# the key of the json document that holds the structure and non-array values
+STRUCTURE_KEY = "__structure__"
+ARRAY_MARKER = "__array__"
+
+
+def save_checkpoint(file_path, state):
+    """
+    Writes the state to a temporary file that is moved into place only when it's complete, so a crash while
+    writing leaves the previous checkpoint intact.
+    :param state: a nested container of dicts(with string keys), lists, tuples, numpy arrays and json-serializable
+                  values. Tuples are restored as lists.
+
+    """
+    arrays = {}
+    structure = _split_arrays(state, arrays)
+    arrays[STRUCTURE_KEY] = np.array(json.dumps(structure))
+
+    create_folders_if_not_exist(file_path)
+    temp_file_path = file_path + ".tmp"
+    with open(temp_file_path, "wb") as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file_path, file_path)
+
+
+def load_checkpoint(file_path):
+    """
+    :return: the state that was written by save_checkpoint()
+
+    """
+    with np.load(file_path) as data:
+        structure = json.loads(str(data[STRUCTURE_KEY]))
+        return _join_arrays(structure, data)
+
+
+def _split_arrays(obj, arrays, prefix="state"):
+    """
+    Replaces arrays in obj by references to entries of the arrays dict.
+
+    """
+    if isinstance(obj, np.ndarray):
+        arrays[prefix] = obj
+        return {ARRAY_MARKER: prefix}
+    if isinstance(obj, dict):
+        return dict((key, _split_arrays(value, arrays, prefix + "/" + key)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [_split_arrays(value, arrays, prefix + "/" + str(i)) for i, value in enumerate(obj)]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _join_arrays(structure, data):
+    if isinstance(structure, dict):
+        if ARRAY_MARKER in structure:
+            return data[structure[ARRAY_MARKER]]
+        return dict((key, _join_arrays(value, data)) for key, value in structure.items())
+    if isinstance(structure, list):
+        return [_join_arrays(value, data) for value in structure]
+    return structure
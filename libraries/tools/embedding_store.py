@@ -0,0 +1,77 @@
+# a compact binary format of word vectors that can be memory-mapped instead of parsed
+import os
+import numpy as np
+from libraries.utils.paths_and_files import create_folders_if_not_exist
+
+EMBEDDING_STORE_FILE_NAME = "vectors.bin"
+MAGIC = b"BSGVEC01"
+# magic followed by 7 uint64 fields: vocab_size, mu_dim, sigma_dim, mus_offset, sigmas_offset, tokens_offset,
+# tokens_nbytes
+HEADER_SIZE = 64
+ALIGNMENT = 64
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_embedding_store(file_path, tokens, mus, sigmas, chunk_size=65536):
+    """
+    Writes a token table, a float32 mu matrix and a float32 sigma matrix into one binary file.
+    Matrices are written in chunks of rows, and the file is moved into place only when it's complete.
+    :param tokens: an array of tokens, token i corresponds to the row i of mus and sigmas
+    :param mus: matrix [vocab_size x mu_dim]
+    :param sigmas: matrix [vocab_size x sigma_dim]
+
+    """
+    assert len(tokens) == len(mus) == len(sigmas)
+    sigmas = sigmas.reshape((len(sigmas), -1))
+    tokens_blob = "\n".join(tokens).encode("utf-8")
+
+    vocab_size, mu_dim = mus.shape
+    sigma_dim = sigmas.shape[1]
+    mus_offset = _align(HEADER_SIZE)
+    sigmas_offset = _align(mus_offset + vocab_size * mu_dim * 4)
+    tokens_offset = _align(sigmas_offset + vocab_size * sigma_dim * 4)
+    header = np.array([vocab_size, mu_dim, sigma_dim, mus_offset, sigmas_offset, tokens_offset, len(tokens_blob)],
+                      dtype="<u8")
+
+    create_folders_if_not_exist(file_path)
+    temp_file_path = file_path + ".tmp"
+    with open(temp_file_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(header.tobytes())
+        for offset, matrix in ((mus_offset, mus), (sigmas_offset, sigmas)):
+            f.write(b"\0" * (offset - f.tell()))
+            for start in range(0, vocab_size, chunk_size):
+                f.write(np.ascontiguousarray(matrix[start:start + chunk_size], dtype="<f4").tobytes())
+        f.write(b"\0" * (tokens_offset - f.tell()))
+        f.write(tokens_blob)
+    os.replace(temp_file_path, file_path)
+
+
+class EmbeddingStore:
+    """
+    Read-only access to a file written by write_embedding_store(). Matrices are memory-mapped, so opening is cheap and
+    several processes that open the same file share one page-cached copy.
+
+    """
+    def __init__(self, file_path):
+        with open(file_path, "rb") as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise ValueError("'%s' is not an embedding store file" % file_path)
+            header = np.frombuffer(f.read(HEADER_SIZE - len(MAGIC)), dtype="<u8")
+            vocab_size, mu_dim, sigma_dim, mus_offset, sigmas_offset, tokens_offset, tokens_nbytes = \
+                [int(field) for field in header]
+            f.seek(tokens_offset)
+            tokens_blob = f.read(tokens_nbytes)
+
+        self.file_path = file_path
+        self.tokens = tokens_blob.decode("utf-8").split("\n") if vocab_size else []
+        self.mus = np.memmap(file_path, dtype="<f4", mode="r", offset=mus_offset, shape=(vocab_size, mu_dim))
+        self.sigmas = np.memmap(file_path, dtype="<f4", mode="r", offset=sigmas_offset,
+                                shape=(vocab_size, sigma_dim))
+
+    def __len__(self):
+        return len(self.tokens)
@@ -1,13 +1,25 @@
 import os
+import glob
 from libraries.utils.paths_and_files import create_folders_if_not_exist
 from time import strftime
 
 
 # A general purpose class for logging
 class Log():
-    def __init__(self, folder):
-        self.file_path = os.path.join(folder, "log_"+strftime("%b_%d_%H_%M_%S")+'.txt')
+    def __init__(self, folder, resume=False):
+        """
+        :param resume: if True, the last modified log of the folder is continued(e.g. when training is resumed),
+                       otherwise a new one is created
+
+        """
+        log_file_paths = glob.glob(os.path.join(folder, "log_*.txt")) if resume else []
+        if log_file_paths:
+            self.file_path = max(log_file_paths, key=os.path.getmtime)
+        else:
+            self.file_path = os.path.join(folder, "log_"+strftime("%b_%d_%H_%M_%S")+'.txt')
         create_folders_if_not_exist(self.file_path)
+        # the file is opened on the first write and kept open
+        self.file = None
 
     def write(self, string, also_print=True, include_timestamp=True):
         """
@@ -19,5 +31,19 @@ class Log():
             string = "%s [INFO]: %s" % (strftime("%H:%M:%S"), string)
         if also_print:
             print(string)
-        with open(self.file_path, "a") as f:
-            f.write(string+" \n")
+        if self.file is None:
+            self.file = open(self.file_path, "a")
+        self.file.write(string+" \n")
+        # flushed, so the log is complete if training crashes and forked processes don't inherit buffered lines
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __getstate__(self):
+        # a copy opens its own file
+        state = dict(self.__dict__)
+        state["file"] = None
+        return state
@@ -0,0 +1,68 @@
+# an archive of model parameters: a folder with one .npy file per parameter and a json manifest of hyper-parameters
+import os
+import json
+import shutil
+import numpy as np
+from collections import OrderedDict
+
+PARAMS_ARCHIVE_FOLDER_NAME = "params"
+MANIFEST_FILE_NAME = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def write_params_archive(folder_path, params, hyperparams=None, backend=None):
+    """
+    Writes parameters to a temporary folder that is moved into place only when it's complete, so a crash while
+    writing leaves the previous archive intact.
+    :param params: an OrderedDict of parameter names and arrays
+    :param hyperparams: a json-serializable dict that is sufficient to rebuild the model
+    :param backend: the name of the backend that the model was trained with(see models.model_archive.BACKENDS)
+
+    """
+    folder_path = os.path.normpath(folder_path)
+    temp_folder_path = folder_path + ".tmp"
+    if os.path.exists(temp_folder_path):
+        shutil.rmtree(temp_folder_path)
+    os.makedirs(temp_folder_path)
+
+    params_info = OrderedDict()
+    for name, value in params.items():
+        file_name = name + ".npy"
+        np.save(os.path.join(temp_folder_path, file_name), value)
+        params_info[name] = OrderedDict((("file", file_name), ("shape", list(value.shape)),
+                                         ("dtype", str(value.dtype))))
+    manifest = OrderedDict((("format_version", FORMAT_VERSION), ("backend", backend),
+                            ("hyperparams", hyperparams or {}), ("params", params_info)))
+    with open(os.path.join(temp_folder_path, MANIFEST_FILE_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(folder_path):
+        shutil.rmtree(folder_path)
+    os.rename(temp_folder_path, folder_path)
+
+
+def read_params_manifest(folder_path):
+    with open(os.path.join(folder_path, MANIFEST_FILE_NAME)) as f:
+        manifest = json.load(f, object_pairs_hook=OrderedDict)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError("unsupported version of the parameters archive: %s" % manifest.get("format_version"))
+    return manifest
+
+
+def read_params_archive(folder_path, mmap_mode=None, exclude_params=()):
+    """
+    :param mmap_mode: if set(e.g. 'r' or 'c'), arrays are memory-mapped instead of read, see numpy.load
+    :return: the manifest, and an OrderedDict of parameter names and arrays
+
+    """
+    manifest = read_params_manifest(folder_path)
+    params = OrderedDict()
+    for name, info in manifest["params"].items():
+        if name in exclude_params:
+            continue
+        params[name] = np.load(os.path.join(folder_path, info["file"]), mmap_mode=mmap_mode)
+    return manifest, params
+
+
+def is_params_archive(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE_NAME))
@@ -0,0 +1,14 @@
+# numpy arrays in shared memory, processes that are forked afterwards read and write the same values
+import numpy as np
+from multiprocessing.sharedctypes import RawArray
+
+
+def to_shared_memory(value):
+    """
+    :return: a copy of the array in shared memory
+
+    """
+    raw_array = RawArray("b", max(1, value.nbytes))
+    shared = np.frombuffer(raw_array, dtype=value.dtype, count=value.size).reshape(value.shape)
+    shared[...] = value
+    return shared
@@ -0,0 +1,173 @@
+# per-batch training metrics: time spent waiting for batches, in training steps and in bookkeeping, throughput and
+# memory usage. They are written to a structured file(one json object per line or csv) with buffered writes.
+import os
+import csv
+import json
+import time
+from collections import OrderedDict
+from libraries.utils.paths_and_files import create_folders_if_not_exist
+
+METRICS_FILE_NAME = "metrics"
+# formats of the metrics file and their extensions
+METRICS_FORMATS = {"jsonl": ".jsonl", "csv": ".csv"}
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class MetricsWriter:
+    def __init__(self, file_path, file_format="jsonl", buffer_size=100):
+        """
+        :param file_format: one of METRICS_FORMATS. The fields of a csv file are the keys of the first record, a
+                            header is written only if the file is empty(e.g. not when training is resumed).
+        :param buffer_size: the number of records after which the file is flushed
+
+        """
+        assert file_format in METRICS_FORMATS
+        assert buffer_size >= 1
+        self.file_path = file_path
+        self.file_format = file_format
+        self.buffer_size = buffer_size
+        self.file = None
+        self.csv_writer = None
+        self.nr_buffered = 0
+
+    def write(self, record):
+        """
+        :param record: an OrderedDict of names and json-serializable values
+
+        """
+        if self.file is None:
+            self.__open(record)
+        if self.file_format == "csv":
+            self.csv_writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + "\n")
+        self.nr_buffered += 1
+        if self.nr_buffered >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+        self.nr_buffered = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.csv_writer = None
+        self.nr_buffered = 0
+
+    def __open(self, first_record):
+        create_folders_if_not_exist(self.file_path)
+        self.file = open(self.file_path, "a", newline="")
+        if self.file_format == "csv":
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=list(first_record.keys()), extrasaction="ignore")
+            if self.file.tell() == 0:
+                self.csv_writer.writeheader()
+
+    def __getstate__(self):
+        # a copy opens its own file
+        state = dict(self.__dict__)
+        state["file"] = state["csv_writer"] = None
+        state["nr_buffered"] = 0
+        return state
+
+
+class ThroughputMonitor:
+    """
+    Splits the wall time of training into waiting for batches(e.g. on the batch iterator's queue), training steps and
+    bookkeeping(logging, checkpoints, etc.), so one can see whether training is I/O-bound or compute-bound. The
+    phases are marked by the training loop:
+        monitor.start()
+        for batch in iterator:
+            monitor.batch_received()
+            train(batch)
+            monitor.step_finished()
+            ...
+            monitor.batch_finished(nr_words, nr_examples)
+        monitor.finish()
+
+    """
+    def __init__(self, writer=None):
+        """
+        :param writer: a MetricsWriter that per-batch records are written to, if None, only totals are computed
+
+        """
+        self.writer = writer
+        self.phase_start = None
+        self.wait_time = 0.
+        self.step_time = 0.
+        self.totals = None
+
+    def start(self):
+        self.phase_start = time.time()
+        self.totals = OrderedDict((("batches", 0), ("words", 0), ("examples", 0), ("wait_time", 0.),
+                                   ("step_time", 0.), ("bookkeeping_time", 0.)))
+
+    def batch_received(self):
+        self.wait_time = self.__end_phase()
+
+    def step_finished(self):
+        self.step_time = self.__end_phase()
+
+    def batch_finished(self, nr_words, nr_examples, extra=None):
+        """
+        :param nr_words: the number of words of the batch
+        :param nr_examples: the number of training examples of the batch
+        :param extra: an OrderedDict of additional values that are recorded after timings(e.g. training metrics)
+        :return: the batch's record
+
+        """
+        bookkeeping_time = self.__end_phase()
+        batch_time = max(self.wait_time + self.step_time + bookkeeping_time, 1e-9)
+        for name, value in (("batches", 1), ("words", nr_words), ("examples", nr_examples),
+                            ("wait_time", self.wait_time), ("step_time", self.step_time),
+                            ("bookkeeping_time", bookkeeping_time)):
+            self.totals[name] += value
+
+        record = OrderedDict((("time", time.time()), ("wait_time", self.wait_time), ("step_time", self.step_time),
+                              ("bookkeeping_time", bookkeeping_time), ("words_per_sec", nr_words / batch_time),
+                              ("examples_per_sec", nr_examples / batch_time), ("rss", get_rss())))
+        if extra:
+            record.update((name, to_json_value(value)) for name, value in extra.items())
+        if self.writer is not None:
+            self.writer.write(record)
+        return record
+
+    def finish(self):
+        """
+        Flushes the writer.
+        :return: an OrderedDict of throughput and fractions of time spent in the phases since start()
+
+        """
+        if self.writer is not None:
+            self.writer.flush()
+        total_time = max(self.totals["wait_time"] + self.totals["step_time"] + self.totals["bookkeeping_time"], 1e-9)
+        return OrderedDict((("words_per_sec", self.totals["words"] / total_time),
+                            ("examples_per_sec", self.totals["examples"] / total_time),
+                            ("wait_fraction", self.totals["wait_time"] / total_time),
+                            ("step_fraction", self.totals["step_time"] / total_time),
+                            ("bookkeeping_fraction", self.totals["bookkeeping_time"] / total_time)))
+
+    def __end_phase(self):
+        now = time.time()
+        duration = now - self.phase_start
+        self.phase_start = now
+        return duration
+
+
+def get_rss():
+    """
+    :return: the resident set size of the process in bytes, or None where /proc is not available
+
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def to_json_value(value):
+    # numpy scalars and 0-d arrays are not json-serializable
+    return value.item() if hasattr(value, "item") else value
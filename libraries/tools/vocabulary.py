@@ -4,6 +4,8 @@ from libraries.utils.other import sort_hash
 import os
 import numpy as np
 import codecs # python 3
+from collections import Counter
+from multiprocessing import Pool
 try:
     import re2 as re
 except ImportError:
@@ -23,7 +25,8 @@ class Word:
 
 class Vocabulary:
     """
-    A general purpose vocabulary class.
+    A general purpose vocabulary class. Tokens are mapped to ids by a dictionary and counts are stored in a numpy
+    array indexed by ids, Word objects are only created when they are requested.
 
     """
 
@@ -41,20 +44,22 @@ class Vocabulary:
         self.total_count = 0
 
         # create data collectors
-        self._id_to_word_obj = []
-        self._word_to_word_obj = {}
+        self._id_to_token = []
+        self._token_to_id = {}
+        self._counts = np.zeros((1024, ), dtype="int64")  # the capacity grows as words are added
         self.special_symbols = {}
 
-    def load_or_create(self, vocab_file_path, data_path, target_positions=[0], sep=" "):
+    def load_or_create(self, vocab_file_path, data_path, target_positions=[0], sep=" ", nr_workers=1):
         """
         A convenience function that either creates a vocabulary or loads it if it already exists.
         :param target_positions: see create().
+        :param nr_workers: see create().
 
         """
         if os.path.isfile(vocab_file_path):
             self.load(vocab_file_path, sep)
         else:
-            self.create(data_path, target_positions=target_positions)
+            self.create(data_path, target_positions=target_positions, nr_workers=nr_workers)
             self.write(vocab_file_path, sep)
 
     def load(self, vocab_file_path, sep=" "):
@@ -68,51 +73,48 @@ class Vocabulary:
                 token, count = fields[0], int(fields[1])
                 # dropping infrequent words
                 if count >= self.min_count:
-                    word_obj = self.add_word(token, count=count)
-                    # if the word_obj is actually a special symbol, add it to the proper collection.
+                    word_id = self._add_word(token, count=count)
+                    # if the word is actually a special symbol, add it to the proper collection.
                     if match_special_symbol(token):
-                        self.special_symbols[token] = word_obj
+                        self.special_symbols[token] = self[word_id]
 
         self.add_special_symbols(DEFAULT_SPECIAL_SYMBOLS)
 
-    def create(self, data_path, target_positions=[0]):
+    def create(self, data_path, target_positions=[0], nr_workers=1):
         """
         Creates a vocabulary from textual data where target_positions is a list.
         :param target_positions: List of positions of the actual text to be considered for the vocabulary creation
+        :param nr_workers: the number of processes that tokenize and count words of data shards in parallel, the
+                           data_iterator has to support set_shard(). The result does not depend on it.
 
         """
         assert self._data_iterator
-        temp_word_to_freq = {}
         print("Creating vocabulary...")
 
         self._data_iterator.set_data_path(data_path)
 
-        for data in self._data_iterator:
-            for t_p in target_positions:
-                tokens = data[t_p]
-
-                if not isinstance(tokens, (list, np.ndarray)):
-                    tokens = [tokens]
-
-                for token in tokens:
-                    if isinstance(token, int):
-                        raise TypeError("the type of the word '%s' must not be int!" % token)
-                    if token == '':
-                        continue
-                    if token not in temp_word_to_freq:
-                        temp_word_to_freq[token] = 0
-                    temp_word_to_freq[token] += 1
+        if nr_workers > 1:
+            # more shards than workers balance the load, shards are merged in the order of data, so that words with
+            # equal counts keep the order of their first occurrence
+            nr_shards = nr_workers * 4
+            temp_word_to_freq = Counter()
+            with Pool(nr_workers) as pool:
+                for shard_word_to_freq in pool.imap(count_words, [(self._data_iterator, target_positions, shard_id,
+                                                                   nr_shards) for shard_id in range(nr_shards)]):
+                    temp_word_to_freq.update(shard_word_to_freq)
+        else:
+            temp_word_to_freq = count_words((self._data_iterator, target_positions, 0, 1))
 
         # populate the collectors
         for token, count in sort_hash(temp_word_to_freq, by_key=False):
             if self.max_size and len(self) >= self.max_size:
                 break
             if count >= self.min_count:
-                word_obj = self.add_word(token, count)
+                word_id = self._add_word(token, count)
                 self.total_count += count
-                # if the word_obj is actually a special symbol, add it to the proper collection.
+                # if the word is actually a special symbol, add it to the proper collection.
                 if match_special_symbol(token):
-                    self.special_symbols[token] = word_obj
+                    self.special_symbols[token] = self[word_id]
 
         self.add_special_symbols(DEFAULT_SPECIAL_SYMBOLS)
 
@@ -142,22 +144,49 @@ class Vocabulary:
         Adds a word to collection or update its count if it already there.
 
         """
-        if token in self:
-            word_obj = self[token]
+        return self[self._add_word(token, count)]
+
+    def _add_word(self, token, count=1):
+        """
+        Same as add_word() but returns the word's id, so no Word object is created.
+
+        """
+        word_id = self._token_to_id.get(token)
+        if word_id is not None:
             self.total_count += count
-            self.total_count -= word_obj.count
-            word_obj.count = count
+            self.total_count -= int(self._counts[word_id])
         else:
-            n = len(self._word_to_word_obj)
-            word_obj = Word(token, id=n, count=count)
-            self._word_to_word_obj[token] = word_obj
-            self._id_to_word_obj.append(word_obj)
+            word_id = len(self._id_to_token)
+            if word_id == len(self._counts):
+                self._counts = np.concatenate((self._counts, np.zeros_like(self._counts)))
+            self._token_to_id[token] = word_id
+            self._id_to_token.append(token)
             self.total_count += count
-        return word_obj
+        self._counts[word_id] = count
+        return word_id
+
+    @property
+    def counts(self):
+        """
+        :return: an array [vocab_size] of counts indexed by word ids
+
+        """
+        return self._counts[:len(self)]
+
+    def encode(self, tokens):
+        """
+        Converts tokens to an array of word ids, tokens that are not in the vocabulary are mapped to UNK.
+        :param tokens: a list of strings
+        :return: an int32 array of word ids
+
+        """
+        unk_id = self._token_to_id[UNK_TOKEN]
+        get_id = self._token_to_id.get
+        return np.array([get_id(token, unk_id) for token in tokens], dtype="int32")
 
     def assign_distr(self, pow=0.75):
         # extract frequencies as an array
-        counts = np.array([word.count for word in self])
+        counts = self.counts
         self.uni_distr = compute_distr(counts, pow)
         # dirty hack to avoid numpy's probabilies do not sum to 1
         s = sum(self.uni_distr)
@@ -167,21 +196,21 @@ class Vocabulary:
         assert self.uni_distr is not None
 
     def __len__(self):
-        return len(self._id_to_word_obj)
+        return len(self._id_to_token)
 
     def __contains__(self, item):
         if isinstance(item, Word):
-            return item.token in self._word_to_word_obj
+            return item.token in self._token_to_id
         if isinstance(item, str):  # Python 3
             # or isinstance(item, unicode): Python 2
-            return item in self._word_to_word_obj
+            return item in self._token_to_id
         if isinstance(item, int):
-            return len(self._id_to_word_obj) >= item + 1
+            return len(self._id_to_token) >= item + 1
         raise ValueError('input argument is not of a correct type.')
 
     def __iter__(self):
-        for word in self._id_to_word_obj:
-            yield word
+        for word_id in range(len(self)):
+            yield self[word_id]
 
     def __getitem__(self, item):
         """
@@ -191,16 +220,45 @@ class Vocabulary:
         """
         if isinstance(item, str): # Python 3
             # or isinstance(item, unicode): Python 2
-            return self._word_to_word_obj[item] if item in self else self[UNK_TOKEN]
+            word_id = self._token_to_id.get(item)
+            return self[word_id] if word_id is not None else self[UNK_TOKEN]
         if isinstance(item, (int, # long, Python 2 
                              np.integer)):
-            return self._id_to_word_obj[item]
+            return Word(self._id_to_token[item], id=int(item), count=int(self._counts[item]))
         if isinstance(item, (list, np.ndarray)):
             return [self[w] for w in item]
         print(item.token)
         raise ValueError('input argument is not of a correct type.')
 
 
+def count_words(args):
+    """
+    Counts words of one data shard, it's a top level function, so it can be executed in a pool of processes.
+    :param args: a data iterator with the data path already set, target positions, the shard's id and the number
+                 of shards
+    :return: a Counter where words are in the order of their first occurrence
+
+    """
+    data_iterator, target_positions, shard_id, nr_shards = args
+    if nr_shards > 1:
+        data_iterator.set_shard(shard_id, nr_shards)
+    word_to_freq = Counter()
+    for data in data_iterator:
+        for t_p in target_positions:
+            tokens = data[t_p]
+
+            if not isinstance(tokens, (list, np.ndarray)):
+                tokens = [tokens]
+
+            for token in tokens:
+                if isinstance(token, int):
+                    raise TypeError("the type of the word '%s' must not be int!" % token)
+                if token == '':
+                    continue
+                word_to_freq[token] += 1
+    return word_to_freq
+
+
 def compute_distr(freq, pow=0.75):
     """
     Computes and returns a unigram distributions over frequency counts.
@@ -0,0 +1,57 @@
+# writing of word vectors to files in different formats
+import io
+import os
+import numpy as np
+from libraries.utils.paths_and_files import create_folders_if_not_exist
+
+# output formats of word vectors and extensions of their files
+VECTORS_FORMATS = {"text": ".vectors", "binary": ".bin", "npy": ".npy"}
+
+
+def write_vectors(tokens, file_path, vectors, vectors_format="text", chunk_size=10000):
+    """
+    Writes word vectors into a file in chunks of rows, so only one chunk is formatted in memory at a time.
+    Formats:
+        text: one line per word, the token is followed by space separated values
+        binary: the word2vec binary format, i.e. a "vocab_size dim" header line and one "token " + float32 bytes
+                record per word
+        npy: the matrix is written as a .npy file, tokens are written one per line to a .tokens file next to it
+    :param tokens: an array of tokens, token i corresponds to the row i of vectors
+    :param file_path: where to write vectors
+    :param vectors: matrix [vocab_size x dim]
+    :param vectors_format: one of VECTORS_FORMATS
+
+    """
+    assert vectors_format in VECTORS_FORMATS
+    assert len(tokens) == len(vectors)
+    vectors = vectors.reshape((len(vectors), -1))
+    create_folders_if_not_exist(file_path)
+
+    if vectors_format == "npy":
+        output = np.lib.format.open_memmap(file_path, mode="w+", dtype="float32", shape=vectors.shape)
+        for start in range(0, len(vectors), chunk_size):
+            output[start:start + chunk_size] = vectors[start:start + chunk_size]
+        output.flush()
+        del output
+        with open(os.path.splitext(file_path)[0] + ".tokens", 'w', encoding="utf-8") as output_file:
+            for start in range(0, len(tokens), chunk_size):
+                output_file.write("".join(token + "\n" for token in tokens[start:start + chunk_size]))
+        return
+
+    if vectors_format == "binary":
+        with open(file_path, 'wb') as output_file:
+            output_file.write(("%d %d\n" % vectors.shape).encode("utf-8"))
+            for start in range(0, len(vectors), chunk_size):
+                chunk = np.ascontiguousarray(vectors[start:start + chunk_size], dtype="<f4")
+                output_file.write(b"".join(token.encode("utf-8") + b" " + row.tobytes()
+                                           for token, row in zip(tokens[start:start + chunk_size], chunk)))
+        return
+
+    with open(file_path, 'w', encoding="utf-8") as output_file:
+        for start in range(0, len(vectors), chunk_size):
+            # 9 significant digits are enough to restore float32 values exactly
+            buffer = io.StringIO()
+            np.savetxt(buffer, vectors[start:start + chunk_size], fmt="%.9g", delimiter=" ")
+            rows = buffer.getvalue().splitlines()
+            output_file.write("".join(token + " " + row + "\n"
+                                      for token, row in zip(tokens[start:start + chunk_size], rows)))
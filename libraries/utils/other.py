@@ -52,4 +52,14 @@ def append_to_ordered_dict(initial_dict, param_dict):
     assert isinstance(param_dict, OrderedDict)
     for key, value in param_dict.items():
         initial_dict[key] = value
-    return initial_dict
\ No newline at end of file
+    return initial_dict
+
+
+def get_qualified_name(func):
+    """
+    :return: the module and the qualified name of a function or a class, or of the class of another object
+
+    """
+    if not hasattr(func, "__qualname__"):
+        func = type(func)
+    return "%s.%s" % (func.__module__, func.__qualname__)
@@ -20,31 +20,37 @@ def lemmatize_word(word, language='de'):
         return lemmatizer.lemmatize(word)
 
 
-def produce_entailment_measurements(input_word, input_word_list, input_word_list_name, output_path, language='de'):
+def produce_entailment_measurements(input_word, input_word_list, input_word_list_name, output_path, language='de',
+                                    batch_size=10000):
     print(f'producing entailment results for {input_word} from reference list {input_word_list_name}')
     results = {}
-    for word_2 in tqdm(input_word_list):
-        if input_word != word_2:
-            # lemmatize to avoid words of the same tree
-            input_word_lemma = lemmatize_word(input_word, language)
-            word2_lemma = lemmatize_word(word_2)
-            if input_word_lemma != word2_lemma:
-                key = input_word + '_' + word_2
-                if key not in results.keys() and (word_2 + '_' + input_word) not in results.keys():
-                    params = {"word1": input_word, "word2": word_2}
-                    r = requests.post(entailment_url, params=params)
-                    if r.status_code != 200:
-                        continue
-                    else:
-                        response_json = r.json()
-                        entailment_results = response_json["entailment prediction results"][0]["entailment"]
-
-                        cos = entailment_results["cosine similarity score"]
-                        kl1 = float(entailment_results["word1 -> word2 (KL)"])
-                        kl2 = float(entailment_results["word2 -> word1 (KL)"])
-                        kl_mean = (kl1 + kl2) / 2
-
-                        results[key] = [cos, kl_mean, kl1, kl2]
+    # lemmatize to avoid words of the same tree
+    input_word_lemma = lemmatize_word(input_word, language)
+    reference_words = []
+    for word_2 in input_word_list:
+        if input_word != word_2 and input_word_lemma != lemmatize_word(word_2):
+            key = input_word + '_' + word_2
+            if key not in results.keys() and (word_2 + '_' + input_word) not in results.keys():
+                results[key] = None
+                reference_words.append(word_2)
+
+    # the API scores many pairs per request
+    for start in tqdm(range(0, len(reference_words), batch_size)):
+        body = {"word": input_word, "words": reference_words[start:start + batch_size]}
+        r = requests.post(entailment_url, json=body)
+        if r.status_code != 200:
+            continue
+        response_json = r.json()
+        for pair_results in response_json["entailment prediction results"]:
+            entailment_results = pair_results["entailment"]
+
+            cos = entailment_results["cosine similarity score"]
+            kl1 = float(entailment_results["word1 -> word2 (KL)"])
+            kl2 = float(entailment_results["word2 -> word1 (KL)"])
+            kl_mean = (kl1 + kl2) / 2
+
+            results[input_word + '_' + pair_results["word2"]] = [cos, kl_mean, kl1, kl2]
+    results = {key: res for key, res in results.items() if res is not None}
 
     print(f'successfully collected {len(results.keys())} entailment measurements, saving to {output_path}')
 
@@ -1,17 +1,26 @@
+import numpy as np
 import theano
+from collections import OrderedDict
 from theano import tensor as T, printing
+from theano.tensor.extra_ops import Unique
 from models.bword2vec import BWord2Vec
+from models.support import kl_spher
 from layers.custom.bsg_encoder import BSGEncoder
 from layers.standard.dense import Dense
 from layers.standard.embeddings import Embeddings
 from libraries.utils.other import merge_ordered_dicts
 
+## theano configuration
+theano.optimizer_including = 'cudnn'
+
 
 class BSG(BWord2Vec):
     """
     Theano implementation of the Bayesian Skip-gram model.
 
     """
+    backend = "theano"
+
     def __init__(self, vocab_size, input_dim=50, hidden_dim=50, latent_dim=100, lr_opt=None, margin=1., model_name='BSG with the hinge loss'):
         """
         :param vocab_size: the number of unique words
@@ -43,6 +52,14 @@ class BSG(BWord2Vec):
         # user accessible functions build ( e.g. training functions)
         self.__build_functions()
 
+    @staticmethod
+    def kl(mu_q, sigma_q, mu_p, sigma_p):
+        """
+        The generic Kullback Leibler function that passes arguments to the correct function
+
+        """
+        return kl_spher(mu_q, sigma_q, mu_p, sigma_p)
+
     def __compute_cost_components(self, pos_context_words, neg_context_words, center_words, mask):
         """
         Computes two main components that comprise the objective : maximum margin(hinge loss) and kl involving center words.
@@ -112,6 +129,22 @@ class BSG(BWord2Vec):
         log_sigma = T.log(self.__compute_prior_params(w)[1])
         return T.sum(log_sigma, axis=1)
 
+    def get_repr_matrices(self):
+        """
+        Reads the output embeddings once, sigmas are exponentiated in the same way as in __compute_prior_params.
+
+        """
+        return OrderedDict((("mu", self.embeddings_mu.W.get_value()),
+                            ("sigma", np.exp(self.embeddings_log_sigma.W.get_value()))))
+
+    def get_optimizer_state(self):
+        return [variable.get_value() for variable in self.optimizer_variables]
+
+    def set_optimizer_state(self, state):
+        assert len(state) == len(self.optimizer_variables)
+        for variable, value in zip(self.optimizer_variables, state):
+            variable.set_value(value)
+
     def __build_model(self):
         """
         Creates the actual model, returns parameters in the form of a dictionary.
@@ -133,6 +166,23 @@ class BSG(BWord2Vec):
                                           self.embeddings_mu.params, self.embeddings_log_sigma.params)
         return full_params
 
+    def __get_embeddings(self):
+        return [self.encoder.embeddings, self.embeddings_mu, self.embeddings_log_sigma]
+
+    def __restrict_embeddings(self, pos_context_words, neg_context_words, center_words):
+        """
+        Restricts embedding lookups to rows of words that are present in the batch.
+        :return: a list of (W, row_ids, rows) triples that can be passed as sparse_params to the optimizer
+
+        """
+        encoder_ids = Unique()(T.concatenate([center_words, pos_context_words.flatten()]))
+        output_ids = Unique()(T.concatenate([center_words, pos_context_words.flatten(),
+                                                         neg_context_words.flatten()]))
+        sparse_params = []
+        for embeddings, row_ids in zip(self.__get_embeddings(), [encoder_ids, output_ids, output_ids]):
+            sparse_params.append((embeddings.W, row_ids, embeddings.restrict(row_ids)))
+        return sparse_params
+
     def __build_functions(self):
         """
         a general build function for bayesian word2vec models, it compiles main functions, such as train() and
@@ -144,16 +194,34 @@ class BSG(BWord2Vec):
         center_words = T.ivector()  # center words (batch)
         mask = T.matrix()  # binary mask
 
-        margin, kl = self.__compute_cost_components(pos_context_words, neg_context_words, center_words, mask)
-        mean_kl = T.mean(kl, axis=0)
-        mean_margin = T.mean(margin, axis=0)
+        if self.lr_opt.sparse:
+            # embedding matrices are updated only in rows of words that are present in the batch
+            sparse_params = self.__restrict_embeddings(pos_context_words, neg_context_words, center_words)
+            sparse_Ws = [W for W, _, _ in sparse_params]
+            dense_params = [param for param in self.params if param not in sparse_Ws]
+        else:
+            sparse_params = []
+            dense_params = self.params
+
+        train_margin, train_kl = self.__compute_cost_components(pos_context_words, neg_context_words, center_words,
+                                                                mask)
+        mean_kl = T.mean(train_kl, axis=0)
+        mean_margin = T.mean(train_margin, axis=0)
         cost = mean_margin + mean_kl
 
-        updates = self.lr_opt(cost, self.params)
+        updates = self.lr_opt(cost, dense_params, sparse_params=sparse_params)
+        # shared variables of the optimizer(e.g. moments), they are updated together with parameters
+        self.optimizer_variables = tuple(variable for variable in updates if variable not in self.params)
         avg_log_det = T.mean(self.__compute_log_determinant(center_words))
 
         self.train = theano.function(inputs=[pos_context_words, neg_context_words, center_words, mask],
                                      outputs=[mean_margin, mean_kl, avg_log_det], updates=updates, on_unused_input='warn')
+
+        # the remaining functions look up full embedding matrices
+        for embeddings in self.__get_embeddings():
+            embeddings.unrestrict()
+        margin, kl = self.__compute_cost_components(pos_context_words, neg_context_words, center_words, mask)
+        avg_log_det = T.mean(self.__compute_log_determinant(center_words))
         self.compute_loss = theano.function(inputs=[pos_context_words, neg_context_words, center_words, mask],
                                             outputs=[margin, kl, avg_log_det], on_unused_input='warn')
 
@@ -1,12 +1,13 @@
 import pickle
 import os
-import theano
-from models.support import load, write_vectors, kl_spher
+from collections import OrderedDict
+from libraries.tools.word_vectors import write_vectors, VECTORS_FORMATS
 from pickle import UnpicklingError
 from libraries.tools.ordered_attrs import OrderedAttrs
-
-## theano configuration
-theano.optimizer_including = 'cudnn'
+from libraries.tools.embedding_store import write_embedding_store, EMBEDDING_STORE_FILE_NAME
+from libraries.tools.params_archive import write_params_archive, read_params_archive, is_params_archive, \
+    PARAMS_ARCHIVE_FOLDER_NAME
+from models.model_archive import get_lr_opt_config
 
 
 class BWord2Vec(OrderedAttrs):
@@ -14,6 +15,9 @@ class BWord2Vec(OrderedAttrs):
     Base class for the Bayesian Skip-gram model, it contains methods that can be used for multiple variants of BSG.
 
     """
+    # the name of the training backend, it's recorded in parameter archives(see models.model_archive.BACKENDS)
+    backend = None
+
     def __init__(self):
         OrderedAttrs.__init__(self)
         # the following attributes will be initialized in a child object
@@ -21,40 +25,84 @@ class BWord2Vec(OrderedAttrs):
         self.params_full = None
         self.repr_types = None
 
-    @staticmethod
-    def kl(mu_q, sigma_q, mu_p, sigma_p):
+    def save_word_vectors(self, index_to_word, vectors_folder, vectors_formats=("text", )):
         """
-        The generic Kullback Leibler function that passes arguments to the correct function
+        Extracts word vectors from different parameters and saves them to a desired vectors_folder destination
+        :param index_to_word:  an array of words from vocab object
+        :param vectors_folder: a desired destination path where word vectors should be saved
+        :param vectors_formats: formats of the vectors files, see libraries.tools.word_vectors.VECTORS_FORMATS
 
         """
-        return kl_spher(mu_q, sigma_q, mu_p, sigma_p)
+        # parameter matrices are read once instead of calling a compiled function per word
+        tokens = [word_obj.token for word_obj in index_to_word]
+        repr_matrices = self.get_repr_matrices()
+        for name, vectors in repr_matrices.items():
+            for vectors_format in vectors_formats:
+                file_path = os.path.join(vectors_folder, name + VECTORS_FORMATS[vectors_format])
+                write_vectors(tokens, file_path, vectors, vectors_format=vectors_format)
+        # the binary store is memory-mapped by the inference API
+        write_embedding_store(os.path.join(vectors_folder, EMBEDDING_STORE_FILE_NAME), tokens=tokens,
+                              mus=repr_matrices["mu"], sigmas=repr_matrices["sigma"])
 
-    def save_word_vectors(self, index_to_word, vectors_folder):
+    def get_repr_matrices(self):
         """
-        Extracts word vectors from different parameters and saves them to a desired vectors_folder destination
-        :param index_to_word:  an array of words from vocab object
-        :param vectors_folder: a desired destination path where word vectors should be saved
+        Returns a dictionary of matrices [vocab_size x dim] with the same keys as repr_types, row i corresponds to the
+        word with id i. This has to be implemented in a child object.
 
         """
-        for name, func in self.repr_types.items():
-            write_vectors(index_to_word, os.path.join(vectors_folder, name+".vectors"), func)
+        raise NotImplementedError
 
-    def save_params(self, output_dir, output_file_name='params.pkl'):
+    def get_optimizer_state(self):
         """
-        Saves parameters via pickle to the output_dir under the specified name.
+        Returns the optimizer's statistics(e.g. Adam's moments and time step) as a container of arrays, so training
+        can be resumed. This has to be implemented in a child object.
 
         """
-        f = open(os.path.join(output_dir, output_file_name), 'wb')
-        for param_name, param in self.params_full.items():
-            # get_value() is necessary because param will be a tensor
-            pickle.dump([param_name, param['values'].get_value()], f)
-        f.close()
+        raise NotImplementedError
+
+    def set_optimizer_state(self, state):
+        """
+        Restores the optimizer's statistics from a state that was returned by get_optimizer_state().
 
-    def load_params(self, file_path, exclude_params=[]):
         """
-        Loads params from a pickle saved file. The format has to correspond to the one that is used in save_params()
+        raise NotImplementedError
 
+    def get_hyperparams(self):
         """
+        :return: an OrderedDict of constructor's arguments that the model can be rebuilt from, the learning rate
+                 optimizer is described by a dict(see models.model_archive.get_lr_opt_config)
+
+        """
+        return OrderedDict((("vocab_size", self.vocab_size), ("input_dim", self.input_dim),
+                            ("hidden_dim", self.hidden_dim), ("latent_dim", self.latent_dim),
+                            ("margin", self.margin), ("model_name", self.model_name),
+                            ("lr_opt", get_lr_opt_config(self.lr_opt))))
+
+    def save_params(self, output_dir, output_file_name=PARAMS_ARCHIVE_FOLDER_NAME):
+        """
+        Saves parameters and hyper-parameters as an archive folder(see libraries.tools.params_archive) to the
+        output_dir under the specified name. The model can be rebuilt from it by models.model_archive.load_model().
+
+        """
+        # get_value() is necessary because param will be a tensor
+        params = OrderedDict((param_name, param.value.get_value(borrow=True))
+                             for param_name, param in self.params_full.items())
+        write_params_archive(os.path.join(output_dir, output_file_name), params,
+                             hyperparams=self.get_hyperparams(), backend=self.backend)
+
+    def load_params(self, file_path, exclude_params=[], mmap_mode=None):
+        """
+        Loads params from an archive folder that was written by save_params(), or from a pickle saved file of the
+        previous format(a sequence of pickled [name, value] pairs).
+        :param mmap_mode: if set, parameters of an archive are memory-mapped instead of copied(see numpy.load)
+
+        """
+        if is_params_archive(file_path):
+            _, params = read_params_archive(file_path, mmap_mode=mmap_mode, exclude_params=exclude_params)
+            for param_name, param in params.items():
+                self.initialize_param(param_name, param, borrow=mmap_mode is not None)
+            return list(params.keys())
+
         f = open(file_path, 'rb')
         initialized_params = []
         while True:
@@ -69,13 +117,14 @@ class BWord2Vec(OrderedAttrs):
         f.close()
         return initialized_params
 
-    def initialize_param(self, param_name, param_value):
+    def initialize_param(self, param_name, param_value, borrow=False):
         """
         Initializes a parameter with the provided values
         :param param_value: a matrix(array) of parameters
+        :param borrow: if True, the parameter may use param_value without copying it
 
         """
         current_params = self.params_full
         if param_name not in current_params:
             raise ValueError("Could not find the parameter by '%s' name" % param_name)
-        current_params[param_name]['values'].set_value(param_value)
\ No newline at end of file
+        current_params[param_name].value.set_value(param_value, borrow=borrow)
@@ -0,0 +1,62 @@
+# rebuilding models from parameter archives(see libraries.tools.params_archive)
+import importlib
+from libraries.tools.params_archive import read_params_archive
+
+# the model and optimizers modules of each backend, they are imported on demand as the theano backend is optional
+BACKENDS = {"theano": ("models.bsg", "BSG", "libraries.misc.optimizations"),
+            "numpy": ("models.numpy_bsg", "NumpyBSG", "libraries.misc.numpy_optimizations")}
+
+
+def get_model_class(backend):
+    if backend not in BACKENDS:
+        raise ValueError("unknown backend '%s', expected one of %s" % (backend, ", ".join(BACKENDS)))
+    module_name, class_name, _ = BACKENDS[backend]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_lr_opt(backend, config):
+    """
+    :param config: a dict that was returned by get_lr_opt_config()
+    :return: a learning rate optimizer of the backend
+
+    """
+    _, _, module_name = BACKENDS[backend]
+    config = dict(config)
+    lr_opt_class = getattr(importlib.import_module(module_name), config.pop("name"))
+    return lr_opt_class(**config)
+
+
+def get_lr_opt_config(lr_opt):
+    """
+    :return: a json-serializable dict of the optimizer's class name and constructor's arguments
+
+    """
+    config = {"name": type(lr_opt).__name__, "learning_rate": lr_opt.alpha, "sparse": lr_opt.sparse}
+    for attr in ("beta1", "beta2", "eps"):
+        if hasattr(lr_opt, attr):
+            config[attr] = getattr(lr_opt, attr)
+    return config
+
+
+def load_model(folder_path, model_class=None, lr_opt=None, mmap_mode=None):
+    """
+    Creates a model with the hyper-parameters of the archive and assigns the archive's parameters to it. Models of
+    both backends have the same parameters, so e.g. a model trained with theano can be loaded into NumpyBSG for
+    inference without compiling anything.
+    :param model_class: the class of the model, by default the class of the backend that the archive was saved from
+    :param lr_opt: the learning rate optimizer, by default the archived one is recreated for the model's backend
+    :param mmap_mode: if set, parameters are memory-mapped instead of copied, which is meant for inference, as
+                      mode 'r' makes them read-only(see numpy.load)
+
+    """
+    manifest, params = read_params_archive(folder_path, mmap_mode=mmap_mode)
+    hyperparams = dict(manifest["hyperparams"])
+    lr_opt_config = hyperparams.pop("lr_opt")
+    if model_class is None:
+        model_class = get_model_class(manifest["backend"])
+    if lr_opt is None:
+        lr_opt = create_lr_opt(model_class.backend, lr_opt_config)
+    model = model_class(lr_opt=lr_opt, **hyperparams)
+    for name, value in params.items():
+        model.initialize_param(name, value, borrow=mmap_mode is not None)
+    return model
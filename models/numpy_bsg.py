@@ -0,0 +1,352 @@
+import numpy as np
+from collections import OrderedDict
+from models.bword2vec import BWord2Vec
+from libraries.misc.initializers import Initializers
+from libraries.tools.shared_arrays import to_shared_memory
+
+
+class NumpyShared:
+    """
+    A container of a numpy array with the same interface as theano's shared variables, so parameters of the numpy
+    backend can be saved, loaded and initialized by the same code.
+
+    """
+    def __init__(self, value, name=None):
+        self.value = value
+        self.name = name
+        self.shared = False
+
+    def get_value(self, borrow=False):
+        return self.value if borrow else self.value.copy()
+
+    def set_value(self, value, borrow=False):
+        """
+        :param borrow: if True, value(e.g. a memory-mapped array) replaces the array instead of being copied into it.
+                       Otherwise, the values are written in-place, so views of the array remain valid.
+
+        """
+        if borrow:
+            self.value = value
+        else:
+            self.value[...] = value
+
+    def share_memory(self):
+        """
+        Moves the array to shared memory, so processes that are forked afterwards read and write the same values.
+
+        """
+        if not self.shared:
+            self.value = to_shared_memory(self.value)
+            self.shared = True
+
+    def detach(self):
+        """
+        Replaces the array by a private copy, e.g. in a forked process.
+        :return: the previous array
+
+        """
+        value = self.value
+        self.value = value.copy()
+        self.shared = False
+        return value
+
+    def __getstate__(self):
+        # a pickled copy has its own memory
+        state = dict(self.__dict__)
+        state["value"], state["shared"] = np.array(self.value), False
+        return state
+
+
+class NumpyParameter:
+    def __init__(self, name, shape, regularizable=False, init_type='uniform'):
+        self.name = name
+        self.value = NumpyShared(Initializers.init(shape, init_type), name)
+        self.regularizable = regularizable
+
+
+class NumpyBSG(BWord2Vec):
+    """
+    NumPy implementation of the Bayesian Skip-gram model, it has the same parameters and functions as the Theano one
+    (models.bsg.BSG), but gradients are derived manually, so nothing has to be compiled.
+
+    """
+    backend = "numpy"
+
+    def __init__(self, vocab_size, input_dim=50, hidden_dim=50, latent_dim=100, lr_opt=None, margin=1., model_name='BSG with the hinge loss'):
+        """
+        :param vocab_size: the number of unique words
+        :param input_dim: the number of components in the encoder's word embeddings
+        :param hidden_dim: the number of components in the encoder's hidden layer
+        :param latent_dim: the number of components in the latent vector(also output word mu's)
+        :param lr_opt: learning rate optimizer object from libraries.misc.numpy_optimizations (e.g. Adam)
+        :param margin: margin constant present in the hinge loss
+
+        """
+        assert lr_opt is not None
+        BWord2Vec.__init__(self)
+
+        self.model_name = model_name
+        self.vocab_size = vocab_size
+        self.input_dim = input_dim
+        self.hidden_dim = hidden_dim
+        self.latent_dim = latent_dim
+        self.lr_opt = lr_opt
+        self.learning_rate = lr_opt.alpha
+        self.margin = margin
+
+        # assign full parameters
+        self.params_full = self.__build_model()
+
+        # extract only the actual parameter data-structures as those will be optimized
+        self.params = [param.value for param in self.params_full.values()]
+
+        # embedding matrices receive sparse updates, the remaining parameters are dense
+        self.embeddings_names = ("emb_encoder_W", "emb_output_mu_W", "emb_output_log_sigma_W")
+
+        # indicates what functions should be used for embeddings extraction
+        self.repr_types = {
+            "mu": self.get_word_mu_rep,
+            "sigma": self.get_word_sigma_rep,
+            }
+
+    def __build_model(self):
+        """
+        Creates parameters in the same order and with the same initializations as BSG, so both backends start from
+        identical values when numpy's random generator is seeded identically.
+
+        """
+        varste_dim = 1
+        params = OrderedDict()
+
+        def add_param(name, shape, init_type):
+            params[name] = NumpyParameter(name, shape=shape, init_type=init_type)
+
+        # the output representations of words(used in KL regularization and max_margin).
+        add_param("emb_output_mu_W", (self.vocab_size, self.latent_dim), init_type='uniform')
+        add_param("emb_output_log_sigma_W", (self.vocab_size, varste_dim), init_type='bsg_log_sigmas')
+
+        # encoder corresponding layers
+        add_param("emb_encoder_W", (self.vocab_size, self.input_dim), init_type='xavier_uniform')
+        add_param("encoder_C", (2 * self.input_dim, self.hidden_dim), init_type='uniform')
+        add_param("dense_mu_W", (self.hidden_dim, self.latent_dim), init_type='xavier_uniform')
+        add_param("dense_mu_b", (self.latent_dim, ), init_type='zeros')
+        add_param("dense_sigma_W", (self.hidden_dim, varste_dim), init_type='xavier_uniform')
+        add_param("dense_sigma_b", (varste_dim, ), init_type='zeros')
+
+        # the same order as in BSG
+        order = ["emb_encoder_W", "encoder_C", "dense_mu_W", "dense_mu_b", "dense_sigma_W", "dense_sigma_b",
+                 "emb_output_mu_W", "emb_output_log_sigma_W"]
+        return OrderedDict((name, params[name]) for name in order)
+
+    def __get(self, name):
+        return self.params_full[name].value.get_value(borrow=True)
+
+    def __encode(self, context_words, center_words, mask):
+        """
+        Encodes center and context words considering the binary mask, and returns Gaussian parameters.
+        :param center_words: an array with center words ids [batch_size]
+        :param context_words: an array with context words ids [batch_size x window_size]
+        :param mask: an array binary mask where 0 indicates a padding [batch_size x window_size]
+        :return: mu [batch_size x latent_dim], sigma [batch_size x 1], and intermediate values for back-propagation
+
+        """
+        embeddings, C = self.__get("emb_encoder_W"), self.__get("encoder_C")
+        mask = mask[:, :, np.newaxis]
+
+        # 0. get representations, the center word is repeated for every context word
+        repr_center = embeddings[center_words][:, np.newaxis, :] * mask
+        repr_context = embeddings[context_words] * mask
+
+        # 1. combine representations
+        repr_common = np.concatenate([np.broadcast_to(repr_center, repr_context.shape), repr_context], axis=2)
+
+        # 2. compute hidden layer by summing common representations(relu)
+        pre_activation = np.dot(repr_common, C)
+        hidden = np.sum(np.maximum(pre_activation, 0.), axis=1)
+
+        # 3. perform affine transformations to generate Gaussian parameters
+        mu = np.dot(hidden, self.__get("dense_mu_W")) + self.__get("dense_mu_b")
+        sigma = np.exp(np.dot(hidden, self.__get("dense_sigma_W")) + self.__get("dense_sigma_b"))
+        return mu, sigma, (mask, repr_common, pre_activation, hidden)
+
+    def __compute_prior_params(self, w):
+        """
+        :param w: an array with word ids
+        :return: mean and sigma representations
+
+        """
+        return self.__get("emb_output_mu_W")[w], np.exp(self.__get("emb_output_log_sigma_W")[w])
+
+    def __compute_cost_components(self, pos_context_words, neg_context_words, center_words, mask):
+        """
+        Computes two main components that comprise the objective : maximum margin(hinge loss) and kl involving
+        center words.
+        :return: margin [batch_size], kl [batch_size], and intermediate values for back-propagation
+
+        """
+        assert pos_context_words.shape == neg_context_words.shape
+        mask = np.asarray(mask, dtype=self.__get("emb_encoder_W").dtype)
+        mu_q, sigma_q, encoder_cache = self.__encode(pos_context_words, center_words, mask)
+
+        # arguments of the center, positive and negative KL terms, the posterior is broadcast over context words
+        mu_q_context, sigma_q_context = mu_q[:, np.newaxis], sigma_q[:, np.newaxis]
+        kl_args = [(mu_q, sigma_q) + self.__compute_prior_params(center_words),
+                   (mu_q_context, sigma_q_context) + self.__compute_prior_params(pos_context_words),
+                   (mu_q_context, sigma_q_context) + self.__compute_prior_params(neg_context_words)]
+        kl, kl_pos, kl_neg = [kl_spher(*args) for args in kl_args]
+
+        # hard margin
+        hinge = self.margin - kl_neg + kl_pos
+        margin = np.sum(np.maximum(0., hinge) * mask, axis=1)
+        return margin, kl, (hinge, mask, sigma_q, kl_args, encoder_cache)
+
+    def __compute_grads(self, pos_context_words, neg_context_words, center_words, cache):
+        """
+        Back-propagates the mean cost, i.e. mean(margin) + mean(kl).
+        :return: dense gradients as a list of (name, grad) and embeddings gradients as a list of
+                 (name, row_ids, grad w.r.t. rows)
+
+        """
+        hinge, mask, sigma_q, kl_args, (mask3, repr_common, pre_activation, hidden) = cache
+        batch_size = len(center_words)
+
+        # gradients w.r.t. the center, positive and negative KL terms
+        active = (hinge > 0.) * mask / batch_size
+        coefs = [np.full(batch_size, 1. / batch_size, dtype=mask.dtype), active, -active]
+        kl_grads = [kl_spher_grads(*(args + (coef, ))) for args, coef in zip(kl_args, coefs)]
+
+        # the posterior's gradients are summed over context words
+        grad_mu_q = kl_grads[0][0] + kl_grads[1][0].sum(axis=1) + kl_grads[2][0].sum(axis=1)
+        grad_sigma_q = kl_grads[0][1] + kl_grads[1][1].sum(axis=1) + kl_grads[2][1].sum(axis=1)
+        grad_sigma_pre_activation = grad_sigma_q * sigma_q
+
+        # dense layers
+        grad_hidden = np.dot(grad_mu_q, self.__get("dense_mu_W").T) + \
+                      np.dot(grad_sigma_pre_activation, self.__get("dense_sigma_W").T)
+        dense_grads = [("dense_mu_W", np.dot(hidden.T, grad_mu_q)), ("dense_mu_b", grad_mu_q.sum(axis=0)),
+                       ("dense_sigma_W", np.dot(hidden.T, grad_sigma_pre_activation)),
+                       ("dense_sigma_b", grad_sigma_pre_activation.sum(axis=0))]
+
+        # encoder
+        grad_pre_activation = grad_hidden[:, np.newaxis, :] * (pre_activation > 0.)
+        dense_grads.insert(0, ("encoder_C", np.tensordot(repr_common, grad_pre_activation, axes=([0, 1], [0, 1]))))
+        grad_repr_common = np.dot(grad_pre_activation, self.__get("encoder_C").T) * mask3
+        grad_center = grad_repr_common[:, :, :self.input_dim].sum(axis=1)
+        grad_context = grad_repr_common[:, :, self.input_dim:].reshape((-1, self.input_dim))
+
+        # embeddings, only rows of words in the batch have non-zero gradients
+        output_ids = np.concatenate([center_words, pos_context_words.ravel(), neg_context_words.ravel()])
+        embeddings_grads = [
+            ("emb_encoder_W",) + sum_rows(np.concatenate([center_words, pos_context_words.ravel()]),
+                                          np.concatenate([grad_center, grad_context])),
+            ("emb_output_mu_W",) + sum_rows(output_ids, np.concatenate(
+                [grads[2].reshape((-1, self.latent_dim)) for grads in kl_grads])),
+            ("emb_output_log_sigma_W",) + sum_rows(output_ids, np.concatenate(
+                [grads[3].reshape((-1, 1)) for grads in kl_grads]))]
+        return dense_grads, embeddings_grads
+
+    def __compute_log_determinant(self, w):
+        return np.sum(self.__get("emb_output_log_sigma_W")[w], axis=1)
+
+    def train(self, pos_context_words, neg_context_words, center_words, mask):
+        """
+        Performs one optimization step on the batch.
+        :return: mean_margin, mean_kl, avg_log_det computed before the update
+
+        """
+        margin, kl, cache = self.__compute_cost_components(pos_context_words, neg_context_words, center_words, mask)
+        avg_log_det = np.mean(self.__compute_log_determinant(center_words))
+        dense_grads, embeddings_grads = self.__compute_grads(pos_context_words, neg_context_words, center_words,
+                                                             cache)
+        self.lr_opt([(name, self.__get(name), grad) for name, grad in dense_grads],
+                    sparse_params=[(name, self.__get(name), row_ids, grad)
+                                   for name, row_ids, grad in embeddings_grads])
+        return np.mean(margin), np.mean(kl), avg_log_det
+
+    def compute_loss(self, pos_context_words, neg_context_words, center_words, mask):
+        """
+        :return: margin [batch_size], kl [batch_size], avg_log_det
+
+        """
+        margin, kl, _ = self.__compute_cost_components(pos_context_words, neg_context_words, center_words, mask)
+        return margin, kl, np.mean(self.__compute_log_determinant(center_words))
+
+    def encode(self, pos_context_words, center_words, mask):
+        """
+        The function that is used in lexical substitution and other experiments.
+        :return: mu [batch_size x latent_dim], sigma [batch_size x 1]
+
+        """
+        mask = np.asarray(mask, dtype=self.__get("emb_encoder_W").dtype)
+        mu, sigma, _ = self.__encode(np.asarray(pos_context_words), np.asarray(center_words), mask)
+        return mu, sigma
+
+    def get_word_mu_rep(self, word_idx):
+        return self.__compute_prior_params(word_idx)[0].copy()
+
+    def get_word_sigma_rep(self, word_idx):
+        return self.__compute_prior_params(word_idx)[1]
+
+    def get_optimizer_state(self):
+        return self.lr_opt.get_state()
+
+    def set_optimizer_state(self, state):
+        self.lr_opt.set_state(state)
+
+    def get_repr_matrices(self):
+        """
+        Reads the output embeddings once, sigmas are exponentiated in the same way as in __compute_prior_params.
+
+        """
+        return OrderedDict((("mu", self.__get("emb_output_mu_W").copy()),
+                            ("sigma", np.exp(self.__get("emb_output_log_sigma_W")))))
+
+
+def kl_spher(mu_q, sigma_q, mu_p, sigma_p):
+    """
+    Kullback Leibler divergence between two spherical Gaussians, the same as models.support.kl_spher.
+    :param mu_q: array [... x d], can be broadcast against mu_p
+    :param sigma_q: array [... x 1]
+    :return: array [...]
+
+    """
+    d = mu_q.shape[-1]
+    sigma_p_inv = (1.0/sigma_p)
+    tra = d * sigma_q*sigma_p_inv
+    quadr = sigma_p_inv * np.sum((mu_p - mu_q)**2, axis=-1, keepdims=True)
+    log_det = - d*np.log(sigma_q * sigma_p_inv)
+    res = 0.5 * (tra + quadr - d + log_det)
+    return res[..., 0]
+
+
+def kl_spher_grads(mu_q, sigma_q, mu_p, sigma_p, coef):
+    """
+    Gradients of coef * kl_spher(mu_q, sigma_q, mu_p, sigma_p).
+    :param coef: array [...], the gradient of the objective w.r.t. the KL divergence
+    :return: gradients w.r.t. mu_q, sigma_q, mu_p and log(sigma_p), they have the broadcast shapes [... x d] and
+             [... x 1]
+
+    """
+    d = mu_q.shape[-1]
+    coef = coef[..., np.newaxis]
+    sigma_p_inv = (1.0/sigma_p)
+    diff = mu_p - mu_q
+    grad_mu_p = coef * sigma_p_inv * diff
+    grad_sigma_q = coef * 0.5 * d * (sigma_p_inv - 1.0/sigma_q)
+    quadr = sigma_p_inv * np.sum(diff**2, axis=-1, keepdims=True)
+    grad_log_sigma_p = coef * 0.5 * (d - d * sigma_q*sigma_p_inv - quadr)
+    return -grad_mu_p, grad_sigma_q, grad_mu_p, grad_log_sigma_p
+
+
+def sum_rows(ids, grads):
+    """
+    Sums gradients of rows that are looked up multiple times.
+    :param ids: a vector of row ids [n]
+    :param grads: gradients w.r.t. looked up rows [n x dim]
+    :return: sorted unique row ids [m] and their gradients [m x dim]
+
+    """
+    row_ids, positions = np.unique(ids, return_inverse=True)
+    rows = np.zeros((len(row_ids), grads.shape[1]), dtype=grads.dtype)
+    np.add.at(rows, positions.ravel(), grads)
+    return row_ids, rows
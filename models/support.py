@@ -2,7 +2,6 @@
 import pickle
 import numpy as np
 from theano import tensor as T
-from libraries.utils.paths_and_files import create_folders_if_not_exist
 from pickle import UnpicklingError
 from theano.tensor.shared_randomstreams import RandomStreams
 from theano.sandbox.rng_mrg import MRG_RandomStreams as MRG_RandomStreams
@@ -79,20 +78,6 @@ def init_weights2(size, low_factor=-1, high_factor=1, scale_factor=1.):
     return np.float32(scale_factor)*np.float32(np.random.uniform(low=low_factor, high=high_factor, size=size))
 
 
-def write_vectors(vocab, file_path, embeddings_function):
-    """
-    # extracts word vectors via embeddings_function and writes them into a file
-    :param vocab: vocabulary object
-    :param file_path: where to write vectors
-    :param embeddings_function: a function that takes word id as input and return a vector embedding
-    """
-    create_folders_if_not_exist(file_path)
-    with open(file_path, 'w', encoding="utf-8") as output_file:
-        for word_obj in vocab:
-            word_vec = embeddings_function(word_obj.id)
-            output_file.write(word_obj.token + " " + " ".join(str(f) for f in word_vec)+"\n")
-
-
 def load(file_path):
     """
     a parameters loading function that is used to pre-loading pre-trained parameters to a model
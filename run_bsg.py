@@ -1,7 +1,9 @@
 # this file contains an example on how to run the bayesian skip-gram model
 import os
 import argparse
-from interfaces.interface_configurator import InterfaceConfigurator
+from interfaces.interface_configurator import InterfaceConfigurator, BACKENDS
+from libraries.tools.word_vectors import VECTORS_FORMATS
+from libraries.tools.training_metrics import METRICS_FORMATS
 
 train_data_path = './path/to/docs' # change the path! must point to directory containing .txt input files
 vocab_file_path = './output/invoice/invoice.txt' # if the file does not exist - it will be created
@@ -16,6 +18,27 @@ def parse_args():
     parser.add_argument('--embedding_size', type=int, default='200', help='size of the models embedding vectors')
     parser.add_argument('--batch_size', type=int, default='500', help="batch size for context window creation")
     parser.add_argument('--nr_neg_samples', type=int, default='10', help="number of negative samples for skip gram algorithm")
+    parser.add_argument('--vectors_formats', type=str, nargs='+', default=['text'], choices=sorted(VECTORS_FORMATS),
+                        help="formats of the word vectors files that are written after training")
+    parser.add_argument('--nr_workers', type=int, default='1', help="number of processes that produce training batches")
+    parser.add_argument('--seed', type=int, default=None, help="makes negative sampling and the order of batches deterministic")
+    parser.add_argument('--encoded_data_folder', type=str, default=None,
+                        help="if set, data is tokenized and encoded to word ids once and cached in this folder")
+    parser.add_argument('--sparse_updates', action='store_true',
+                        help="update only embedding rows of words in the batch(lazy Adam), scales with batch size instead of vocabulary size")
+    parser.add_argument('--backend', type=str, default='theano', choices=BACKENDS,
+                        help="'numpy' trains without theano, so no functions have to be compiled on start")
+    parser.add_argument('--nr_trainers', type=int, default='1',
+                        help="number of processes that train on disjoint shards of data with shared embeddings(numpy "
+                             "backend and --sparse_updates only), requires the 'fork' start method, so it's not "
+                             "supported on Windows")
+    parser.add_argument('--checkpoint_interval', type=int, default=None, help="write a checkpoint every N batches")
+    parser.add_argument('--checkpoint_minutes', type=float, default=None, help="write a checkpoint every N minutes")
+    parser.add_argument('--resume', type=str, default=None,
+                        help="path to a checkpoint.npz file, training continues from the batch after it and writes "
+                             "to the checkpoint's folder(its log and metrics files are appended to)")
+    parser.add_argument('--metrics_format', type=str, default='jsonl', choices=sorted(METRICS_FORMATS) + ['none'],
+                        help="format of the file with per-batch timings, throughput, queue depth and memory usage")
     return parser.parse_args()
 
 
@@ -26,7 +49,16 @@ def train(args):
                                                   max_vocab_size=args.max_vocab_size,
                                                   batch_size=args.batch_size,
                                                   nr_neg_samples=args.nr_neg_samples,
-                                                  embedding_size=args.embedding_size)
+                                                  embedding_size=args.embedding_size,
+                                                  vectors_formats=args.vectors_formats,
+                                                  nr_workers=args.nr_workers, seed=args.seed,
+                                                  encoded_data_folder=args.encoded_data_folder,
+                                                  sparse_updates=args.sparse_updates,
+                                                  backend=args.backend, nr_trainers=args.nr_trainers,
+                                                  checkpoint_interval=args.checkpoint_interval,
+                                                  checkpoint_minutes=args.checkpoint_minutes,
+                                                  resume_file_path=args.resume,
+                                                  metrics_format=None if args.metrics_format == 'none' else args.metrics_format)
 
     i_model.train_workflow()
 